@@ -4,7 +4,7 @@
 # CONFIGURATION
 # =========================
 
-.PHONY: ingest normalize match views api all
+.PHONY: ingest normalize match views api bench-siret bench-match bench-normalize bench-ingest bench-nearby load-test generate-data bench-e2e pipeline all
 
 ingest:
 	# CSV -> Parquet (SIRENE, RNA, BAN)
@@ -26,5 +26,41 @@ api:
 	# Lancement du serveur
 	uvicorn api.main:app --host 0.0.0.0 --port 8000 --workers 4
 
+bench-siret:
+	# Latence lookup SIRET : scan parquet vs pool DuckDB indexe vs index mmap
+	python bench/bench_siret.py
 
-all: ingest normalize match views
\ No newline at end of file
+bench-match:
+	# Matching : jointure complete vs blocking par departement (paires, temps, ecarts)
+	python bench/bench_match.py
+
+bench-normalize:
+	# Debit (lignes/s) de la normalisation d'adresses par dictionnaire
+	python bench/bench_normalize.py
+
+bench-ingest:
+	# Ingestion : all_varchar sequentielle vs schemas types en parallele (taille Bronze, duree)
+	python bench/bench_ingest.py
+
+bench-nearby:
+	# Latence /api/v1/nearby selon le rayon : scan complet vs index de grille
+	python bench/bench_nearby.py
+
+load-test:
+	# Latence ping/stats pendant des requetes lourdes (API lancee via 'make api')
+	python bench/load_test.py
+
+generate-data:
+	# CSV synthetiques SIRENE/RNA/BAN deterministes (SYNTH_SCALE, SYNTH_SEED) dans data/synthetic/raw
+	python bench/generate_data.py
+
+bench-e2e:
+	# ETL complet puis charge sur chaque route, sur donnees synthetiques (BENCH_SCALE) ; resultats dans bench/results
+	python bench/bench_e2e.py
+
+
+pipeline:
+	# Graphe complet : etapes independantes en parallele, rapport JSON par etape
+	python etl/pipeline.py
+
+all: pipeline
\ No newline at end of file
@@ -0,0 +1,119 @@
+import functools
+import inspect
+import threading
+import time
+from collections import OrderedDict
+
+from fastapi.responses import JSONResponse, Response
+
+
+class ResponseCache:
+    """Cache LRU borne en nombre d'entrees, avec expiration (TTL) par entree."""
+
+    def __init__(self, max_entries=10000, ttl=300):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value):
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.invalidations += 1
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "invalidations": self.invalidations,
+            }
+
+
+# Seules les reponses deterministes pour un build donne sont mises en cache
+CACHEABLE_STATUS = (200, 404)
+
+def _to_cache_entry(result):
+    if isinstance(result, Response):
+        if result.status_code not in CACHEABLE_STATUS:
+            return None
+        return (result.status_code, result.body)
+    return (200, result)
+
+def _from_cache_entry(entry):
+    status_code, payload = entry
+    if isinstance(payload, bytes):
+        # On reconstruit une reponse neuve : les middlewares modifient les en-tetes en place
+        return Response(content=payload, status_code=status_code, media_type=JSONResponse.media_type)
+    return payload
+
+def cached(cache, namespace):
+    """Decorateur de route : cle = namespace + parametres de l'appel."""
+
+    def decorator(func):
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(**kwargs):
+                key = (namespace, tuple(sorted(kwargs.items())))
+                entry = cache.get(key)
+                if entry is not None:
+                    return _from_cache_entry(entry)
+                result = await func(**kwargs)
+                entry = _to_cache_entry(result)
+                if entry is not None:
+                    cache.set(key, entry)
+                return result
+            return async_wrapper
+
+        @functools.wraps(func)
+        def sync_wrapper(**kwargs):
+            key = (namespace, tuple(sorted(kwargs.items())))
+            entry = cache.get(key)
+            if entry is not None:
+                return _from_cache_entry(entry)
+            result = func(**kwargs)
+            entry = _to_cache_entry(result)
+            if entry is not None:
+                cache.set(key, entry)
+            return result
+        return sync_wrapper
+
+    return decorator
@@ -0,0 +1,179 @@
+import duckdb
+import os
+import queue
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+
+def parquet_source(parquet_path):
+    """Source DuckDB d'une table Gold : fichier unique ou dossier partitionne par departement.
+
+    Meme convention que etl/layout.py (golden_record.parquet -> golden_record/departement=XX/).
+    """
+    dataset_dir = os.path.splitext(parquet_path)[0]
+    if os.path.isdir(dataset_dir):
+        dataset_glob = (dataset_dir + "/**/*.parquet").replace('\\', '/')
+        return (
+            f"(SELECT * EXCLUDE (departement) FROM read_parquet('{dataset_glob}', "
+            f"hive_partitioning=true, hive_types={{'departement': VARCHAR}}))"
+        )
+    return f"read_parquet('{parquet_path}')"
+
+
+def parquet_exists(parquet_path):
+    return os.path.exists(parquet_path) or os.path.isdir(os.path.splitext(parquet_path)[0])
+
+
+class DuckDBPool:
+    """Pool de curseurs DuckDB en lecture seule, ouvert une fois par worker.
+
+    Si la base persistée n'existe pas encore, on retombe sur une base en
+    mémoire exposant le parquet sous forme de vue du même nom.
+    """
+
+    def __init__(self, db_path, fallback_views=None, size=4):
+        self.db_path = db_path
+        self.fallback_views = fallback_views or {}
+        self.size = size
+        self._conn = None
+        self._cursors = queue.Queue()
+        self._lock = threading.Lock()
+
+    def _open_locked(self):
+        if os.path.exists(self.db_path):
+            conn = duckdb.connect(self.db_path, read_only=True)
+        else:
+            conn = duckdb.connect(database=':memory:')
+            for view_name, parquet_path in self.fallback_views.items():
+                conn.execute(f"CREATE VIEW {view_name} AS SELECT * FROM {parquet_source(parquet_path)}")
+        cursors = queue.Queue()
+        for _ in range(self.size):
+            cursors.put(conn.cursor())
+        self._conn = conn
+        self._cursors = cursors
+
+    def _close_locked(self):
+        if self._conn is None:
+            return
+        # On attend le retour de chaque curseur en cours d'utilisation avant de fermer
+        old_cursors = self._cursors
+        for _ in range(self.size):
+            old_cursors.get().close()
+        # Sentinelle : les appelants encore bloques sur l'ancienne file repartent sur la nouvelle
+        old_cursors.put(None)
+        self._conn.close()
+        self._conn = None
+
+    def open(self):
+        with self._lock:
+            if self._conn is None:
+                self._open_locked()
+
+    def close(self):
+        with self._lock:
+            self._close_locked()
+
+    def reload(self):
+        """Reouvre la base apres un remplacement atomique du fichier par l'ETL."""
+        with self._lock:
+            self._close_locked()
+            self._open_locked()
+
+    def detached_cursor(self):
+        """Curseur hors pool pour les lectures longues (exports), a fermer par l'appelant.
+
+        Il ne prive pas les lookups d'un curseur du pool et reste valide apres
+        un reload() : la lecture se termine sur l'ancienne base.
+        """
+        with self._lock:
+            if self._conn is None:
+                self._open_locked()
+            return self._conn.cursor()
+
+    @contextmanager
+    def cursor(self):
+        while True:
+            if self._conn is None:
+                self.open()
+            cursors = self._cursors
+            cur = cursors.get()
+            if cur is not None:
+                break
+            cursors.put(None)
+        try:
+            yield cur
+        finally:
+            cursors.put(cur)
+
+
+class SQLitePool:
+    """Pool de connexions SQLite en lecture seule (mode=ro, mmap), ouvert une fois par worker.
+
+    etl/views.py remplace catalog.db par renommage atomique : reload() rouvre
+    les connexions sur le nouveau fichier, les anciennes finissant leurs requetes.
+    """
+
+    def __init__(self, db_path, size=4, mmap_size=256 * 1024 * 1024):
+        self.db_path = db_path
+        self.size = size
+        self.mmap_size = mmap_size
+        self._connections = None
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        uri = "file:" + self.db_path.replace('\\', '/') + "?mode=ro"
+        conn = sqlite3.connect(uri, uri=True, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        conn.execute(f"PRAGMA mmap_size = {self.mmap_size}")
+        return conn
+
+    def _open_locked(self):
+        if not os.path.exists(self.db_path):
+            # Index pas encore construit : on reessaiera a la prochaine requete
+            self._connections = None
+            return
+        connections = queue.Queue()
+        for _ in range(self.size):
+            connections.put(self._connect())
+        self._connections = connections
+
+    def _close_locked(self):
+        if self._connections is None:
+            return
+        old_connections = self._connections
+        for _ in range(self.size):
+            old_connections.get().close()
+        old_connections.put(None)
+        self._connections = None
+
+    def open(self):
+        with self._lock:
+            if self._connections is None:
+                self._open_locked()
+
+    def close(self):
+        with self._lock:
+            self._close_locked()
+
+    def reload(self):
+        with self._lock:
+            self._close_locked()
+            self._open_locked()
+
+    @contextmanager
+    def connection(self):
+        while True:
+            if self._connections is None:
+                self.open()
+            connections = self._connections
+            if connections is None:
+                raise FileNotFoundError(f"Base SQLite introuvable : {self.db_path}")
+            conn = connections.get()
+            if conn is not None:
+                break
+            connections.put(None)
+        try:
+            yield conn
+        finally:
+            connections.put(conn)
@@ -0,0 +1,79 @@
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+
+class QueryRejected(Exception):
+    """File d'attente pleine : la requete est refusee immediatement (503)."""
+
+
+class QueryTimeout(Exception):
+    """La requete n'a pas abouti dans le delai imparti (504)."""
+
+
+class QueryExecutor:
+    """Execute les appels DuckDB/SQLite bloquants hors de la boucle asyncio.
+
+    Au plus `max_workers` requetes tournent en parallele et `max_queue`
+    attendent un thread ; au-dela, run() leve QueryRejected sans rien mettre
+    en file. Une requete qui depasse son delai libere l'appelant (QueryTimeout)
+    mais garde sa place jusqu'a la fin reelle de l'appel : le nombre de threads
+    occupes reste borne meme sous charge.
+    """
+
+    def __init__(self, max_workers=8, max_queue=64, timeout=5.0):
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self._executor = None
+        self._lock = threading.Lock()
+        self.pending = 0
+        self.rejected = 0
+        self.timeouts = 0
+
+    def open(self):
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="query")
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def _release(self, _future):
+        with self._lock:
+            self.pending -= 1
+
+    async def run(self, func, *args, timeout=None):
+        with self._lock:
+            if self.pending >= self.max_workers + self.max_queue:
+                self.rejected += 1
+                raise QueryRejected()
+            self.pending += 1
+        self.open()
+        try:
+            future = self._executor.submit(func, *args)
+        except BaseException:
+            with self._lock:
+                self.pending -= 1
+            raise
+        future.add_done_callback(self._release)
+        try:
+            return await asyncio.wait_for(asyncio.wrap_future(future), timeout or self.timeout)
+        except asyncio.TimeoutError:
+            # Encore en file : on l'annule ; deja en cours : elle se termine en arriere-plan
+            future.cancel()
+            with self._lock:
+                self.timeouts += 1
+            raise QueryTimeout()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "max_workers": self.max_workers,
+                "max_queue": self.max_queue,
+                "timeout_seconds": self.timeout,
+                "pending": self.pending,
+                "rejected": self.rejected,
+                "timeouts": self.timeouts,
+            }
@@ -0,0 +1,100 @@
+import pyarrow.csv as pa_csv
+import pyarrow.ipc as pa_ipc
+import pyarrow.parquet as pq
+
+# format -> (type MIME, extension du fichier telecharge)
+EXPORT_FORMATS = {
+    "ndjson": ("application/x-ndjson", "ndjson"),
+    "csv": ("text/csv; charset=utf-8", "csv"),
+    "arrow": ("application/vnd.apache.arrow.stream", "arrow"),
+    "parquet": ("application/vnd.apache.parquet", "parquet"),
+}
+
+
+class ChunkSink:
+    """Fichier en ecriture minimal pour les writers pyarrow : drain() rend les octets ecrits depuis le dernier appel."""
+
+    def __init__(self):
+        self.closed = False
+        self._chunks = []
+        self._position = 0
+
+    def write(self, data):
+        data = bytes(data)
+        self._chunks.append(data)
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def writable(self):
+        return True
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self):
+        data = b"".join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def export_sql(columns, fmt, dept=None, postal_code=None):
+    """Requete d'export du Golden Record filtree par departement et/ou code postal.
+
+    En NDJSON, DuckDB serialise chaque ligne (to_json) : le flux est une
+    seule colonne texte dont les valeurs sont deja les lignes du fichier.
+    """
+    conditions = []
+    params = []
+    if dept:
+        # Departement = 2 premiers caracteres du code postal (meme regle que match.py)
+        conditions.append("SUBSTRING(code_postal, 1, 2) = ?")
+        params.append(dept)
+    if postal_code:
+        conditions.append("code_postal = ?")
+        params.append(postal_code)
+    query = f"SELECT {columns} FROM golden_record WHERE {' AND '.join(conditions) or 'true'}"
+    if fmt == "ndjson":
+        query = f"SELECT to_json(t) || chr(10) AS line FROM ({query}) t"
+    return query, params
+
+
+def _text_payload(column):
+    """Valeurs concatenees d'une colonne texte Arrow sans NULL, sans objet Python par ligne."""
+    offsets = memoryview(column.buffers()[1]).cast("i")
+    start, end = offsets[column.offset], offsets[column.offset + len(column)]
+    return column.buffers()[2][start:end].to_pybytes()
+
+
+def export_chunks(reader, fmt):
+    """Octets du fichier exporte, un morceau par lot Arrow (memoire bornee par la taille des lots)."""
+    if fmt == "ndjson":
+        for batch in reader:
+            if batch.num_rows:
+                yield _text_payload(batch.column(0))
+        return
+
+    sink = ChunkSink()
+    if fmt == "csv":
+        writer = pa_csv.CSVWriter(sink, reader.schema)
+    elif fmt == "arrow":
+        writer = pa_ipc.new_stream(sink, reader.schema)
+    else:
+        # Un row group par lot ; le pied de page Parquet part avec le dernier morceau
+        writer = pq.ParquetWriter(sink, reader.schema, compression="zstd")
+    try:
+        for batch in reader:
+            writer.write_batch(batch)
+            chunk = sink.drain()
+            if chunk:
+                yield chunk
+    finally:
+        writer.close()
+    chunk = sink.drain()
+    if chunk:
+        yield chunk
@@ -0,0 +1,149 @@
+import gzip
+from email.utils import formatdate, mktime_tz, parsedate_tz
+
+from fastapi.responses import JSONResponse, Response
+from starlette.routing import Match
+
+# Dependances optionnelles : serialisation orjson et compression brotli
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+class FastJSONResponse(JSONResponse):
+    """JSONResponse serialisee par orjson quand il est installe (module json sinon).
+
+    Retournee directement par les routes, elle evite aussi le passage par
+    jsonable_encoder de FastAPI ; le cache de reponses en garde les octets.
+    """
+
+    def render(self, content):
+        if orjson is None:
+            return super().render(content)
+        return orjson.dumps(content)
+
+
+def _accepted_encodings(accept_encoding):
+    """Codages acceptes par le client (Accept-Encoding), hors ceux marques q=0."""
+    accepted = set()
+    for item in accept_encoding.split(","):
+        name, _, params = item.partition(";")
+        quality = 1.0
+        for param in params.split(";"):
+            key, _, value = param.strip().partition("=")
+            if key == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        if quality > 0:
+            accepted.add(name.strip().lower())
+    return accepted
+
+
+class HttpCache:
+    """Validateurs HTTP (ETag, Last-Modified) et compression des routes de lecture.
+
+    Le contenu de ces routes ne depend que de leurs parametres et du build
+    ETL : l'ETag est la version de build_version.json, identique pour tous
+    les workers et serveurs, et Last-Modified sa date. Une requete
+    conditionnelle sur la version courante recoit un 304 avant d'atteindre
+    la route (ni cache de reponses, ni DuckDB, ni SQLite). L'ETag est faible :
+    il couvre les variantes gzip/brotli/identite d'une meme reponse.
+    """
+
+    def __init__(self, data_version, route_paths, max_age=60, min_compress_size=1024,
+                 gzip_level=6, brotli_quality=4):
+        self.data_version = data_version
+        self.route_paths = frozenset(route_paths)
+        self.max_age = max_age
+        self.min_compress_size = min_compress_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+
+    def route(self, scope, routes):
+        """Route GET cacheable servant la requete, None sinon (les autres routes passent sans traitement)."""
+        if scope["method"] != "GET":
+            return None
+        for route in routes:
+            match, _ = route.matches(scope)
+            if match == Match.FULL:
+                return route if route.path in self.route_paths else None
+        return None
+
+    def validators(self):
+        """En-tetes de cache de la version courante, None tant qu'aucun build n'est tamponne."""
+        build = self.data_version.build
+        if build is None:
+            return None
+        headers = {
+            "etag": f'W/"{build}"',
+            "cache-control": f"public, max-age={self.max_age}",
+            "vary": "Accept-Encoding",
+        }
+        if self.data_version.built_at is not None:
+            headers["last-modified"] = formatdate(self.data_version.built_at, usegmt=True)
+        return headers
+
+    def is_fresh(self, request_headers, validators):
+        """Vrai si la copie du client correspond a la version courante (reponse 304 avant la route)."""
+        if_none_match = request_headers.get("if-none-match")
+        if if_none_match is not None:
+            # "*" ne vaut que si la ressource existe : traite dans finalize(), apres la route
+            if if_none_match.strip() == "*":
+                return False
+            # Comparaison faible (RFC 9110) : W/"v" et "v" designent la meme version
+            etag = validators["etag"].removeprefix("W/")
+            return any(tag.strip().removeprefix("W/") == etag for tag in if_none_match.split(","))
+        # If-Modified-Since n'est pris en compte qu'en l'absence d'If-None-Match
+        if_modified_since = request_headers.get("if-modified-since")
+        if if_modified_since and self.data_version.built_at is not None:
+            parsed = parsedate_tz(if_modified_since)
+            return parsed is not None and mktime_tz(parsed) >= int(self.data_version.built_at)
+        return False
+
+    def not_modified(self, validators):
+        return Response(status_code=304, headers=validators)
+
+    def encoding(self, accept_encoding):
+        """Codage retenu pour le client : brotli s'il est installe et accepte, puis gzip."""
+        accepted = _accepted_encodings(accept_encoding)
+        if brotli is not None and "br" in accepted:
+            return "br"
+        if "gzip" in accepted:
+            return "gzip"
+        return None
+
+    def compress(self, body, encoding):
+        if encoding == "br":
+            return brotli.compress(body, quality=self.brotli_quality)
+        # mtime fixe : meme reponse, memes octets
+        return gzip.compress(body, compresslevel=self.gzip_level, mtime=0)
+
+    async def finalize(self, request, response, validators):
+        """Ajoute les validateurs (reponses 200) et compresse le corps au-dela de min_compress_size.
+
+        Les corps de ces routes sont bornes (pages, lots limites) : ils sont
+        lus en entier puis compresses en une fois.
+        """
+        body = b"".join([chunk async for chunk in response.body_iterator])
+        # If-None-Match: * correspond a toute representation existante (RFC 9110, section 13.1.2)
+        if (validators and 200 <= response.status_code < 300
+                and request.headers.get("if-none-match", "").strip() == "*"):
+            return self.not_modified(validators)
+        headers = {name: value for name, value in response.headers.items() if name != "content-length"}
+        headers["vary"] = "Accept-Encoding"
+        if response.status_code == 200 and validators:
+            headers.update(validators)
+        if len(body) >= self.min_compress_size and "content-encoding" not in headers:
+            encoding = self.encoding(request.headers.get("accept-encoding", ""))
+            if encoding is not None:
+                body = self.compress(body, encoding)
+                headers["content-encoding"] = encoding
+        return Response(content=body, status_code=response.status_code, headers=headers)
@@ -1,11 +1,204 @@
 from fastapi import FastAPI, HTTPException, Request
-from fastapi.responses import JSONResponse, FileResponse
+from fastapi.responses import JSONResponse, FileResponse, PlainTextResponse, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
-import duckdb
-import sqlite3
+from contextlib import asynccontextmanager
+import asyncio
+import json
 import os
+import threading
+import time
 
-app = FastAPI(title="API SIRENE RNA BAN")
+from api.cache import ResponseCache, cached
+from api.db import DuckDBPool, SQLitePool
+from api.export import EXPORT_FORMATS, export_chunks, export_sql
+from api.executor import QueryExecutor, QueryRejected, QueryTimeout
+from api.http_cache import FastJSONResponse, HttpCache
+from api.metrics import Metrics
+from api.nearby import NEARBY_SQL, nearby_params
+from api.search import SEARCH_SQL, decode_cursor, encode_cursor, fts_query
+from api.mmap_index import MmapIndex
+from api.stats import StatsIndex
+from api.version import DataVersion
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PARQUET_GOLD_DIR = os.path.join(BASE_DIR, "data", "parquet", "gold")
+DB_DIR = os.path.join(BASE_DIR, "duckdb")
+INDEX_HTML_PATH = os.path.join(BASE_DIR, "index.html").replace('\\', '/')
+GOLDEN_RECORD_PATH = os.path.join(PARQUET_GOLD_DIR, "golden_record.parquet").replace('\\', '/')
+STATS_VIEW_PATH = os.path.join(PARQUET_GOLD_DIR, "stats_view.parquet").replace('\\', '/')
+NEARBY_INDEX_PATH = os.path.join(PARQUET_GOLD_DIR, "nearby_index.parquet").replace('\\', '/')
+SIRET_INDEX_PATH = os.path.join(PARQUET_GOLD_DIR, "siret_index.arrow")
+RNA_INDEX_PATH = os.path.join(PARQUET_GOLD_DIR, "rna_index.arrow")
+CATALOG_DB_PATH = os.path.join(DB_DIR, "catalog.db")
+GOLD_DB_PATH = os.path.join(DB_DIR, "gold.duckdb")
+BUILD_VERSION_PATH = os.path.join(PARQUET_GOLD_DIR, "build_version.json")
+
+# Taille du pool de curseurs DuckDB par worker uvicorn
+DUCKDB_POOL_SIZE = int(os.environ.get("DUCKDB_POOL_SIZE", "4"))
+
+# Base Gold persistée (triée + indexée sur siret), ouverte une seule fois par worker
+gold_pool = DuckDBPool(
+    GOLD_DB_PATH,
+    fallback_views={"golden_record": GOLDEN_RECORD_PATH, "nearby_index": NEARBY_INDEX_PATH},
+    size=DUCKDB_POOL_SIZE,
+)
+
+GOLDEN_COLUMNS = "siret, status, name, code_postal, city, rna, latitude, longitude, is_ban_validated, geocode_level"
+
+# Index SIRET projete en memoire (mmap), partage par tous les workers via le
+# cache du systeme ; lookups servis par la base Gold tant qu'il n'existe pas
+siret_index = MmapIndex(SIRET_INDEX_PATH, "siret_key", GOLDEN_COLUMNS.split(", "))
+
+# Index inverse RNA -> etablissements lies (meme format, trie par id_rna)
+rna_index = MmapIndex(RNA_INDEX_PATH, "id_rna", GOLDEN_COLUMNS.split(", "))
+RNA_BATCH_MAX = int(os.environ.get("RNA_BATCH_MAX", "1000"))
+
+# Nombre maximum de SIRET acceptes par appel a /api/v1/siret/batch
+SIRET_BATCH_MAX = int(os.environ.get("SIRET_BATCH_MAX", "1000"))
+
+# Recherche par rayon (/api/v1/nearby), rayon en km
+NEARBY_DEFAULT_LIMIT = 20
+NEARBY_MAX_LIMIT = int(os.environ.get("NEARBY_MAX_LIMIT", "100"))
+NEARBY_MAX_RADIUS_KM = float(os.environ.get("NEARBY_MAX_RADIUS_KM", "50"))
+
+
+# Export en flux (/api/v1/export) : lignes par lot Arrow (= par morceau HTTP)
+# et nombre d'exports simultanes par worker (503 au-dela)
+EXPORT_BATCH_ROWS = int(os.environ.get("EXPORT_BATCH_ROWS", "65536"))
+EXPORT_MAX_CONCURRENT = int(os.environ.get("EXPORT_MAX_CONCURRENT", "2"))
+export_slots = threading.BoundedSemaphore(EXPORT_MAX_CONCURRENT)
+
+
+# Index FTS5 (catalog.db) : connexions en lecture seule ouvertes une fois par worker
+SQLITE_POOL_SIZE = int(os.environ.get("SQLITE_POOL_SIZE", "4"))
+SQLITE_MMAP_SIZE = int(os.environ.get("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024)))
+search_pool = SQLitePool(CATALOG_DB_PATH, size=SQLITE_POOL_SIZE, mmap_size=SQLITE_MMAP_SIZE)
+
+# Pagination de /api/v1/search
+SEARCH_DEFAULT_LIMIT = 10
+SEARCH_MAX_LIMIT = int(os.environ.get("SEARCH_MAX_LIMIT", "100"))
+
+# Requetes DuckDB/SQLite executees hors de la boucle asyncio : threads bornes,
+# file d'attente limitee (503 au-dela) et delai maximum par requete (504)
+QUERY_WORKERS = int(os.environ.get("QUERY_WORKERS", str(DUCKDB_POOL_SIZE + SQLITE_POOL_SIZE)))
+QUERY_QUEUE_MAX = int(os.environ.get("QUERY_QUEUE_MAX", "64"))
+QUERY_TIMEOUT = float(os.environ.get("QUERY_TIMEOUT", "5"))
+query_executor = QueryExecutor(max_workers=QUERY_WORKERS, max_queue=QUERY_QUEUE_MAX, timeout=QUERY_TIMEOUT)
+
+# Vue Statistiques (~6k codes postaux) servie depuis la memoire de chaque worker
+stats_index = StatsIndex(STATS_VIEW_PATH)
+
+# Cache de reponses par worker (siret, search)
+RESPONSE_CACHE_MAX_ENTRIES = int(os.environ.get("RESPONSE_CACHE_MAX_ENTRIES", "20000"))
+RESPONSE_CACHE_TTL = float(os.environ.get("RESPONSE_CACHE_TTL", "600"))
+response_cache = ResponseCache(max_entries=RESPONSE_CACHE_MAX_ENTRIES, ttl=RESPONSE_CACHE_TTL)
+
+# Detection des rebuilds ETL (tampon de version + mtimes des artefacts Gold)
+DATA_VERSION_POLL_SECONDS = float(os.environ.get("DATA_VERSION_POLL_SECONDS", "2"))
+data_version = DataVersion(
+    BUILD_VERSION_PATH,
+    [GOLDEN_RECORD_PATH, STATS_VIEW_PATH, NEARBY_INDEX_PATH, SIRET_INDEX_PATH, RNA_INDEX_PATH,
+     GOLD_DB_PATH, CATALOG_DB_PATH],
+)
+data_version.on_change(gold_pool.reload)
+data_version.on_change(search_pool.reload)
+data_version.on_change(stats_index.load)
+data_version.on_change(siret_index.load)
+data_version.on_change(rna_index.load)
+# En dernier : les requetes servies par les anciennes donnees pendant les
+# rechargements ne doivent pas laisser d'entrees perimees dans le cache
+data_version.on_change(response_cache.clear)
+
+# Cache HTTP des routes de lecture : ETag/Last-Modified tires du build ETL
+# (304 sans requete), compression gzip/brotli au-dela de HTTP_COMPRESS_MIN_BYTES
+HTTP_CACHE_MAX_AGE = int(os.environ.get("HTTP_CACHE_MAX_AGE", "60"))
+HTTP_COMPRESS_MIN_BYTES = int(os.environ.get("HTTP_COMPRESS_MIN_BYTES", "1024"))
+http_cache = HttpCache(
+    data_version,
+    [
+        "/api/v1/siret/{siret}",
+        "/api/v1/rna/{id_rna}",
+        "/api/v1/search",
+        "/api/v1/nearby",
+        "/api/v1/stats",
+        "/api/v1/stats/departement/{dept}",
+        "/api/v1/stats/{postal_code}",
+    ],
+    max_age=HTTP_CACHE_MAX_AGE,
+    min_compress_size=HTTP_COMPRESS_MIN_BYTES,
+)
+
+# Metriques Prometheus (/metrics) : instantane par worker dans un dossier
+# partage, agrege sur tous les workers uvicorn a chaque lecture
+METRICS_DIR = os.environ.get("METRICS_DIR", os.path.join(DB_DIR, "api_metrics"))
+METRICS_FLUSH_SECONDS = float(os.environ.get("METRICS_FLUSH_SECONDS", "1"))
+metrics = Metrics(METRICS_DIR, flush_seconds=METRICS_FLUSH_SECONDS)
+
+@metrics.collector
+def collect_state():
+    cache = response_cache.stats()
+    queries = query_executor.stats()
+    return [
+        ("api_cache_entries", cache["entries"], {}),
+        ("api_cache_hits_total", cache["hits"], {}),
+        ("api_cache_misses_total", cache["misses"], {}),
+        ("api_cache_evictions_total", cache["evictions"], {}),
+        ("api_cache_invalidations_total", cache["invalidations"], {}),
+        ("api_query_executor_pending", queries["pending"], {}),
+        ("api_query_rejected_total", queries["rejected"], {}),
+        ("api_query_timeouts_total", queries["timeouts"], {}),
+        ("api_data_version_info", 1, {"build": data_version.build or ""}),
+    ]
+
+
+async def watch_data_version():
+    while True:
+        await asyncio.sleep(DATA_VERSION_POLL_SECONDS)
+        try:
+            await asyncio.to_thread(data_version.check)
+        except Exception as e:
+            print(f"Erreur rechargement des donnees : {e}")
+
+async def flush_metrics():
+    while True:
+        await asyncio.sleep(metrics.flush_seconds)
+        try:
+            await asyncio.to_thread(metrics.flush)
+        except Exception as e:
+            print(f"Erreur ecriture des metriques : {e}")
+
+@asynccontextmanager
+async def lifespan(app):
+    metrics.open()
+    query_executor.open()
+    gold_pool.open()
+    search_pool.open()
+    stats_index.load()
+    siret_index.load()
+    rna_index.load()
+    watcher = asyncio.create_task(watch_data_version())
+    flusher = asyncio.create_task(flush_metrics())
+    yield
+    watcher.cancel()
+    flusher.cancel()
+    metrics.close()
+    query_executor.close()
+    gold_pool.close()
+    search_pool.close()
+
+app = FastAPI(title="API SIRENE RNA BAN", lifespan=lifespan)
+
+@app.middleware("http")
+async def http_caching(request: Request, call_next):
+    # Declare avant CORS : les 304 et les reponses compressees en recoivent les en-tetes
+    route = http_cache.route(request.scope, app.router.routes)
+    if route is None:
+        return await call_next(request)
+    validators = http_cache.validators()
+    if validators and http_cache.is_fresh(request.headers, validators):
+        request.scope["route"] = route
+        return http_cache.not_modified(validators)
+    return await http_cache.finalize(request, await call_next(request), validators)
 
 # --- AJOUT DU CORS ICI ---
 app.add_middleware(
@@ -16,13 +209,138 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-PARQUET_GOLD_DIR = os.path.join(BASE_DIR, "data", "parquet", "gold")
-DB_DIR = os.path.join(BASE_DIR, "duckdb")
-INDEX_HTML_PATH = os.path.join(BASE_DIR, "index.html").replace('\\', '/')
-GOLDEN_RECORD_PATH = os.path.join(PARQUET_GOLD_DIR, "golden_record.parquet").replace('\\', '/')
-STATS_VIEW_PATH = os.path.join(PARQUET_GOLD_DIR, "stats_view.parquet").replace('\\', '/')
-CATALOG_DB_PATH = os.path.join(DB_DIR, "catalog.db")
+@app.middleware("http")
+async def record_metrics(request: Request, call_next):
+    # Route = motif declare (/api/v1/siret/{siret}) : une serie par route, pas par URL
+    metrics.inc("api_requests_in_flight")
+    start = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        route = getattr(request.scope.get("route"), "path", "unmatched")
+        metrics.inc("api_requests_in_flight", -1)
+        metrics.observe("api_request_duration_seconds", time.perf_counter() - start, route=route)
+        metrics.inc("api_requests_total", route=route, method=request.method, status=str(status))
+        if status >= 500:
+            metrics.inc("api_errors_total", route=route, status=str(status))
+
+@app.exception_handler(QueryRejected)
+async def query_rejected_handler(request, exc):
+    return JSONResponse(
+        status_code=503,
+        headers={"Retry-After": "1"},
+        content={"error": "OVERLOADED", "message": "Serveur sature, reessayer plus tard."}
+    )
+
+@app.exception_handler(QueryTimeout)
+async def query_timeout_handler(request, exc):
+    return JSONResponse(
+        status_code=504,
+        content={"error": "QUERY TIMEOUT", "message": f"Requete interrompue apres {query_executor.timeout:g} s."}
+    )
+
+
+# --- Acces aux donnees (bloquant, execute par query_executor) ---
+
+def fetch_golden(siret, timer):
+    # Point lookup sur la table triee/indexee : sonde d'un seul row group
+    timer.phase("acquire")
+    with gold_pool.cursor() as cur:
+        timer.phase("execute")
+        return cur.execute(f"SELECT {GOLDEN_COLUMNS} FROM golden_record WHERE siret = ?", [siret]).fetchone()
+
+def fetch_golden_batch(sirets, timer):
+    # Une seule jointure vectorisee entre la liste de cles et le Golden Record
+    query = f"""
+        SELECT {GOLDEN_COLUMNS} FROM golden_record
+        WHERE siret IN (SELECT UNNEST(?::VARCHAR[]))
+    """
+    timer.phase("acquire")
+    with gold_pool.cursor() as cur:
+        timer.phase("execute")
+        return {row[0]: row for row in cur.execute(query, [sirets]).fetchall()}
+
+def fetch_nearby(params, timer):
+    # Plage de cellules de la grille + rectangle, puis distance exacte sur les seuls candidats
+    timer.phase("acquire")
+    with gold_pool.cursor() as cur:
+        timer.phase("execute")
+        return cur.execute(NEARBY_SQL, params).fetchall()
+
+def open_export(query, params, timer):
+    # Curseur dedie : un export long ne monopolise pas un curseur du pool
+    timer.phase("acquire")
+    cur = gold_pool.detached_cursor()
+    timer.phase("execute")
+    try:
+        return cur, cur.execute(query, params).to_arrow_reader(EXPORT_BATCH_ROWS)
+    except Exception:
+        cur.close()
+        raise
+
+def stream_export(cur, reader, fmt):
+    try:
+        with metrics.query("export", "duckdb", phase="stream"):
+            yield from export_chunks(reader, fmt)
+    finally:
+        cur.close()
+        export_slots.release()
+
+def fetch_search(query, params, timer):
+    timer.phase("acquire")
+    with search_pool.connection() as conn:
+        timer.phase("execute")
+        return conn.execute(query, params).fetchall()
+
+
+def is_valid_siret(siret):
+    # isascii : isdigit accepte aussi les chiffres Unicode ("²", "٣"...)
+    return isinstance(siret, str) and len(siret) == 14 and siret.isascii() and siret.isdigit()
+
+def is_valid_rna(id_rna):
+    # W + 9 caracteres (chiffres, ou departement 2A/2B en tete)
+    return isinstance(id_rna, str) and len(id_rna) == 10 and id_rna[0] == "W" and id_rna.isalnum() and id_rna.isascii()
+
+async def read_batch_keys(request):
+    """Cles d'un appel batch : liste JSON, ou une cle par ligne en texte brut.
+
+    None si le JSON est invalide ou n'est pas une liste de chaines.
+    """
+    body = await request.body()
+    if "json" in request.headers.get("content-type", ""):
+        try:
+            keys = json.loads(body)
+        except ValueError:
+            return None
+        if not isinstance(keys, list) or not all(isinstance(key, str) for key in keys):
+            return None
+        return keys
+    return [line.strip() for line in body.decode("utf-8", errors="replace").splitlines() if line.strip()]
+
+def format_golden_record(result):
+    """Construit la reponse identity/asso_id/location a partir d'une ligne du Golden Record."""
+    return {
+        "identity": {
+            "siret": result[0],
+            "nom_raison_sociale": result[2],
+            "enseigne": None,
+            "status": result[1]
+        },
+        "asso_id": {
+            "id_rna": result[5] if result[5] else None
+        },
+        "location": {
+            "code_postal": result[3],
+            "commune": result[4],
+            "latitude": result[6],
+            "longitude": result[7],
+            "is_ban_validated": result[8],
+            "geocode_level": result[9]
+        }
+    }
 
 
 @app.get("/")
@@ -33,9 +351,20 @@ async def read_index():
 async def healthcheck():
     return {"status": "ok"}
 
+@app.get("/metrics")
+async def get_metrics():
+    # Lecture des instantanes de tous les workers : fichiers locaux, hors boucle asyncio
+    body = await asyncio.to_thread(metrics.render)
+    return PlainTextResponse(body, media_type="text/plain; version=0.0.4; charset=utf-8")
+
+@app.get("/api/v1/cache/stats")
+async def cache_stats():
+    return {"data_version": data_version.build, **response_cache.stats(), "queries": query_executor.stats()}
+
 @app.get("/api/v1/siret/{siret}")
+@cached(response_cache, "siret")
 async def get_siret(siret: str):
-    if len(siret) != 14 or not siret.isdigit():
+    if not is_valid_siret(siret):
         return JSONResponse(
             status_code=400,
             content={
@@ -44,17 +373,18 @@ async def get_siret(siret: str):
             }
         )
         
-    query = f"""
-        SELECT * FROM read_parquet('{GOLDEN_RECORD_PATH}')
-        WHERE siret = '{siret}'
-    """
-    
     try:
-        # Ouverture d'une connexion isolée en lecture seule pour le multi-threading
-        with duckdb.connect(database=':memory:', read_only=False) as conn:
-            result = conn.execute(query).fetchone()
+        if siret_index.available:
+            # Quelques microsecondes sur des pages partagees : pas de passage par l'executeur
+            timer = metrics.timer("golden", "mmap", phase="execute")
+            result = siret_index.get(siret)
+        else:
+            timer = metrics.timer("golden", "duckdb")
+            result = await query_executor.run(fetch_golden, siret, timer)
+        timer.phase("serialize")
         
         if not result:
+            timer.stop()
             return JSONResponse(
                 status_code=404,
                 content={
@@ -64,90 +394,338 @@ async def get_siret(siret: str):
                 }
             )
             
-        response_data = {
-            "identity": {
-                "siret": result[0],
-                "nom_raison_sociale": result[2],
-                "enseigne": None,
-                "status": result[1]
-            },
-            "asso_id": {
-                "id_rna": result[5] if result[5] else None
-            },
-            "location": {
-                "code_postal": result[3],
-                "commune": result[4],
-                "latitude": result[6],
-                "longitude": result[7],
-                "is_ban_validated": result[8]
-            }
-        }
-        return response_data
+        response = FastJSONResponse(format_golden_record(result))
+        timer.stop()
+        return response
         
+    except (QueryRejected, QueryTimeout):
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/api/v1/siret/batch")
+async def get_siret_batch(request: Request):
+    # Corps accepte : liste JSON de SIRET, ou un SIRET par ligne en texte brut
+    sirets = await read_batch_keys(request)
+    if sirets is None:
+        return JSONResponse(
+            status_code=400,
+            content={"error": "INVALID BODY", "message": "Le corps doit etre une liste JSON de SIRET."}
+        )
+
+    if len(sirets) > SIRET_BATCH_MAX:
+        return JSONResponse(
+            status_code=413,
+            content={"error": "BATCH TOO LARGE", "message": f"Maximum {SIRET_BATCH_MAX} SIRET par appel."}
+        )
+
+    valid_sirets = list({siret for siret in sirets if is_valid_siret(siret)})
+
+    try:
+        if siret_index.available:
+            timer = metrics.timer("golden_batch", "mmap", phase="execute")
+            records = siret_index.get_many(valid_sirets)
+        else:
+            timer = metrics.timer("golden_batch", "duckdb")
+            records = await query_executor.run(fetch_golden_batch, valid_sirets, timer) if valid_sirets else {}
+    except (QueryRejected, QueryTimeout):
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+    timer.phase("serialize")
+    results = []
+    found = 0
+    for siret in sirets:
+        if not is_valid_siret(siret):
+            results.append({
+                "input": siret,
+                "error": "INVALID FORMAT",
+                "message": "Le siret doit contenir 14 chiffres."
+            })
+        elif siret not in records:
+            results.append({
+                "input": siret,
+                "error": "SIRET NOT FOUND",
+                "message": f"Le siret {siret} est inconnu."
+            })
+        else:
+            found += 1
+            results.append({"input": siret, **format_golden_record(records[siret])})
+
+    response = FastJSONResponse({
+        "count": len(results),
+        "found": found,
+        "results": results
+    })
+    timer.stop()
+    return response
+
+def rna_unavailable():
+    return JSONResponse(
+        status_code=503,
+        headers={"Retry-After": "30"},
+        content={"error": "INDEX UNAVAILABLE", "message": "Index RNA non construit (lancer 'make views')."}
+    )
+
+def format_rna_links(id_rna, rows):
+    return {"id_rna": id_rna, "count": len(rows), "establishments": [format_golden_record(row) for row in rows]}
+
+@app.get("/api/v1/rna/{id_rna}")
+@cached(response_cache, "rna")
+async def get_rna(id_rna: str):
+    # Etablissements lies a une association : plage de l'index trie par id_rna
+    id_rna = id_rna.upper()
+    if not is_valid_rna(id_rna):
+        return JSONResponse(
+            status_code=400,
+            content={"error": "INVALID FORMAT", "message": "L'identifiant RNA doit etre W suivi de 9 caracteres."}
+        )
+    if not rna_index.available:
+        return rna_unavailable()
+
+    timer = metrics.timer("rna", "mmap", phase="execute")
+    rows = rna_index.get_all(id_rna)
+    timer.phase("serialize")
+    if not rows:
+        timer.stop()
+        return JSONResponse(
+            status_code=404,
+            content={
+                "error": "RNA NOT FOUND",
+                "message": f"Aucun etablissement lie a l'association {id_rna}.",
+                "input": id_rna
+            }
+        )
+    response = FastJSONResponse(format_rna_links(id_rna, rows))
+    timer.stop()
+    return response
+
+@app.post("/api/v1/rna/batch")
+async def get_rna_batch(request: Request):
+    # Corps accepte : liste JSON d'identifiants RNA, ou un identifiant par ligne en texte brut
+    ids = await read_batch_keys(request)
+    if ids is None:
+        return JSONResponse(
+            status_code=400,
+            content={"error": "INVALID BODY", "message": "Le corps doit etre une liste JSON d'identifiants RNA."}
+        )
+    if len(ids) > RNA_BATCH_MAX:
+        return JSONResponse(
+            status_code=413,
+            content={"error": "BATCH TOO LARGE", "message": f"Maximum {RNA_BATCH_MAX} identifiants RNA par appel."}
+        )
+    if not rna_index.available:
+        return rna_unavailable()
+
+    normalized = [id_rna.upper() if isinstance(id_rna, str) else id_rna for id_rna in ids]
+    timer = metrics.timer("rna_batch", "mmap", phase="execute")
+    records = rna_index.get_all_many({id_rna for id_rna in normalized if is_valid_rna(id_rna)})
+    timer.phase("serialize")
+    results = []
+    for id_input, id_rna in zip(ids, normalized):
+        if not is_valid_rna(id_rna):
+            results.append({
+                "input": id_input,
+                "error": "INVALID FORMAT",
+                "message": "L'identifiant RNA doit etre W suivi de 9 caracteres."
+            })
+        elif id_rna not in records:
+            results.append({
+                "input": id_input,
+                "error": "RNA NOT FOUND",
+                "message": f"Aucun etablissement lie a l'association {id_rna}."
+            })
+        else:
+            results.append({"input": id_input, **format_rna_links(id_rna, records[id_rna])})
+
+    response = FastJSONResponse({
+        "count": len(results),
+        "found": sum(1 for id_rna in normalized if is_valid_rna(id_rna) and id_rna in records),
+        "results": results
+    })
+    timer.stop()
+    return response
+
 @app.get("/api/v1/search")
-async def search(q: str, dept: str = None, postal_code: str = None):
+@cached(response_cache, "search")
+async def search(
+    q: str,
+    dept: str = None,
+    postal_code: str = None,
+    typeahead: bool = False,
+    limit: int = SEARCH_DEFAULT_LIMIT,
+    offset: int = 0,
+    cursor: str = None,
+):
+    if not 1 <= limit <= SEARCH_MAX_LIMIT:
+        raise HTTPException(status_code=400, detail=f"limit doit etre compris entre 1 et {SEARCH_MAX_LIMIT}")
+    if offset < 0:
+        raise HTTPException(status_code=400, detail="offset doit etre positif")
+
+    match = fts_query(q, typeahead=typeahead, dept=dept, postal_code=postal_code)
+    if match is None:
+        return {"query": q, "count": 0, "results": [], "next_cursor": None}
+
+    # Pagination par curseur (score, rowid) : pas de lignes relues puis jetees comme avec OFFSET
+    query = SEARCH_SQL
+    params = [match]
+    if cursor:
+        try:
+            last_score, last_rowid = decode_cursor(cursor)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Curseur de pagination invalide")
+        query += " WHERE score > ? OR (score = ? AND rowid > ?)"
+        params += [last_score, last_score, last_rowid]
+        offset = 0
+    query += " ORDER BY score, rowid LIMIT ? OFFSET ?"
+    params += [limit + 1, offset]
+
+    timer = metrics.timer("search", "sqlite")
     try:
-        conn = sqlite3.connect(CATALOG_DB_PATH)
-        conn.row_factory = sqlite3.Row
-        cursor = conn.cursor()
-        
-        base_query = "SELECT siret, name, city, is_association FROM search_view WHERE search_view MATCH ?"
-        params = [q]
-        
-        if dept:
-            base_query += " AND postal_code LIKE ?"
-            params.append(f"{dept}%")
-        elif postal_code:
-            base_query += " AND postal_code = ?"
-            params.append(postal_code)
-            
-        base_query += " LIMIT 10"
-        
-        cursor.execute(base_query, params)
-        rows = cursor.fetchall()
-        
-        results = [dict(row) for row in rows]
-        for r in results:
-            r['is_association'] = True if r['is_association'] == 'true' else False
-            
-        return {
-            "query": q,
-            "count": len(results),
-            "results": results
-        }
+        rows = await query_executor.run(fetch_search, query, params, timer)
+    except (QueryRejected, QueryTimeout):
+        raise
+    except FileNotFoundError as e:
+        raise HTTPException(status_code=503, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
-    finally:
-        conn.close()
 
-@app.get("/api/v1/stats/{postal_code}")
-def get_stats(postal_code: str):
-    query = f"""
-        SELECT * FROM read_parquet('{STATS_VIEW_PATH}')
-        WHERE code_postal = '{postal_code}'
-    """
-    
+    timer.phase("serialize")
+    page = rows[:limit]
+    results = [
+        {
+            "siret": row["siret"],
+            "name": row["name"],
+            "city": row["city"],
+            "is_association": row["is_association"] == 'true',
+        }
+        for row in page
+    ]
+    next_cursor = encode_cursor(page[-1]["score"], page[-1]["rowid"]) if len(rows) > limit else None
+    response = FastJSONResponse({
+        "query": q,
+        "count": len(results),
+        "results": results,
+        "next_cursor": next_cursor,
+    })
+    timer.stop()
+    return response
+
+@app.get("/api/v1/nearby")
+@cached(response_cache, "nearby")
+async def nearby(lat: float, lon: float, radius: float = 1.0, limit: int = NEARBY_DEFAULT_LIMIT):
+    if not (-90 <= lat <= 90 and -180 <= lon <= 180):
+        raise HTTPException(status_code=400, detail="lat doit etre entre -90 et 90, lon entre -180 et 180")
+    if not 0 < radius <= NEARBY_MAX_RADIUS_KM:
+        raise HTTPException(status_code=400, detail=f"radius (km) doit etre compris entre 0 et {NEARBY_MAX_RADIUS_KM:g}")
+    if not 1 <= limit <= NEARBY_MAX_LIMIT:
+        raise HTTPException(status_code=400, detail=f"limit doit etre compris entre 1 et {NEARBY_MAX_LIMIT}")
+
+    timer = metrics.timer("nearby", "duckdb")
     try:
-        # Ouverture d'une connexion isolée en lecture seule pour le multi-threading
-        with duckdb.connect(database=':memory:', read_only=False) as conn:
-            result = conn.execute(query).fetchone()
-        
-        if not result:
-            return JSONResponse(
-                status_code=404,
-                content={"error": "Not Found", "message": "Aucune donnee pour ce code postal."}
-            )
-            
-        return {
-            "zone": result[0],
-            "total_entites": result[1],
-            "repartition": {
-                "associations": result[2],
-                "entreprises_pures": result[3]
-            }
+        rows = await query_executor.run(fetch_nearby, nearby_params(lat, lon, radius, limit), timer)
+    except (QueryRejected, QueryTimeout):
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+    timer.phase("serialize")
+    results = [
+        {
+            "siret": row[0],
+            "name": row[2],
+            "status": row[1],
+            "code_postal": row[3],
+            "commune": row[4],
+            "id_rna": row[5] if row[5] else None,
+            "is_association": bool(row[5]),
+            "latitude": row[6],
+            "longitude": row[7],
+            "geocode_level": row[8],
+            "distance_km": round(row[9], 3),
         }
+        for row in rows
+    ]
+    response = FastJSONResponse({"lat": lat, "lon": lon, "radius_km": radius, "count": len(results), "results": results})
+    timer.stop()
+    return response
+
+@app.get("/api/v1/export")
+async def export(dept: str = None, postal_code: str = None, format: str = "ndjson"):
+    if format not in EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"format doit etre parmi : {', '.join(EXPORT_FORMATS)}")
+    if not dept and not postal_code:
+        raise HTTPException(status_code=400, detail="Filtre dept ou postal_code obligatoire")
+    # Meme regle que les donnees : 2 premiers chiffres du code postal (Corse 20, outre-mer 97)
+    if dept and not (len(dept) == 2 and dept.isascii() and dept.isdigit()):
+        raise HTTPException(
+            status_code=400,
+            detail="dept = 2 premiers chiffres du code postal (ex. 75, 20 pour la Corse, 97 pour l'outre-mer)"
+        )
+    if postal_code and not (len(postal_code) == 5 and postal_code.isdigit()):
+        raise HTTPException(status_code=400, detail="postal_code doit contenir 5 chiffres")
+
+    if not export_slots.acquire(blocking=False):
+        raise QueryRejected()
+    query, params = export_sql(GOLDEN_COLUMNS, format, dept=dept, postal_code=postal_code)
+    timer = metrics.timer("export", "duckdb")
+    try:
+        cur, reader = await query_executor.run(open_export, query, params, timer)
+        timer.stop()
+    except (QueryRejected, QueryTimeout):
+        export_slots.release()
+        raise
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
+        export_slots.release()
+        raise HTTPException(status_code=500, detail=str(e))
+
+    # Reponse chunked : un morceau par lot Arrow, la memoire ne depend pas du volume exporte
+    media_type, extension = EXPORT_FORMATS[format]
+    filename = f"golden_record_{postal_code or dept}.{extension}"
+    return StreamingResponse(
+        stream_export(cur, reader, format),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
+
+def format_stats(zone, totals):
+    return {
+        "zone": zone,
+        "total_entites": totals[0],
+        "repartition": {
+            "associations": totals[1],
+            "entreprises_pures": totals[2]
+        }
+    }
+
+@app.get("/api/v1/stats")
+async def get_stats_national():
+    totals = stats_index.national()
+    if totals is None:
+        return JSONResponse(
+            status_code=404,
+            content={"error": "Not Found", "message": "Aucune statistique disponible."}
+        )
+    return FastJSONResponse({**format_stats("FR", totals), "codes_postaux": totals[3]})
+
+@app.get("/api/v1/stats/departement/{dept}")
+async def get_stats_departement(dept: str):
+    totals = stats_index.departement(dept)
+    if totals is None:
+        return JSONResponse(
+            status_code=404,
+            content={"error": "Not Found", "message": "Aucune donnee pour ce departement."}
+        )
+    return FastJSONResponse({**format_stats(dept, totals), "codes_postaux": totals[3]})
+
+@app.get("/api/v1/stats/{postal_code}")
+async def get_stats(postal_code: str):
+    # Lecture O(1) dans la vue chargee en memoire au demarrage du worker
+    totals = stats_index.postal_code(postal_code)
+    if totals is None:
+        return JSONResponse(
+            status_code=404,
+            content={"error": "Not Found", "message": "Aucune donnee pour ce code postal."}
+        )
+    return FastJSONResponse(format_stats(postal_code, totals))
\ No newline at end of file
@@ -0,0 +1,241 @@
+import glob
+import json
+import math
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+# Bornes des histogrammes de latence (secondes)
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# nom -> (type Prometheus, description)
+METRICS = {
+    "api_requests_total": ("counter", "Requetes HTTP par route, methode et statut."),
+    "api_request_duration_seconds": ("histogram", "Duree des requetes HTTP par route (jusqu'au debut de la reponse)."),
+    "api_requests_in_flight": ("gauge", "Requetes HTTP en cours de traitement."),
+    "api_errors_total": ("counter", "Reponses 5xx et exceptions par route et statut."),
+    "api_query_duration_seconds": ("histogram", "Duree des acces aux donnees par requete, moteur et phase (wait, acquire, execute, serialize, stream)."),
+    "api_query_executor_pending": ("gauge", "Requetes DuckDB/SQLite en cours ou en file."),
+    "api_query_rejected_total": ("counter", "Requetes refusees, file d'attente pleine (503)."),
+    "api_query_timeouts_total": ("counter", "Requetes interrompues par le delai maximum (504)."),
+    "api_cache_entries": ("gauge", "Entrees du cache de reponses."),
+    "api_cache_hits_total": ("counter", "Succes du cache de reponses."),
+    "api_cache_misses_total": ("counter", "Echecs du cache de reponses."),
+    "api_cache_evictions_total": ("counter", "Entrees evincees (LRU) du cache de reponses."),
+    "api_cache_invalidations_total": ("counter", "Purges du cache apres un rebuild ETL."),
+    "api_data_version_info": ("gauge", "Workers servant chaque version de build Gold."),
+    "api_workers": ("gauge", "Workers uvicorn dont les metriques sont a jour."),
+}
+
+
+def _key(name, labels):
+    return (name, tuple(sorted(labels.items())))
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels_text(labels, extra=None):
+    items = list(labels) + (extra or [])
+    if not items:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in items) + "}"
+
+
+def _number(value):
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class QueryTimer:
+    """Chronometre d'un acces aux donnees decoupe en phases successives.
+
+    phase() cloture la phase courante et en ouvre une nouvelle ; la derniere
+    est cloturee par stop() (ou a la sortie du bloc metrics.query()).
+    """
+
+    def __init__(self, metrics, query, backend, phase):
+        self.metrics = metrics
+        self.query = query
+        self.backend = backend
+        self._phase = phase
+        self._start = time.perf_counter()
+
+    def phase(self, name):
+        self.stop()
+        self._phase = name
+        self._start = time.perf_counter()
+
+    def stop(self):
+        if self._phase is None:
+            return
+        self.metrics.observe(
+            "api_query_duration_seconds",
+            time.perf_counter() - self._start,
+            query=self.query, backend=self.backend, phase=self._phase,
+        )
+        self._phase = None
+
+
+class Metrics:
+    """Metriques d'un worker, agregees entre workers via un dossier partage.
+
+    Chaque worker ecrit regulierement son instantane (worker-<pid>.json, ecriture
+    atomique) ; /metrics lit tous les instantanes et additionne compteurs et
+    histogrammes. Les jauges ne comptent que les workers dont l'instantane est
+    recent : un worker arrete disparait des jauges, ses compteurs restent
+    jusqu'au prochain demarrage (vu comme une remise a zero par Prometheus).
+    """
+
+    def __init__(self, directory, flush_seconds=1.0, stale_seconds=10.0):
+        self.directory = directory
+        self.flush_seconds = flush_seconds
+        self.stale_seconds = stale_seconds
+        self.path = None
+        self._values = {}
+        self._histograms = {}
+        self._collectors = []
+        self._collected = set()
+        self._lock = threading.Lock()
+
+    # --- Enregistrement ---
+
+    def inc(self, name, value=1, **labels):
+        key = _key(name, labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + value
+
+    def set(self, name, value, **labels):
+        with self._lock:
+            self._values[_key(name, labels)] = value
+
+    def observe(self, name, seconds, **labels):
+        key = _key(name, labels)
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                # Comptes par intervalle (non cumules), +Inf compris, puis somme
+                histogram = self._histograms[key] = [0] * (len(LATENCY_BUCKETS) + 1) + [0.0]
+            for i, bound in enumerate(LATENCY_BUCKETS):
+                if seconds <= bound:
+                    histogram[i] += 1
+                    break
+            else:
+                histogram[len(LATENCY_BUCKETS)] += 1
+            histogram[-1] += seconds
+
+    def timer(self, query, backend, phase="wait"):
+        """Chronometre a passer a la fonction d'acces (phases acquire/execute), puis serialize."""
+        return QueryTimer(self, query, backend, phase)
+
+    @contextmanager
+    def query(self, query, backend, phase="acquire"):
+        timer = self.timer(query, backend, phase)
+        try:
+            yield timer
+        finally:
+            timer.stop()
+
+    def collector(self, func):
+        """func() -> [(nom, valeur, labels)] evalue a chaque ecriture de l'instantane."""
+        self._collectors.append(func)
+        return func
+
+    # --- Partage entre workers ---
+
+    def open(self):
+        """Cree le dossier et supprime les instantanes de workers arretes depuis longtemps."""
+        os.makedirs(self.directory, exist_ok=True)
+        # pid lu au demarrage du worker (et non a l'import, fait avant le lancement des workers)
+        self.path = os.path.join(self.directory, f"worker-{os.getpid()}.json")
+        for path in glob.glob(os.path.join(self.directory, "worker-*.json")):
+            try:
+                if time.time() - os.path.getmtime(path) > self.stale_seconds:
+                    os.remove(path)
+            except OSError:
+                pass
+
+    def close(self):
+        self.flush()
+
+    def snapshot(self):
+        # Les series des collecteurs sont remplacees a chaque fois (ex. ancienne version de build)
+        collected = {}
+        for func in self._collectors:
+            for name, value, labels in func():
+                collected[_key(name, labels)] = value
+        with self._lock:
+            for key in self._collected - set(collected):
+                self._values.pop(key, None)
+            self._values.update(collected)
+            self._collected = set(collected)
+            return {
+                "pid": os.getpid(),
+                "written_at": time.time(),
+                "values": [[name, dict(labels), value] for (name, labels), value in self._values.items()],
+                "histograms": [[name, dict(labels), list(h)] for (name, labels), h in self._histograms.items()],
+            }
+
+    def flush(self):
+        if self.path is None:
+            return
+        tmp_path = f"{self.path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.snapshot(), f)
+        os.replace(tmp_path, self.path)
+
+    def _read_snapshots(self):
+        snapshots = []
+        for path in glob.glob(os.path.join(self.directory, "worker-*.json")):
+            try:
+                with open(path, encoding="utf-8") as f:
+                    snapshots.append(json.load(f))
+            except (OSError, ValueError):
+                continue
+        return snapshots
+
+    def render(self):
+        """Texte d'exposition Prometheus agrege sur tous les workers."""
+        self.flush()
+        now = time.time()
+        values = {}
+        histograms = {}
+        live_workers = 0
+        for snapshot in self._read_snapshots():
+            live = now - snapshot.get("written_at", 0) <= self.stale_seconds
+            live_workers += live
+            for name, labels, value in snapshot["values"]:
+                if METRICS.get(name, ("gauge",))[0] == "gauge" and not live:
+                    continue
+                key = _key(name, labels)
+                values[key] = values.get(key, 0) + value
+            for name, labels, histogram in snapshot["histograms"]:
+                key = _key(name, labels)
+                total = histograms.setdefault(key, [0] * len(histogram))
+                for i, value in enumerate(histogram):
+                    total[i] += value
+        values[("api_workers", ())] = live_workers
+
+        lines = []
+        for name, (kind, description) in METRICS.items():
+            series = sorted(key for key in (values if kind != "histogram" else histograms) if key[0] == name)
+            if not series:
+                continue
+            lines.append(f"# HELP {name} {description}")
+            lines.append(f"# TYPE {name} {kind}")
+            for key in series:
+                labels = list(key[1])
+                if kind != "histogram":
+                    lines.append(f"{name}{_labels_text(labels)} {_number(values[key])}")
+                    continue
+                histogram = histograms[key]
+                cumulative = 0
+                for bound, count in zip(LATENCY_BUCKETS + (math.inf,), histogram):
+                    cumulative += count
+                    lines.append(f"{name}_bucket{_labels_text(labels, [('le', _number(bound))])} {cumulative}")
+                lines.append(f"{name}_sum{_labels_text(labels)} {_number(histogram[-1])}")
+                lines.append(f"{name}_count{_labels_text(labels)} {cumulative}")
+        return "\n".join(lines) + "\n"
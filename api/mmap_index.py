@@ -0,0 +1,134 @@
+import bisect
+import os
+
+import pyarrow as pa
+import pyarrow.ipc as pa_ipc
+
+
+class _TextKeys:
+    """Cles texte d'une colonne Arrow sans NULL, vues comme une sequence d'octets (sans copie du lot)."""
+
+    def __init__(self, array):
+        offset_format = "q" if pa.types.is_large_string(array.type) else "i"
+        self._offsets = memoryview(array.buffers()[1]).cast(offset_format)
+        data = array.buffers()[2]
+        self._data = memoryview(data) if data is not None else memoryview(b"")
+        self._start = array.offset
+        self._length = len(array)
+
+    def __len__(self):
+        return self._length
+
+    def __getitem__(self, i):
+        i += self._start
+        return self._data[self._offsets[i]:self._offsets[i + 1]].tobytes()
+
+
+def _keys(array):
+    if pa.types.is_int64(array.type):
+        # Buffer de valeurs int64 du fichier, lu en place
+        return memoryview(array.buffers()[1]).cast("q")[array.offset:array.offset + len(array)]
+    return _TextKeys(array)
+
+
+class MmapIndex:
+    """Index trie ecrit par etl/views.py (Arrow IPC non compresse), projete en memoire (mmap).
+
+    Le fichier est trie sur key_column (int64 ou texte), les autres colonnes
+    etant dans le meme ordre : la position d'une cle est la ligne de son
+    enregistrement. Les workers uvicorn partagent les pages du fichier via le
+    cache du systeme : ouverture sans lecture, pas de copie par processus.
+    Un lookup est une recherche dichotomique sur les cles de chaque lot
+    Arrow, lues directement dans le fichier.
+
+    Comme StatsIndex, load() prepare un nouvel instantane puis remplace la
+    reference en une affectation ; l'ancien fichier (remplace par renommage
+    atomique) reste lisible par les lookups en cours jusqu'a la liberation
+    de son instantane.
+    """
+
+    def __init__(self, path, key_column, columns):
+        self.path = path
+        self.key_column = key_column
+        self.columns = columns
+        self._snapshot = None
+
+    def load(self):
+        if not os.path.exists(self.path):
+            self._snapshot = None
+            return
+        reader = pa_ipc.open_file(pa.memory_map(self.path))
+        # Cles int64 (SIRET) comparees en entiers, cles texte en octets UTF-8
+        if pa.types.is_int64(reader.schema.field(self.key_column).type):
+            convert = int
+        else:
+            convert = str.encode
+        batches = []
+        first_keys = []
+        for i in range(reader.num_record_batches):
+            batch = reader.get_batch(i)
+            if not batch.num_rows:
+                continue
+            keys = _keys(batch.column(self.key_column))
+            batches.append((keys, [batch.column(name) for name in self.columns]))
+            first_keys.append(keys[0])
+        self._snapshot = (convert, first_keys, batches)
+
+    @property
+    def available(self):
+        return self._snapshot is not None
+
+    def _rows(self, snapshot, key):
+        """Lignes de la cle, y compris quand elles s'etendent sur plusieurs lots."""
+        convert, first_keys, batches = snapshot
+        try:
+            key = convert(key)
+        except (TypeError, ValueError):
+            # Cle non convertible (ex. chiffres Unicode pour un index int64) : inconnue
+            return []
+        rows = []
+        # Le lot precedent peut se terminer par la meme cle
+        for keys, columns in batches[max(0, bisect.bisect_left(first_keys, key) - 1):]:
+            start = bisect.bisect_left(keys, key)
+            end = bisect.bisect_right(keys, key, start)
+            rows.extend(tuple(column[row].as_py() for column in columns) for row in range(start, end))
+            if end < len(keys):
+                break
+        return rows
+
+    def get(self, key):
+        """Premier enregistrement de la cle (colonnes demandees), None si elle est inconnue."""
+        snapshot = self._snapshot
+        if snapshot is None:
+            return None
+        rows = self._rows(snapshot, key)
+        return rows[0] if rows else None
+
+    def get_all(self, key):
+        """Tous les enregistrements de la cle (liste vide si elle est inconnue)."""
+        snapshot = self._snapshot
+        return self._rows(snapshot, key) if snapshot is not None else []
+
+    def get_many(self, keys):
+        """{cle: premier enregistrement} des cles trouvees (meme instantane pour tout le lot)."""
+        snapshot = self._snapshot
+        if snapshot is None:
+            return {}
+        records = {}
+        for key in keys:
+            rows = self._rows(snapshot, key)
+            if rows:
+                records[key] = rows[0]
+        return records
+
+    def get_all_many(self, keys):
+        """{cle: enregistrements} des cles trouvees (meme instantane pour tout le lot)."""
+        snapshot = self._snapshot
+        if snapshot is None:
+            return {}
+        records = {}
+        for key in keys:
+            rows = self._rows(snapshot, key)
+            if rows:
+                records[key] = rows
+        return records
@@ -0,0 +1,63 @@
+import math
+
+# Meme grille que etl/views.py (NEARBY_CELL_DEGREES / NEARBY_GRID_COLUMNS)
+NEARBY_CELL_DEGREES = 0.01
+NEARBY_GRID_COLUMNS = 36000
+
+EARTH_RADIUS_KM = 6371.0088
+# Meme sphere que la distance de haversine : le rectangle contient tout le cercle
+KM_PER_DEGREE = math.radians(EARTH_RADIUS_KM)
+
+# Distance du point (?, ?) a chaque candidat (formule de haversine)
+NEARBY_SQL = f"""
+    SELECT siret, status, name, code_postal, city, rna, latitude, longitude, geocode_level, distance_km FROM (
+        SELECT *, 2 * {EARTH_RADIUS_KM} * ASIN(SQRT(
+            POW(SIN(RADIANS(latitude - $lat) / 2), 2)
+            + COS(RADIANS($lat)) * COS(RADIANS(latitude)) * POW(SIN(RADIANS(longitude - $lon) / 2), 2)
+        )) AS distance_km
+        FROM nearby_index
+        WHERE cell BETWEEN $first_cell AND $last_cell
+          AND latitude BETWEEN $min_lat AND $max_lat
+          AND longitude BETWEEN $min_lon AND $max_lon
+    )
+    WHERE distance_km <= $radius
+    ORDER BY distance_km, siret
+    LIMIT $limit
+"""
+
+
+def cell(latitude, longitude):
+    row = math.floor((latitude + 90) / NEARBY_CELL_DEGREES)
+    column = math.floor((longitude + 180) / NEARBY_CELL_DEGREES)
+    return row * NEARBY_GRID_COLUMNS + column
+
+
+def nearby_params(lat, lon, radius_km, limit):
+    """Parametres de NEARBY_SQL : rectangle englobant le cercle et plage de cellules.
+
+    L'index est trie par cellule, ligne de grille par ligne de grille : les
+    cellules du rectangle tiennent dans une seule plage [first_cell, last_cell]
+    (les lignes de latitude couvertes), que DuckDB resout par les zone maps.
+    Le filtre sur le rectangle puis la distance exacte ne portent que sur ces
+    row groups. Pas de passage de l'antimeridien (donnees France).
+    """
+    delta_lat = radius_km / KM_PER_DEGREE
+    # Demi-largeur exacte du cercle sur la sphere : asin(sin(d) / cos(lat)), un peu
+    # plus que d / cos(lat) hors de l'equateur. Pres des poles, toutes les longitudes.
+    sin_d = math.sin(math.radians(delta_lat))
+    cos_lat = math.cos(math.radians(lat))
+    delta_lon = 180.0 if sin_d >= cos_lat else math.degrees(math.asin(sin_d / cos_lat))
+    min_lat, max_lat = max(-90.0, lat - delta_lat), min(90.0, lat + delta_lat)
+    min_lon, max_lon = max(-180.0, lon - delta_lon), min(180.0, lon + delta_lon)
+    return {
+        "lat": lat,
+        "lon": lon,
+        "radius": radius_km,
+        "limit": limit,
+        "min_lat": min_lat,
+        "max_lat": max_lat,
+        "min_lon": min_lon,
+        "max_lon": max_lon,
+        "first_cell": cell(min_lat, min_lon),
+        "last_cell": cell(max_lat, max_lon),
+    }
@@ -0,0 +1,56 @@
+import base64
+import re
+
+# Poids bm25 par colonne de search_view (siret, name, postal_code, city, is_association) :
+# le nom prime sur le code postal, les colonnes UNINDEXED ne comptent pas
+BM25_WEIGHTS = "0.0, 10.0, 1.0, 0.0, 0.0"
+
+SEARCH_SQL = f"""
+    SELECT rowid, siret, name, city, is_association, score FROM (
+        SELECT rowid, siret, name, city, is_association, bm25(search_view, {BM25_WEIGHTS}) AS score
+        FROM search_view
+        WHERE search_view MATCH ?
+    )
+"""
+
+TOKEN_RE = re.compile(r"\w+")
+
+
+def _quote(token):
+    return '"' + token.replace('"', '""') + '"'
+
+
+def fts_query(q, typeahead=False, dept=None, postal_code=None):
+    """Traduit la saisie utilisateur en requete FTS5 (None si aucun terme exploitable).
+
+    Chaque mot est cite (pas d'erreur de syntaxe FTS5 sur les saisies libres) ;
+    en mode typeahead le dernier mot est un prefixe, servi par l'index prefix=.
+    Les filtres departement / code postal deviennent des filtres de colonne FTS5.
+    """
+    tokens = TOKEN_RE.findall(q)
+    if not tokens:
+        return None
+    terms = [_quote(token) for token in tokens]
+    if typeahead:
+        terms[-1] += "*"
+    match = " ".join(terms)
+    if len(terms) > 1:
+        match = f"({match})"
+
+    if postal_code:
+        match += f" AND postal_code:{_quote(postal_code)}"
+    elif dept:
+        match += f" AND postal_code:{_quote(dept)}*"
+    return match
+
+
+def encode_cursor(score, rowid):
+    """Curseur opaque de pagination : position (score bm25, rowid) du dernier resultat."""
+    return base64.urlsafe_b64encode(f"{score!r}:{rowid}".encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor):
+    """Retourne (score, rowid) ou leve ValueError si le curseur est invalide."""
+    padded = cursor + "=" * (-len(cursor) % 4)
+    score, rowid = base64.urlsafe_b64decode(padded.encode()).decode().split(":")
+    return float(score), int(rowid)
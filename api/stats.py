@@ -0,0 +1,50 @@
+import duckdb
+
+from api.db import parquet_exists, parquet_source
+
+
+class StatsIndex:
+    """Vue Statistiques chargee en memoire (une entree par code postal).
+
+    Les agregats departementaux et nationaux sont precalcules au chargement ;
+    un rechargement construit un nouvel instantane puis remplace la reference
+    en une seule affectation, sans verrou cote lecture.
+    """
+
+    def __init__(self, parquet_path):
+        self.parquet_path = parquet_path
+        self._snapshot = ({}, {}, None)
+
+    def load(self):
+        by_postal_code = {}
+        by_departement = {}
+        national = [0, 0, 0, 0]
+        if parquet_exists(self.parquet_path):
+            rows = duckdb.sql(f"""
+                SELECT code_postal, total_entites, associations, entreprises_pures
+                FROM {parquet_source(self.parquet_path)}
+                WHERE code_postal IS NOT NULL
+            """).fetchall()
+            for code_postal, total, associations, entreprises in rows:
+                by_postal_code[code_postal] = (total, associations, entreprises)
+                # Departement = 2 premiers caracteres du code postal (meme regle que match.py)
+                dept = by_departement.setdefault(code_postal[:2], [0, 0, 0, 0])
+                for totals in (dept, national):
+                    totals[0] += total
+                    totals[1] += associations
+                    totals[2] += entreprises
+                    totals[3] += 1
+        self._snapshot = (
+            by_postal_code,
+            {dept: tuple(totals) for dept, totals in by_departement.items()},
+            tuple(national) if by_postal_code else None,
+        )
+
+    def postal_code(self, code_postal):
+        return self._snapshot[0].get(code_postal)
+
+    def departement(self, dept):
+        return self._snapshot[1].get(dept)
+
+    def national(self):
+        return self._snapshot[2]
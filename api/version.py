@@ -0,0 +1,73 @@
+import calendar
+import json
+import os
+import threading
+import time
+
+
+class DataVersion:
+    """Suit la version des artefacts Gold (tampon ecrit par etl/views.py + mtimes).
+
+    Les callbacks enregistres via on_change() sont appeles a chaque
+    reconstruction detectee (purge du cache, reouverture des bases...).
+    """
+
+    def __init__(self, stamp_path, artifact_paths):
+        self.stamp_path = stamp_path
+        self.artifact_paths = artifact_paths
+        self.current = self.compute()
+        self._listeners = []
+        self._lock = threading.Lock()
+
+    def compute(self):
+        build = None
+        built_at = None
+        try:
+            with open(self.stamp_path, encoding="utf-8") as f:
+                stamp = json.load(f)
+            build = stamp.get("version")
+            # Date du build en UTC (secondes epoch), pour Last-Modified
+            built_at = calendar.timegm(time.strptime(stamp["built_at"], "%Y-%m-%dT%H:%M:%SZ"))
+        except (OSError, ValueError, KeyError, TypeError):
+            pass
+        mtimes = []
+        for path in self.artifact_paths:
+            try:
+                mtimes.append(os.stat(path).st_mtime_ns)
+            except OSError:
+                mtimes.append(None)
+        return (build, built_at, tuple(mtimes))
+
+    @property
+    def build(self):
+        return self.current[0]
+
+    @property
+    def built_at(self):
+        return self.current[1]
+
+    def on_change(self, callback):
+        self._listeners.append(callback)
+
+    def check(self):
+        """Retourne True si une nouvelle version a ete detectee et appliquee par tous les callbacks.
+
+        Chaque callback est appele meme si un precedent echoue ; en cas
+        d'echec la version courante n'avance pas et le prochain appel
+        relance tous les callbacks (build a moitie ecrit, par exemple).
+        """
+        with self._lock:
+            version = self.compute()
+            if version == self.current:
+                return False
+            failed = False
+            for callback in self._listeners:
+                try:
+                    callback()
+                except Exception as e:
+                    failed = True
+                    print(f"Erreur rechargement ({getattr(callback, '__qualname__', callback)}) : {e}")
+            if failed:
+                return False
+            self.current = version
+            return True
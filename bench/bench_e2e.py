@@ -0,0 +1,309 @@
+import duckdb
+import glob
+import json
+import os
+import platform
+import random
+import shutil
+import subprocess
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+
+from generate_data import MARKER_NAME, generate
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Copie du code (etl/, api/) et donnees synthetiques : data/raw et duckdb/ du depot ne sont pas touches
+WORKSPACE = os.environ.get("BENCH_WORKSPACE", os.path.join(BASE_DIR, "data", "bench_workspace"))
+# Un fichier JSON par run (<horodatage>_<commit>.json), compare au run precedent de meme echelle
+RESULTS_DIR = os.environ.get("BENCH_RESULTS_DIR", os.path.join(BASE_DIR, "bench", "results"))
+
+SCALE = float(os.environ.get("BENCH_SCALE", "1"))
+SEED = int(os.environ.get("BENCH_SEED", "42"))
+API_PORT = int(os.environ.get("BENCH_API_PORT", "8765"))
+API_WORKERS = int(os.environ.get("BENCH_API_WORKERS", "2"))
+LOAD_SECONDS = float(os.environ.get("BENCH_LOAD_SECONDS", "5"))
+LOAD_CLIENTS = int(os.environ.get("BENCH_LOAD_CLIENTS", "8"))
+API_START_TIMEOUT = 60
+SAMPLE_ROWS = 2000
+BATCH_SIZE = 100
+# Exports limites a EXPORT_MAX_CONCURRENT (2 par defaut) par worker : au-dela, 503
+EXPORT_CLIENTS = int(os.environ.get("BENCH_EXPORT_CLIENTS", "2"))
+
+CODE_DIRS = ["etl", "api"]
+CODE_FILES = ["index.html"]
+
+# Ecart signale a la comparaison avec le run precedent (20 %)
+REGRESSION_RATIO = 1.2
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))]
+
+def git_commit():
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "HEAD"], cwd=BASE_DIR, capture_output=True, text=True, check=True
+        ).stdout.strip()
+        dirty = subprocess.run(
+            ["git", "status", "--porcelain", "--untracked-files=no"], cwd=BASE_DIR, capture_output=True, text=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown", False
+    return commit, bool(dirty)
+
+def prepare_workspace():
+    """Code du commit courant, donnees brutes regenerees si l'echelle ou la graine changent, sorties ETL videes."""
+    os.makedirs(WORKSPACE, exist_ok=True)
+    for name in CODE_DIRS:
+        target = os.path.join(WORKSPACE, name)
+        shutil.rmtree(target, ignore_errors=True)
+        shutil.copytree(os.path.join(BASE_DIR, name), target, ignore=shutil.ignore_patterns("__pycache__"))
+    for name in CODE_FILES:
+        shutil.copy2(os.path.join(BASE_DIR, name), os.path.join(WORKSPACE, name))
+
+    raw_dir = os.path.join(WORKSPACE, "data", "raw")
+    marker_path = os.path.join(raw_dir, MARKER_NAME)
+    synthetic = None
+    if os.path.exists(marker_path):
+        with open(marker_path, encoding="utf-8") as f:
+            synthetic = json.load(f)
+    if not synthetic or synthetic["scale"] != SCALE or synthetic["seed"] != SEED:
+        print(f"Generation des donnees synthetiques (scale={SCALE}, seed={SEED})...")
+        synthetic = generate(raw_dir, SCALE, SEED)
+
+    # Run a froid : pas de Bronze/Silver/Gold ni de base d'un run precedent
+    shutil.rmtree(os.path.join(WORKSPACE, "data", "parquet"), ignore_errors=True)
+    shutil.rmtree(os.path.join(WORKSPACE, "duckdb"), ignore_errors=True)
+    return synthetic
+
+def run_pipeline(full_rebuild):
+    env = dict(os.environ, ETL_FULL_REBUILD="1" if full_rebuild else "0")
+    start = time.perf_counter()
+    completed = subprocess.run(
+        [sys.executable, os.path.join("etl", "pipeline.py")], cwd=WORKSPACE, env=env,
+        stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True,
+    )
+    seconds = time.perf_counter() - start
+    if completed.returncode != 0:
+        print(completed.stdout)
+        raise RuntimeError("Echec du pipeline ETL (voir la sortie ci-dessus)")
+    with open(os.path.join(WORKSPACE, "data", "parquet", "pipeline_report.json"), encoding="utf-8") as f:
+        return json.load(f), seconds
+
+def bench_etl():
+    report, seconds = run_pipeline(full_rebuild=True)
+    stages = {
+        stage["name"]: {
+            "seconds": stage["seconds"],
+            "rows_out": stage.get("rows_out"),
+            "peak_rss_mb": stage.get("peak_rss_mb"),
+        }
+        for stage in report["stages"]
+    }
+    # Second run sans changement : cout des verifications de fraicheur seules
+    _, noop_seconds = run_pipeline(full_rebuild=False)
+    return {"seconds": round(seconds, 3), "noop_seconds": round(noop_seconds, 3), "stages": stages}
+
+def load_samples():
+    """Valeurs de requete tirees des sorties Gold du workspace (SIRET, codes postaux, points, mots)."""
+    gold_dir = os.path.join(WORKSPACE, "data", "parquet", "gold").replace('\\', '/')
+    golden = f"read_parquet('{gold_dir}/golden_record*.parquet')"
+    if not glob.glob(os.path.join(gold_dir, "golden_record*.parquet")):
+        golden = f"read_parquet('{gold_dir}/golden_record/**/*.parquet', hive_partitioning=true)"
+    with duckdb.connect() as conn:
+        sirets = [row[0] for row in conn.execute(
+            f"SELECT siret FROM {golden} USING SAMPLE {SAMPLE_ROWS} ROWS (reservoir, {SEED})"
+        ).fetchall()]
+        postal_codes = [row[0] for row in conn.execute(
+            f"SELECT DISTINCT code_postal FROM {golden} WHERE code_postal IS NOT NULL ORDER BY 1"
+        ).fetchall()]
+        points = conn.execute(
+            f"SELECT latitude, longitude FROM read_parquet('{gold_dir}/nearby_index.parquet') "
+            f"USING SAMPLE {SAMPLE_ROWS} ROWS (reservoir, {SEED})"
+        ).fetchall()
+        words = [row[0] for row in conn.execute(
+            f"SELECT DISTINCT SPLIT_PART(name, ' ', 1) FROM {golden} WHERE LENGTH(SPLIT_PART(name, ' ', 1)) >= 3 ORDER BY 1"
+        ).fetchall()]
+    return {"sirets": sirets, "postal_codes": postal_codes, "points": points, "words": words}
+
+def endpoints(samples):
+    """nom -> fonction(rng) retournant (chemin, corps JSON) d'une requete."""
+    sirets = samples["sirets"]
+    postal_codes = samples["postal_codes"]
+    departments = sorted({code[:2] for code in postal_codes})
+    points = samples["points"]
+    words = samples["words"]
+    return {
+        "siret": lambda rng: (f"/api/v1/siret/{rng.choice(sirets)}", None),
+        "siret_batch": lambda rng: ("/api/v1/siret/batch", rng.sample(sirets, min(BATCH_SIZE, len(sirets)))),
+        "search": lambda rng: (f"/api/v1/search?q={rng.choice(words).lower()}&limit=20", None),
+        "search_typeahead": lambda rng: (f"/api/v1/search?q={rng.choice(words)[:3].lower()}&typeahead=true&limit=10", None),
+        "nearby": lambda rng: (
+            "/api/v1/nearby?lat={:.5f}&lon={:.5f}&radius={}&limit=50".format(*rng.choice(points), rng.choice([0.5, 1, 5])),
+            None,
+        ),
+        "stats": lambda rng: (f"/api/v1/stats/{rng.choice(postal_codes)}", None),
+        "stats_departement": lambda rng: (f"/api/v1/stats/departement/{rng.choice(departments)}", None),
+        "export": lambda rng: (f"/api/v1/export?postal_code={rng.choice(postal_codes)}&format=ndjson", None),
+    }
+
+def request(base_url, path, body=None):
+    """Retourne (statut HTTP, duree en secondes, octets recus)."""
+    data = json.dumps(body).encode() if body is not None else None
+    req = urllib.request.Request(base_url + path, data=data, headers={"Content-Type": "application/json"})
+    start = time.perf_counter()
+    size = 0
+    try:
+        with urllib.request.urlopen(req, timeout=30) as response:
+            size = len(response.read())
+            status = response.status
+    except urllib.error.HTTPError as e:
+        status = e.code
+    except OSError:
+        status = 0
+    return status, time.perf_counter() - start, size
+
+def load_endpoint(base_url, make_request, seconds, clients):
+    """clients threads en boucle fermee pendant seconds : debit et percentiles de latence."""
+    stop = threading.Event()
+    results = [[] for _ in range(clients)]
+
+    def client(index):
+        rng = random.Random(SEED * 1000 + index)
+        while not stop.is_set():
+            path, body = make_request(rng)
+            results[index].append(request(base_url, path, body))
+
+    threads = [threading.Thread(target=client, args=(i,)) for i in range(clients)]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    time.sleep(seconds)
+    stop.set()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - start
+
+    samples = [sample for client_results in results for sample in client_results]
+    timings = [duration * 1000 for status, duration, _ in samples if status == 200]
+    return {
+        "requests": len(samples),
+        "errors": sum(1 for status, _, _ in samples if status != 200),
+        "throughput_rps": round(len(samples) / elapsed, 1),
+        "p50_ms": round(percentile(timings, 0.50), 2) if timings else None,
+        "p99_ms": round(percentile(timings, 0.99), 2) if timings else None,
+        "mean_bytes": round(sum(size for _, _, size in samples) / len(samples)) if samples else 0,
+    }
+
+def start_api():
+    env = dict(os.environ, METRICS_DIR=os.path.join(WORKSPACE, "duckdb", "api_metrics"))
+    log = open(os.path.join(WORKSPACE, "api.log"), "w", encoding="utf-8")
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "api.main:app", "--host", "127.0.0.1", "--port", str(API_PORT),
+         "--workers", str(API_WORKERS), "--log-level", "warning"],
+        cwd=WORKSPACE, env=env, stdout=log, stderr=subprocess.STDOUT,
+    )
+    base_url = f"http://127.0.0.1:{API_PORT}"
+    deadline = time.time() + API_START_TIMEOUT
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"L'API s'est arretee au demarrage (voir {log.name})")
+        if request(base_url, "/api/v1/ping")[0] == 200:
+            return process, log, base_url
+        time.sleep(0.2)
+    process.terminate()
+    raise RuntimeError(f"L'API ne repond pas apres {API_START_TIMEOUT}s (voir {log.name})")
+
+def bench_api():
+    samples = load_samples()
+    process, log, base_url = start_api()
+    results = {}
+    try:
+        for name, make_request in endpoints(samples).items():
+            clients = min(LOAD_CLIENTS, EXPORT_CLIENTS) if name == "export" else LOAD_CLIENTS
+            results[name] = load_endpoint(base_url, make_request, LOAD_SECONDS, clients)
+            r = results[name]
+            print(
+                f"{name:<18} {r['throughput_rps']:>9.1f} req/s  p50 {r['p50_ms'] or 0:>8.2f}ms  "
+                f"p99 {r['p99_ms'] or 0:>8.2f}ms  erreurs {r['errors']}"
+            )
+    finally:
+        process.terminate()
+        try:
+            process.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            process.kill()
+        log.close()
+    return results
+
+def previous_result(scale):
+    paths = sorted(glob.glob(os.path.join(RESULTS_DIR, "*.json")))
+    for path in reversed(paths):
+        with open(path, encoding="utf-8") as f:
+            result = json.load(f)
+        if result.get("scale") == scale:
+            return result
+    return None
+
+def compare(result, previous):
+    """Ecarts avec le run precedent : duree des etapes ETL, debit et p99 des routes."""
+    print(f"\n--- COMPARAISON AVEC {previous['commit'][:10]} ({previous['created_at']}) ---")
+    rows = [("etl total (s)", previous["etl"]["seconds"], result["etl"]["seconds"], False)]
+    for name, stage in result["etl"]["stages"].items():
+        before = previous["etl"]["stages"].get(name)
+        if before:
+            rows.append((f"etl {name} (s)", before["seconds"], stage["seconds"], False))
+    for name, endpoint in result["api"].items():
+        before = previous["api"].get(name)
+        if before:
+            rows.append((f"{name} req/s", before["throughput_rps"], endpoint["throughput_rps"], True))
+            rows.append((f"{name} p99 (ms)", before["p99_ms"], endpoint["p99_ms"], False))
+    for label, before, after, higher_is_better in rows:
+        if not before or after is None:
+            continue
+        ratio = after / before
+        worse = ratio < 1 / REGRESSION_RATIO if higher_is_better else ratio > REGRESSION_RATIO
+        print(f"{label:<32} {before:>10.2f} -> {after:>10.2f}  {(ratio - 1) * 100:>+7.1f}%{'  REGRESSION' if worse else ''}")
+
+def run_benchmark():
+    commit, dirty = git_commit()
+    print(f"--- BENCHMARK DE BOUT EN BOUT (scale={SCALE}, commit {commit[:10]}{' modifie' if dirty else ''}) ---")
+    synthetic = prepare_workspace()
+    rows = synthetic["rows"]
+    print(f"Donnees : BAN {rows['ban']}, SIRENE {rows['sirene']}, RNA {rows['rna']} ({synthetic['rna_files']} fichiers)")
+
+    etl = bench_etl()
+    print(f"\nETL complet : {etl['seconds']:.1f}s (run sans changement : {etl['noop_seconds']:.1f}s)")
+    for name, stage in etl["stages"].items():
+        print(f"{name:<18} {stage['seconds']:>8.2f}s  {stage['rows_out'] or '-':>10} lignes  {stage['peak_rss_mb'] or '-':>6} Mo")
+
+    print(f"\nAPI : {API_WORKERS} workers, {LOAD_CLIENTS} clients, {LOAD_SECONDS:g}s par route")
+    api = bench_api()
+
+    result = {
+        "commit": commit,
+        "dirty": dirty,
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "scale": SCALE,
+        "seed": SEED,
+        "machine": {"platform": platform.platform(), "python": platform.python_version(), "cpus": os.cpu_count()},
+        "load": {"api_workers": API_WORKERS, "clients": LOAD_CLIENTS, "seconds": LOAD_SECONDS},
+        "rows": rows,
+        "etl": etl,
+        "api": api,
+    }
+    previous = previous_result(SCALE)
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    path = os.path.join(RESULTS_DIR, f"{time.strftime('%Y%m%dT%H%M%S')}_{commit[:10]}.json")
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(result, f, indent=2)
+    print(f"\nResultats : {path}")
+    if previous:
+        compare(result, previous)
+
+if __name__ == "__main__":
+    run_benchmark()
@@ -0,0 +1,97 @@
+import duckdb
+import os
+import shutil
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(BASE_DIR, "etl"))
+
+import budget
+import ingest
+
+BENCH_DIR = os.path.join(BASE_DIR, "duckdb", "bench_ingest")
+
+def legacy_convert(source_file, target_file):
+    """Ancienne conversion : detection automatique, tout en VARCHAR, toutes les colonnes."""
+    source = source_file.replace('\\', '/')
+    target = target_file.replace('\\', '/')
+    with duckdb.connect() as conn:
+        conn.execute(f"""
+            COPY (
+                SELECT * FROM read_csv_auto('{source}', all_varchar=true, quote='"')
+            ) TO '{target}' (FORMAT PARQUET, COMPRESSION 'ZSTD');
+        """)
+
+def typed_convert(source_key, source_file, target_file, file_share):
+    target = target_file.replace('\\', '/')
+    with budget.share(*file_share), budget.connect() as conn:
+        conn.execute(f"""
+            COPY ({ingest.read_csv_sql(source_file, ingest.SOURCES[source_key]["schema"])})
+            TO '{target}' (FORMAT PARQUET, COMPRESSION 'ZSTD');
+        """)
+
+def jobs(mode):
+    result = []
+    for source_key in ingest.SOURCES:
+        os.makedirs(os.path.join(BENCH_DIR, mode, source_key), exist_ok=True)
+        for source_file in ingest.source_files(source_key):
+            result.append((source_key, source_file, ingest.bronze_target(source_file, os.path.join(BENCH_DIR, mode, source_key))))
+    return result
+
+def sizes(mode):
+    """Taille Bronze par source (octets)."""
+    return {
+        source_key: sum(
+            os.path.getsize(os.path.join(root, name))
+            for root, _, names in os.walk(os.path.join(BENCH_DIR, mode, source_key)) for name in names
+        )
+        for source_key in ingest.SOURCES
+    }
+
+def run_legacy():
+    start = time.perf_counter()
+    for _, source_file, target in jobs("legacy"):
+        legacy_convert(source_file, target)
+    return time.perf_counter() - start
+
+def run_typed():
+    """Toutes les sources et tous les fichiers RNA dans le meme pool, budget DuckDB partage."""
+    pending = jobs("typed")
+    workers = max(1, min(len(pending), ingest.INGEST_WORKERS))
+    file_share = budget.split(workers)
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for future in [executor.submit(typed_convert, *job, file_share) for job in pending]:
+            future.result()
+    return time.perf_counter() - start
+
+def run_benchmark():
+    if os.path.exists(BENCH_DIR):
+        shutil.rmtree(BENCH_DIR)
+    raw = {
+        source_key: sum(os.path.getsize(f) for f in ingest.source_files(source_key))
+        for source_key in ingest.SOURCES
+    }
+    n_files = sum(len(ingest.source_files(source_key)) for source_key in ingest.SOURCES)
+    print(f"--- BENCHMARK INGESTION ({n_files} fichiers, {sum(raw.values()) / 1e6:.1f} Mo CSV, {os.cpu_count()} CPU) ---")
+
+    try:
+        legacy_seconds = run_legacy()
+        typed_seconds = run_typed()
+        legacy_sizes, typed_sizes = sizes("legacy"), sizes("typed")
+
+        print(f"{'source':<10} {'CSV':>10} {'all_varchar':>13} {'type':>10} {'gain':>7}")
+        for source_key in ingest.SOURCES:
+            gain = 1 - typed_sizes[source_key] / legacy_sizes[source_key] if legacy_sizes[source_key] else 0
+            print(
+                f"{source_key:<10} {raw[source_key] / 1e6:>8.2f} Mo {legacy_sizes[source_key] / 1e6:>10.2f} Mo "
+                f"{typed_sizes[source_key] / 1e6:>7.2f} Mo {gain:>6.1%}"
+            )
+        print(f"{'duree':<10} {'':>10} {legacy_seconds:>11.2f} s {typed_seconds:>8.2f} s {legacy_seconds / typed_seconds:>6.1f}x")
+    finally:
+        shutil.rmtree(BENCH_DIR, ignore_errors=True)
+
+if __name__ == "__main__":
+    run_benchmark()
@@ -0,0 +1,107 @@
+import duckdb
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(BASE_DIR, "etl"))
+
+import manifest
+import match
+
+PARQUET_SILVER_DIR = os.path.join(BASE_DIR, "data", "parquet", "silver")
+
+# Requete historique (jointure complete par code postal), conservee comme reference
+LEGACY_QUERY = """
+    WITH sirene_clean AS (
+        SELECT siret, code_postal, SUBSTRING(code_postal, 1, 2) AS departement,
+               {sirene_name} AS name_clean
+        FROM read_parquet('{sirene_silver}')
+        WHERE enseigne IS NOT NULL AND code_postal IS NOT NULL
+    ),
+    rna_clean AS (
+        SELECT id_rna, code_postal, SUBSTRING(code_postal, 1, 2) AS departement,
+               {rna_name} AS name_clean
+        FROM read_parquet('{rna_silver}')
+        WHERE nom_association IS NOT NULL AND code_postal IS NOT NULL
+    )
+    SELECT DISTINCT s.siret, r.id_rna
+    FROM sirene_clean s
+    INNER JOIN rna_clean r ON s.departement = r.departement AND s.name_clean = r.name_clean
+    WHERE LENGTH(s.name_clean) > 3
+    UNION
+    SELECT DISTINCT s.siret, r.id_rna
+    FROM sirene_clean s
+    INNER JOIN rna_clean r ON s.code_postal = r.code_postal
+    WHERE s.name_clean != r.name_clean
+      AND LENGTH(s.name_clean) > 4
+      AND LENGTH(r.name_clean) > 4
+      AND jaro_winkler_similarity(s.name_clean, r.name_clean) >= {threshold}
+"""
+
+def count_differences(conn, mapping_path):
+    """Liens presents dans un seul des deux resultats (table legacy / parquet du matching)."""
+    mapping_file = mapping_path.replace('\\', '/')
+    return conn.execute(f"""
+        SELECT COUNT(*) FROM (
+            (SELECT siret, id_rna FROM legacy EXCEPT SELECT siret, id_rna FROM read_parquet('{mapping_file}'))
+            UNION ALL
+            (SELECT siret, id_rna FROM read_parquet('{mapping_file}') EXCEPT SELECT siret, id_rna FROM legacy)
+        )
+    """).fetchone()[0]
+
+def run_benchmark():
+    sirene_silver = os.path.join(PARQUET_SILVER_DIR, "sirene", "sirene_silver.parquet").replace('\\', '/')
+    rna_silver = os.path.join(PARQUET_SILVER_DIR, "rna", "rna_silver.parquet").replace('\\', '/')
+    if not os.path.exists(sirene_silver) or not os.path.exists(rna_silver):
+        print("Tables Silver introuvables (lancer 'make normalize')")
+        return
+
+    print("--- BENCHMARK MATCHING : jointure complete vs blocking par departement ---")
+    conn = duckdb.connect()
+    start_time = time.time()
+    conn.execute("CREATE TABLE legacy AS " + LEGACY_QUERY.format(
+        sirene_name=match.name_clean_sql("enseigne"),
+        rna_name=match.name_clean_sql("nom_association"),
+        sirene_silver=sirene_silver,
+        rna_silver=rna_silver,
+        threshold=match.JW_THRESHOLD,
+    ))
+    legacy_elapsed = time.time() - start_time
+
+    # Sorties du matching (liens, parts, base, manifeste) dans un dossier temporaire :
+    # le benchmark ne touche pas aux donnees du pipeline. Manifeste vide : tous les
+    # departements sont recalcules.
+    work_dir = tempfile.mkdtemp(prefix="bench_match_")
+    match.MAPPING_PATH = os.path.join(work_dir, "mapping_sirene_rna.parquet")
+    match.MAPPING_PARTS_DIR = os.path.join(work_dir, "mapping_parts")
+    match.MATCH_TMP_DIR = os.path.join(work_dir, "_match_tmp")
+    match.MATCHING_DB_PATH = os.path.join(work_dir, "matching.duckdb")
+    manifest.MANIFEST_PATH = os.path.join(work_dir, "manifest.json")
+    try:
+        start_time = time.time()
+        departement_stats = match.run_matching()
+        blocked_elapsed = time.time() - start_time
+        differences = count_differences(conn, match.MAPPING_PATH)
+    finally:
+        conn.close()
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    print(f"\n{'dept':<6}{'paires lignes':>16}{'paires noms':>14}{'apres longueur':>16}{'comparees':>12}{'elaguees':>12}{'liens':>10}{'secondes':>10}")
+    for stats in sorted(departement_stats, key=lambda s: -s["seconds"]):
+        print(
+            f"{stats['departement']:<6}{stats['pairs_rows']:>16}{stats['pairs_names']:>14}"
+            f"{stats['pairs_after_length']:>16}{stats['pairs_compared']:>12}{stats['pairs_pruned']:>12}"
+            f"{stats['matches']:>10}{stats['seconds']:>10.3f}"
+        )
+
+    print(f"\nJointure complete : {legacy_elapsed:.2f} s")
+    print(f"Blocking ({match.MATCH_WORKERS} processus) : {blocked_elapsed:.2f} s")
+    print(f"Paires comparees (lignes, naif) : {sum(s['pairs_rows'] for s in departement_stats)}")
+    print(f"Paires Jaro-Winkler (blocking)  : {sum(s['pairs_compared'] for s in departement_stats)}")
+    print(f"Ecarts avec la requete historique : {differences}")
+
+if __name__ == "__main__":
+    run_benchmark()
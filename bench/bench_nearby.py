@@ -0,0 +1,88 @@
+import duckdb
+import os
+import random
+import statistics
+import sys
+import time
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BASE_DIR)
+
+from api.db import DuckDBPool
+from api.nearby import NEARBY_SQL, nearby_params
+
+PARQUET_GOLD_DIR = os.path.join(BASE_DIR, "data", "parquet", "gold")
+DB_DIR = os.path.join(BASE_DIR, "duckdb")
+GOLDEN_RECORD_PATH = os.path.join(PARQUET_GOLD_DIR, "golden_record.parquet").replace('\\', '/')
+NEARBY_INDEX_PATH = os.path.join(PARQUET_GOLD_DIR, "nearby_index.parquet").replace('\\', '/')
+GOLD_DB_PATH = os.path.join(DB_DIR, "gold.duckdb")
+
+N_QUERIES = int(os.environ.get("BENCH_NEARBY_QUERIES", "100"))
+RADII_KM = [0.5, 1, 2, 5, 10, 20, 50]
+LIMIT = 100
+
+# Sans index : distance calculee pour chaque ligne du Golden Record
+FULL_SCAN_SQL = f"""
+    SELECT siret, distance_km FROM (
+        SELECT siret, 2 * 6371.0088 * ASIN(SQRT(
+            POW(SIN(RADIANS(lat - $lat) / 2), 2)
+            + COS(RADIANS($lat)) * COS(RADIANS(lat)) * POW(SIN(RADIANS(lon - $lon) / 2), 2)
+        )) AS distance_km
+        FROM (
+            SELECT siret, TRY_CAST(latitude AS DOUBLE) AS lat, TRY_CAST(longitude AS DOUBLE) AS lon
+            FROM read_parquet('{GOLDEN_RECORD_PATH}')
+        )
+    )
+    WHERE distance_km <= $radius
+    ORDER BY distance_km, siret
+    LIMIT $limit
+"""
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))]
+
+def timed(cur, query, points, radius):
+    timings = []
+    found = []
+    for lat, lon in points:
+        params = nearby_params(lat, lon, radius, LIMIT)
+        if query is FULL_SCAN_SQL:
+            params = {key: params[key] for key in ("lat", "lon", "radius", "limit")}
+        start = time.perf_counter()
+        rows = cur.execute(query, params).fetchall()
+        timings.append((time.perf_counter() - start) * 1000)
+        found.append(len(rows))
+    return timings, found
+
+def run_benchmark():
+    if not os.path.exists(NEARBY_INDEX_PATH):
+        print(f"Index spatial introuvable : {NEARBY_INDEX_PATH} (lancer 'make views')")
+        return
+
+    # Points de requete tires parmi les etablissements geocodes
+    points = duckdb.sql(
+        f"SELECT latitude, longitude FROM read_parquet('{NEARBY_INDEX_PATH}') USING SAMPLE {N_QUERIES} ROWS"
+    ).fetchall()
+    random.shuffle(points)
+    n_rows = duckdb.sql(f"SELECT COUNT(*) FROM read_parquet('{NEARBY_INDEX_PATH}')").fetchone()[0]
+    print(f"--- BENCHMARK NEARBY ({len(points)} requetes par rayon, {n_rows} etablissements geocodes, limit={LIMIT}) ---")
+    print(f"{'rayon':>8} {'scan p50':>10} {'scan p99':>10} {'index p50':>10} {'index p99':>10} {'resultats':>10}")
+
+    pool = DuckDBPool(GOLD_DB_PATH, fallback_views={"nearby_index": NEARBY_INDEX_PATH}, size=1)
+    pool.open()
+    try:
+        with pool.cursor() as cur, duckdb.connect() as scan_conn:
+            for radius in RADII_KM:
+                scan_timings, _ = timed(scan_conn, FULL_SCAN_SQL, points, radius)
+                index_timings, found = timed(cur, NEARBY_SQL, points, radius)
+                print(
+                    f"{radius:>6g}km {statistics.median(scan_timings):>8.2f}ms {percentile(scan_timings, 0.99):>8.2f}ms "
+                    f"{statistics.median(index_timings):>8.2f}ms {percentile(index_timings, 0.99):>8.2f}ms "
+                    f"{statistics.mean(found):>10.1f}"
+                )
+    finally:
+        pool.close()
+
+if __name__ == "__main__":
+    run_benchmark()
@@ -0,0 +1,72 @@
+import duckdb
+import os
+import sys
+import time
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(BASE_DIR, "etl"))
+
+import address
+
+# Volume synthetique (la BAN complete compte ~26M d'adresses)
+N_ROWS = int(os.environ.get("BENCH_NORMALIZE_ROWS", "2000000"))
+
+STREET_TYPES = ["BD", "AV", "Av.", "RUE", "CHE", "IMP", "PL", "RTE", "ALL", "FG", "ST"]
+STREET_NAMES = ["de la Paix", "Victor-Hugo", "Jean Jaurès", "St Michel", "des Écoles", "l'Église", "du Général de Gaulle"]
+
+def legacy_sql():
+    """Ancienne normalisation BAN : trois REPLACE imbriques."""
+    return """
+        SELECT
+            numero,
+            REPLACE(
+                REPLACE(
+                    REPLACE(UPPER(nom_voie), 'AV ', 'AVENUE '),
+                    'ST ', 'SAINT '
+                ),
+                'BD ', 'BOULEVARD '
+            ) AS nom_voie_normalise
+        FROM addresses
+    """
+
+def table_driven_sql():
+    return f"""
+        SELECT
+            {address.number_sql("numero")} AS numero,
+            {address.street_sql("nom_voie")} AS nom_voie_normalise
+        FROM addresses, {address.abbreviations_sql()}
+    """
+
+def timed(conn, label, select_sql):
+    start = time.perf_counter()
+    conn.execute(f"CREATE OR REPLACE TEMP TABLE result AS {select_sql}")
+    elapsed = time.perf_counter() - start
+    print(f"{label:<28} {elapsed:8.2f} s  {N_ROWS / elapsed:12,.0f} lignes/s")
+
+def run_benchmark():
+    conn = duckdb.connect()
+    address.load_abbreviations(conn)
+    conn.execute(f"""
+        CREATE TEMP TABLE addresses AS
+        SELECT
+            LPAD(((i * 7) % 400)::VARCHAR, (1 + i % 3)::INTEGER, '0') AS numero,
+            LIST_ELEMENT($types, 1 + (i % {len(STREET_TYPES)})::INTEGER)
+                || ' ' || LIST_ELEMENT($names, 1 + ((i // 11) % {len(STREET_NAMES)})::INTEGER) AS nom_voie
+        FROM range({N_ROWS}) t(i)
+    """, {"types": STREET_TYPES, "names": STREET_NAMES})
+    print(f"--- BENCHMARK NORMALISATION ADRESSES ({N_ROWS:,} lignes, {os.cpu_count()} CPU) ---")
+
+    timed(conn, "REPLACE imbriques (ancien)", legacy_sql())
+    timed(conn, "Dictionnaire + MAP (nouveau)", table_driven_sql())
+
+    print("\nExemples :")
+    for row in conn.execute(f"""
+        SELECT DISTINCT nom_voie, nom_voie_normalise
+        FROM (SELECT nom_voie, {address.street_sql("nom_voie")} AS nom_voie_normalise
+              FROM (SELECT * FROM addresses LIMIT 50), {address.abbreviations_sql()})
+        ORDER BY 1 LIMIT 8
+    """).fetchall():
+        print(f"  {row[0]!r:<34} -> {row[1]}")
+
+if __name__ == "__main__":
+    run_benchmark()
@@ -0,0 +1,145 @@
+import duckdb
+import os
+import random
+import statistics
+import sys
+import time
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BASE_DIR)
+
+from api.db import DuckDBPool
+from api.mmap_index import MmapIndex
+
+PARQUET_GOLD_DIR = os.path.join(BASE_DIR, "data", "parquet", "gold")
+DB_DIR = os.path.join(BASE_DIR, "duckdb")
+GOLDEN_RECORD_PATH = os.path.join(PARQUET_GOLD_DIR, "golden_record.parquet").replace('\\', '/')
+GOLD_DB_PATH = os.path.join(DB_DIR, "gold.duckdb")
+SIRET_INDEX_PATH = os.path.join(PARQUET_GOLD_DIR, "siret_index.arrow")
+RNA_INDEX_PATH = os.path.join(PARQUET_GOLD_DIR, "rna_index.arrow")
+GOLDEN_COLUMNS = ["siret", "status", "name", "code_postal", "city", "rna", "latitude", "longitude", "is_ban_validated", "geocode_level"]
+
+N_LOOKUPS = 200
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))]
+
+def report(label, timings):
+    timings_ms = [t * 1000 for t in timings]
+    print(
+        f"{label:<32} p50={statistics.median(timings_ms):8.3f} ms  "
+        f"p99={percentile(timings_ms, 0.99):8.3f} ms  "
+        f"moyenne={statistics.mean(timings_ms):8.3f} ms"
+    )
+
+def bench_full_scan(sirets):
+    """Ancien comportement : connexion neuve + scan du parquet a chaque appel."""
+    timings = []
+    for siret in sirets:
+        start = time.perf_counter()
+        with duckdb.connect(database=':memory:') as conn:
+            conn.execute(f"SELECT * FROM read_parquet('{GOLDEN_RECORD_PATH}') WHERE siret = '{siret}'").fetchone()
+        timings.append(time.perf_counter() - start)
+    return timings
+
+def bench_pool(sirets):
+    """Nouveau comportement : curseur du pool sur la base Gold indexee."""
+    pool = DuckDBPool(GOLD_DB_PATH, fallback_views={"golden_record": GOLDEN_RECORD_PATH}, size=1)
+    pool.open()
+    timings = []
+    try:
+        for siret in sirets:
+            start = time.perf_counter()
+            with pool.cursor() as cur:
+                cur.execute("SELECT * FROM golden_record WHERE siret = ?", [siret]).fetchone()
+            timings.append(time.perf_counter() - start)
+    finally:
+        pool.close()
+    return timings
+
+def bench_batch(sirets):
+    """Endpoint batch : une seule jointure pour toute la liste de cles."""
+    pool = DuckDBPool(GOLD_DB_PATH, fallback_views={"golden_record": GOLDEN_RECORD_PATH}, size=1)
+    pool.open()
+    try:
+        start = time.perf_counter()
+        with pool.cursor() as cur:
+            cur.execute(
+                "SELECT * FROM golden_record WHERE siret IN (SELECT UNNEST(?::VARCHAR[]))", [sirets]
+            ).fetchall()
+        return time.perf_counter() - start
+    finally:
+        pool.close()
+
+def bench_mmap(sirets):
+    """Index SIRET projete en memoire : recherche dichotomique, sans DuckDB."""
+    index = MmapIndex(SIRET_INDEX_PATH, "siret_key", GOLDEN_COLUMNS)
+    start = time.perf_counter()
+    index.load()
+    load_elapsed = time.perf_counter() - start
+    timings = []
+    for siret in sirets:
+        start = time.perf_counter()
+        index.get(siret)
+        timings.append(time.perf_counter() - start)
+    start = time.perf_counter()
+    index.get_many(sirets)
+    return load_elapsed, timings, time.perf_counter() - start
+
+def bench_rna(ids):
+    """Index inverse RNA : tous les etablissements lies a chaque association."""
+    index = MmapIndex(RNA_INDEX_PATH, "id_rna", GOLDEN_COLUMNS)
+    index.load()
+    timings = []
+    for id_rna in ids:
+        start = time.perf_counter()
+        index.get_all(id_rna)
+        timings.append(time.perf_counter() - start)
+    start = time.perf_counter()
+    index.get_all_many(ids)
+    return timings, time.perf_counter() - start
+
+def run_benchmark():
+    if not os.path.exists(GOLDEN_RECORD_PATH):
+        print(f"Golden Record introuvable : {GOLDEN_RECORD_PATH} (lancer 'make views')")
+        return
+
+    sirets = [row[0] for row in duckdb.sql(
+        f"SELECT siret FROM read_parquet('{GOLDEN_RECORD_PATH}') USING SAMPLE {N_LOOKUPS} ROWS"
+    ).fetchall()]
+    random.shuffle(sirets)
+    print(f"--- BENCHMARK LOOKUP SIRET ({len(sirets)} requetes) ---")
+
+    report("Scan parquet (connexion neuve)", bench_full_scan(sirets))
+    pool_timings = bench_pool(sirets)
+    report("Pool DuckDB (base indexee)", pool_timings)
+
+    batch_elapsed = bench_batch(sirets)
+    print(f"{'Batch (jointure unique)':<32} total={batch_elapsed * 1000:8.3f} ms")
+    print(f"Debit unitaire : {len(sirets) / sum(pool_timings):10.0f} siret/s")
+    print(f"Debit batch    : {len(sirets) / batch_elapsed:10.0f} siret/s")
+
+    if not os.path.exists(SIRET_INDEX_PATH):
+        print(f"Index SIRET introuvable : {SIRET_INDEX_PATH} (lancer 'make views')")
+        return
+    load_elapsed, mmap_timings, mmap_batch_elapsed = bench_mmap(sirets)
+    report("Index mmap (dichotomie)", mmap_timings)
+    print(f"{'Ouverture index mmap':<32} total={load_elapsed * 1000:8.3f} ms")
+    print(f"{'Batch mmap':<32} total={mmap_batch_elapsed * 1000:8.3f} ms")
+    print(f"Debit mmap     : {len(sirets) / sum(mmap_timings):10.0f} siret/s")
+
+    if not os.path.exists(RNA_INDEX_PATH):
+        print(f"Index RNA introuvable : {RNA_INDEX_PATH} (lancer 'make views')")
+        return
+    ids = [row[0] for row in duckdb.sql(
+        f"SELECT DISTINCT rna FROM read_parquet('{GOLDEN_RECORD_PATH}') WHERE rna IS NOT NULL "
+        f"USING SAMPLE {N_LOOKUPS} ROWS"
+    ).fetchall()]
+    if ids:
+        rna_timings, rna_batch_elapsed = bench_rna(ids)
+        report("Index RNA mmap (plage)", rna_timings)
+        print(f"{'Batch RNA mmap':<32} total={rna_batch_elapsed * 1000:8.3f} ms")
+
+if __name__ == "__main__":
+    run_benchmark()
@@ -0,0 +1,405 @@
+import json
+import os
+import sys
+import time
+import zlib
+
+import duckdb
+import pyarrow as pa
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Facteur d'echelle : 1.0 = 200k etablissements SIRENE, 250k adresses BAN, 40k associations RNA
+# (le stock reel est d'environ SCALE=200)
+SCALE = float(os.environ.get("SYNTH_SCALE", "1"))
+SEED = int(os.environ.get("SYNTH_SEED", "42"))
+# Arborescence identique a data/raw (ban/, rna/, sirene/)
+OUT_DIR = os.environ.get("SYNTH_OUT_DIR", os.path.join(BASE_DIR, "data", "synthetic", "raw"))
+
+SIRENE_ROWS_PER_SCALE = 200_000
+BAN_ROWS_PER_SCALE = 250_000
+RNA_ROWS_PER_SCALE = 40_000
+
+# Fichier decrivant le jeu genere (parametres, lignes, duree)
+MARKER_NAME = "synthetic.json"
+RNA_FILE_DATE = "20240101"
+
+# Part des etablissements places sur une adresse BAN (les autres ne sont pas geocodables),
+# part des associations recopiant un etablissement SIRENE (nom et adresse : paires a matcher)
+SIRENE_BAN_ADDRESS_PCT = 85
+RNA_LINKED_PCT = 35
+
+# Grandes villes en tete du classement : ce sont les codes postaux les plus denses
+DENSE_CITIES = [
+    ("75", "Paris", 48.8566, 2.3522, [f"750{i:02d}" for i in range(1, 21)] + ["75116"]),
+    ("13", "Marseille", 43.2965, 5.3698, [f"130{i:02d}" for i in range(1, 17)]),
+    ("69", "Lyon", 45.7640, 4.8357, [f"6900{i}" for i in range(1, 10)]),
+    ("31", "Toulouse", 43.6047, 1.4442, ["31000", "31100", "31200", "31300", "31400", "31500"]),
+    ("06", "Nice", 43.7102, 7.2620, ["06000", "06100", "06200", "06300"]),
+    ("44", "Nantes", 47.2184, -1.5536, ["44000", "44100", "44200", "44300"]),
+    ("67", "Strasbourg", 48.5734, 7.7521, ["67000", "67100", "67200"]),
+    ("33", "Bordeaux", 44.8378, -0.5792, ["33000", "33100", "33200", "33300", "33800"]),
+    ("59", "Lille", 50.6292, 3.0573, ["59000", "59160", "59260", "59777", "59800"]),
+]
+
+DEPARTMENTS = (
+    [f"{i:02d}" for i in range(1, 20)] + ["2A", "2B"] + [f"{i:02d}" for i in range(21, 96)]
+    + ["971", "972", "973", "974", "976"]
+)
+CODES_PER_DEPARTMENT = 25
+
+CITY_NAMES = [
+    "Saint-Martin", "Saint-Denis", "Villeneuve", "Montigny", "Beaumont", "Fontaine", "Clermont",
+    "Chateauneuf", "Bourg", "Neuville", "Sainte-Marie", "Rochefort", "Champagne", "Bellevue",
+    "Mont-Saint-Jean", "Saint-Pierre", "Villefranche", "Marigny", "Valence", "Aubigny",
+    "Saint-Laurent", "Brignac", "Le Mesnil", "La Chapelle", "Les Essarts", "Vernon", "Montfort",
+    "Saint-Georges", "Plessis", "Chatillon",
+]
+
+# (libelle BAN, code SIRENE/RNA) : de la plus frequente a la plus rare
+STREET_TYPES = [
+    ("Rue", "RUE"), ("Avenue", "AV"), ("Boulevard", "BD"), ("Place", "PL"), ("Chemin", "CHE"),
+    ("Impasse", "IMP"), ("Allée", "ALL"), ("Route", "RTE"), ("Quai", "QUAI"), ("Cours", "CRS"),
+    ("Square", "SQ"), ("Passage", "PAS"), ("Faubourg", "FBG"), ("Résidence", "RES"), ("Lotissement", "LOT"),
+]
+
+STREET_NAMES = [
+    "de la Paix", "Victor Hugo", "Jean Jaurès", "du Général de Gaulle", "de la République",
+    "Pasteur", "de la Gare", "du Moulin", "de l'Église", "Gambetta", "Jules Ferry", "des Écoles",
+    "du Château", "de la Mairie", "Voltaire", "Carnot", "Saint-Michel", "des Lilas", "du Stade",
+    "de la Liberté", "Émile Zola", "Anatole France", "des Tilleuls", "du Marché", "de Verdun",
+    "Louis Pasteur", "de Lattre de Tassigny", "du 8 Mai 1945", "Foch", "des Acacias",
+    "du Commerce", "de la Fontaine", "des Roses", "Jean Moulin", "de Lorraine", "Nationale",
+    "du Port", "des Peupliers", "de Bretagne", "Saint-Jacques",
+]
+
+ACTIVITIES = [
+    "BOULANGERIE", "PHARMACIE", "RESTAURANT", "GARAGE", "COIFFURE", "CAFE", "TABAC PRESSE",
+    "BOUCHERIE", "FOOTBALL CLUB", "TENNIS CLUB", "ECOLE DE MUSIQUE", "AUTO ECOLE", "OPTIQUE",
+    "FLEURISTE", "THEATRE", "DANSE", "BOXE", "JUDO CLUB", "BIBLIOTHEQUE", "CHORALE",
+    "PHOTO CLUB", "RANDONNEE", "PETANQUE", "YOGA", "ATELIER", "CINEMA", "BRASSERIE", "EPICERIE",
+]
+
+QUALIFIERS = [
+    "DU CENTRE", "DE LA GARE", "DES AMIS", "DU PORT", "SAINT MARTIN", "DE LA MAIRIE", "DU MARCHE",
+    "DES HALLES", "DU LAC", "DU SUD", "DU NORD", "LES TILLEULS", "LA FONTAINE", "DU CHATEAU",
+    "DE LA VALLEE", "DES PLATANES", "DU PARC", "BELLEVUE", "DE L EGLISE", "DU MOULIN",
+]
+
+FAMILY_NAMES = [
+    "MARTIN", "BERNARD", "DUBOIS", "THOMAS", "ROBERT", "RICHARD", "PETIT", "DURAND", "LEROY",
+    "MOREAU", "SIMON", "LAURENT", "LEFEBVRE", "MICHEL", "GARCIA", "DAVID", "BERTRAND", "ROUX",
+    "VINCENT", "FOURNIER", "MOREL", "GIRARD", "ANDRE", "MERCIER", "DUPONT", "LAMBERT", "BONNET",
+    "FRANCOIS", "MARTINEZ", "LEGRAND",
+]
+
+ASSOCIATION_PREFIXES = [
+    "ASSOCIATION", "CLUB", "AMICALE", "COMITE DES FETES", "ASSOCIATION SPORTIVE", "UNION SPORTIVE",
+    "FOYER RURAL", "ASSOCIATION DES PARENTS D ELEVES", "SOCIETE DE CHASSE", "CERCLE",
+]
+
+EMPLOYEE_BANDS = ["NN", "NN", "NN", "00", "01", "02", "03", "11", "12", "21"]
+ACTIVITY_CODES = ["47.24Z", "47.73Z", "56.10A", "45.20A", "96.02A", "56.30Z", "47.26Z", "47.22Z", "93.12Z", "85.52Z"]
+
+def stable_hash(seed, *parts):
+    return zlib.crc32(":".join(str(part) for part in (seed,) + parts).encode())
+
+
+def postal_codes(seed):
+    """Codes postaux classes du plus dense au plus rare, avec centroide, commune et code INSEE.
+
+    Les grandes villes ouvrent le classement ; les autres codes suivent dans
+    un ordre pseudo-aleatoire fixe par la graine.
+    """
+    centroids = {}
+    for dept in DEPARTMENTS:
+        h = stable_hash(seed, "dept", dept)
+        # Metropole : emprise approximative de la France continentale
+        centroids[dept] = (42.6 + (h % 8000) / 1000, -4.2 + (h // 8000 % 12000) / 1000)
+    dense = []
+    dense_codes = set()
+    for dept, city, lat, lon, codes in DENSE_CITIES:
+        for code in codes:
+            h = stable_hash(seed, "code", code)
+            dense.append((code, dept, lat + (h % 800 - 400) / 10000, lon + (h // 800 % 800 - 400) / 10000, city))
+            dense_codes.add(code)
+
+    others = []
+    for dept in DEPARTMENTS:
+        for k in range(CODES_PER_DEPARTMENT):
+            if dept in ("2A", "2B"):
+                # Corse : 200xx-201xx (2A) et 202xx-203xx (2B)
+                code = f"20{k * 8 + (200 if dept == '2B' else 0):03d}"
+            elif len(dept) == 3:
+                code = f"{dept}{k * 4:02d}"
+            else:
+                code = f"{dept}{k * 40:03d}"
+            if code in dense_codes:
+                continue
+            h = stable_hash(seed, "code", code)
+            lat, lon = centroids[dept]
+            others.append((code, dept, lat + (h % 4000 - 2000) / 10000, lon + (h // 4000 % 4000 - 2000) / 10000,
+                           CITY_NAMES[h % len(CITY_NAMES)]))
+    others.sort(key=lambda row: stable_hash(seed, "rank", row[0]))
+
+    rows = []
+    for rank, (code, dept, lat, lon, city) in enumerate(dense + others):
+        commune_number = 100 + int(code[-2:]) if dept == "75" else stable_hash(seed, "insee", code) % 1000
+        rows.append((rank, code, dept, f"{dept}{commune_number:0{5 - len(dept)}d}", city, lat, lon))
+    return rows
+
+
+def define_macros(conn, seed):
+    # Hachage entier (multiplicatif puis melange xorshift) : memes valeurs quel que
+    # soit l'ordre d'execution ou le nombre de threads, contrairement a random()
+    conn.execute("CREATE MACRO mix32(x) AS (xor(x, x >> 16) * 73244475) % 4294967296")
+    conn.execute(f"""
+        CREATE MACRO h(i, salt) AS xor(
+            mix32(mix32((i * 2654435761 + salt * 40503 + {seed}) % 4294967296)),
+            mix32(mix32((i * 2654435761 + salt * 40503 + {seed}) % 4294967296)) >> 16
+        )
+    """)
+    conn.execute("CREATE MACRO u(i, salt) AS h(i, salt) / 4294967296.0")
+    conn.execute("CREATE MACRO pick(i, salt, n) AS CAST(h(i, salt) % n AS INTEGER)")
+    # Rang ~ loi de Zipf (P(k) ~ 1/k) : quelques valeurs tres frequentes, une longue traine
+    conn.execute("CREATE MACRO zipf(i, salt, n) AS LEAST(CAST(FLOOR(EXP(u(i, salt) * LN(n + 1))) AS INTEGER) - 1, n - 1)")
+
+
+def sql_list(values):
+    return "[" + ", ".join("'" + value.replace("'", "''") + "'" for value in values) + "]"
+
+
+def copy_csv(conn, query, path, delimiter):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    safe_path = path.replace('\\', '/')
+    conn.execute(f"COPY ({query}) TO '{safe_path}' (FORMAT CSV, HEADER, DELIMITER '{delimiter}')")
+
+
+def build_tables(conn, n_ban, n_sirene, n_rna):
+    n_types = len(STREET_TYPES)
+    n_names = len(STREET_NAMES)
+    n_codes = conn.execute("SELECT COUNT(*) FROM postal_codes").fetchone()[0]
+    ban_types = sql_list(label for label, _ in STREET_TYPES)
+    short_types = sql_list(code for _, code in STREET_TYPES)
+    street_names = sql_list(STREET_NAMES)
+
+    conn.execute(f"""
+        CREATE TABLE ban AS
+        SELECT
+            i, p.*,
+            1 + zipf(i, 2, 300) AS numero,
+            CASE WHEN pick(i, 3, 100) < 3 THEN 'bis' END AS rep,
+            zipf(i, 4, {n_types}) AS street_type,
+            pick(i, 5, {n_names}) AS street_name,
+            {ban_types}[street_type + 1] || ' ' || {street_names}[street_name + 1] AS nom_voie,
+            ROUND(p.lat + (u(i, 6) - 0.5) * 0.02, 6) AS point_lat,
+            ROUND(p.lon + (u(i, 7) - 0.5) * 0.02, 6) AS point_lon
+        FROM (SELECT i, zipf(i, 1, {n_codes}) AS code_rank FROM range({n_ban}) t(i))
+        JOIN postal_codes p ON p.rank = code_rank
+    """)
+
+    activities = sql_list(ACTIVITIES)
+    qualifiers = sql_list(QUALIFIERS)
+    families = sql_list(FAMILY_NAMES)
+    conn.execute(f"""
+        CREATE TABLE sirene AS
+        SELECT
+            s.i,
+            LPAD(CAST(300000000 + s.i // 3 AS VARCHAR), 9, '0') AS siren,
+            LPAD(CAST((s.i % 3 + 1) * 11 AS VARCHAR), 5, '0') AS nic,
+            CASE WHEN pick(s.i, 12, 100) < 80 THEN 'A' ELSE 'F' END AS etat,
+            {activities}[zipf(s.i, 13, {len(ACTIVITIES)}) + 1] || ' ' || CASE
+                WHEN pick(s.i, 14, 2) = 0 THEN {qualifiers}[pick(s.i, 15, {len(QUALIFIERS)}) + 1]
+                ELSE {families}[zipf(s.i, 16, {len(FAMILY_NAMES)}) + 1]
+            END AS business_name,
+            pick(s.i, 17, 100) AS name_kind,
+            -- Adresse BAN reprise (forme abregee et majuscules sans accents, comme SIRENE) ou adresse libre
+            COALESCE(b.numero, 1 + zipf(s.i, 18, 300)) AS numero,
+            COALESCE(b.street_type, zipf(s.i, 19, {n_types})) AS street_type,
+            strip_accents(UPPER({street_names}[COALESCE(b.street_name, pick(s.i, 20, {n_names})) + 1])) AS libelle_voie,
+            COALESCE(b.code_postal, p.code_postal) AS code_postal,
+            UPPER(COALESCE(b.city, p.city)) AS commune,
+            COALESCE(b.code_insee, p.code_insee) AS code_insee
+        FROM (
+            SELECT i, zipf(i, 21, {n_codes}) AS code_rank, CASE WHEN pick(i, 10, 100) < {SIRENE_BAN_ADDRESS_PCT} THEN h(i, 11) % {n_ban} END AS ban_i
+            FROM range({n_sirene}) t(i)
+        ) s
+        LEFT JOIN ban b ON b.i = s.ban_i
+        JOIN postal_codes p ON p.rank = s.code_rank
+    """)
+
+    prefixes = sql_list(ASSOCIATION_PREFIXES)
+    conn.execute(f"""
+        CREATE TABLE rna AS
+        SELECT
+            r.i,
+            'W' || LPAD(CAST(r.i AS VARCHAR), 9, '0') AS id,
+            s.siren || s.nic AS linked_siret,
+            -- Associations liees : meme nom (parfois prefixe) et meme adresse qu'un etablissement
+            CASE
+                WHEN s.i IS NULL THEN {prefixes}[zipf(r.i, 32, {len(ASSOCIATION_PREFIXES)}) + 1] || ' '
+                    || {activities}[zipf(r.i, 33, {len(ACTIVITIES)}) + 1] || ' ' || {qualifiers}[pick(r.i, 34, {len(QUALIFIERS)}) + 1]
+                WHEN pick(r.i, 35, 3) = 0 THEN 'ASSOCIATION ' || s.business_name
+                ELSE s.business_name
+            END AS titre,
+            COALESCE(s.numero, b.numero) AS numero,
+            {short_types}[COALESCE(s.street_type, b.street_type) + 1] AS typevoie,
+            COALESCE(s.libelle_voie, strip_accents(UPPER({street_names}[b.street_name + 1]))) AS libelle_voie,
+            COALESCE(s.code_postal, b.code_postal) AS code_postal,
+            COALESCE(s.commune, UPPER(b.city)) AS commune,
+            COALESCE(s.code_insee, b.code_insee) AS code_insee
+        FROM (
+            SELECT
+                i, h(i, 36) % {n_ban} AS ban_i,
+                CASE WHEN pick(i, 30, 100) < {RNA_LINKED_PCT} THEN h(i, 31) % {n_sirene} END AS sirene_i
+            FROM range({n_rna}) t(i)
+        ) r
+        LEFT JOIN sirene s ON s.i = r.sirene_i
+        JOIN ban b ON b.i = r.ban_i
+    """)
+
+
+# En-tetes, ordre et separateurs des fichiers reels ; les colonnes que l'ingestion
+# ignore sont remplies pour que le cout de lecture du CSV reste realiste
+def write_ban(conn, path):
+    copy_csv(conn, """
+        SELECT
+            code_insee || '_' || LPAD(CAST(street_name * 100 + street_type AS VARCHAR), 4, '0')
+                || '_' || LPAD(CAST(numero AS VARCHAR), 5, '0') || COALESCE(rep, '') AS id,
+            code_insee || '_' || LPAD(CAST(street_name * 100 + street_type AS VARCHAR), 4, '0') AS id_fantoir,
+            numero, rep, nom_voie, code_postal, code_insee, city AS nom_commune,
+            NULL AS code_insee_ancienne_commune, NULL AS nom_ancienne_commune,
+            ROUND((point_lon + 1.5) * 111000 * 0.7 + 700000, 2) AS x,
+            ROUND((point_lat - 46.5) * 111000 + 6600000, 2) AS y,
+            point_lon AS lon, point_lat AS lat,
+            'entrée' AS type_position, NULL AS alias, NULL AS nom_ld,
+            UPPER(strip_accents(city)) AS libelle_acheminement,
+            UPPER(strip_accents(nom_voie)) AS nom_afnor,
+            'commune' AS source_position, 'commune' AS source_nom_voie,
+            1 AS certification_commune,
+            code_insee || '000AB' || LPAD(CAST(i % 10000 AS VARCHAR), 4, '0') AS cad_parcelles
+        FROM ban ORDER BY i
+    """, path, ";")
+
+
+def write_sirene(conn, path):
+    short_types = sql_list(code for _, code in STREET_TYPES)
+    activity_codes = sql_list(ACTIVITY_CODES)
+    tranches = sql_list(EMPLOYEE_BANDS)
+    copy_csv(conn, f"""
+        SELECT
+            siren, nic, siren || nic AS siret, 'O' AS statutDiffusionEtablissement,
+            DATE '1970-01-01' + CAST(h(i, 40) % 19700 AS INTEGER) AS dateCreationEtablissement,
+            {tranches}[pick(i, 41, {len(EMPLOYEE_BANDS)}) + 1] AS trancheEffectifsEtablissement,
+            CASE WHEN i % 3 = 0 THEN 'true' ELSE 'false' END AS etablissementSiege,
+            NULL AS complementAdresseEtablissement,
+            CASE WHEN pick(i, 42, 100) < 5 THEN NULL ELSE CAST(numero AS VARCHAR) END AS numeroVoieEtablissement,
+            NULL AS indiceRepetitionEtablissement,
+            {short_types}[street_type + 1] AS typeVoieEtablissement,
+            libelle_voie AS libelleVoieEtablissement,
+            code_postal AS codePostalEtablissement,
+            commune AS libelleCommuneEtablissement,
+            code_insee AS codeCommuneEtablissement,
+            DATE '2000-01-01' + CAST(h(i, 43) % 8700 AS INTEGER) AS dateDebut,
+            etat AS etatAdministratifEtablissement,
+            CASE WHEN name_kind < 55 THEN business_name END AS enseigne1Etablissement,
+            NULL AS enseigne2Etablissement,
+            NULL AS enseigne3Etablissement,
+            CASE WHEN name_kind >= 55 AND name_kind < 80 THEN business_name END AS denominationUsuelleEtablissement,
+            {activity_codes}[pick(i, 44, {len(ACTIVITY_CODES)}) + 1] AS activitePrincipaleEtablissement,
+            'NAFRev2' AS nomenclatureActivitePrincipaleEtablissement,
+            CASE WHEN pick(i, 45, 2) = 0 THEN 'O' ELSE 'N' END AS caractereEmployeurEtablissement
+        FROM sirene ORDER BY i
+    """, path, ",")
+
+
+def write_rna(conn, rna_dir):
+    """Un fichier par departement, comme l'export RNA (rna_waldec_<date>_dpt_<XX>.csv)."""
+    conn.execute("""
+        CREATE TABLE rna_rows AS
+        SELECT
+            CASE WHEN code_postal LIKE '97%' THEN SUBSTRING(code_postal, 1, 3) ELSE SUBSTRING(code_postal, 1, 2) END AS dpt,
+            *
+        FROM rna
+    """)
+    departments = [row[0] for row in conn.execute("SELECT DISTINCT dpt FROM rna_rows ORDER BY dpt").fetchall()]
+    for dpt in departments:
+        copy_csv(conn, f"""
+            SELECT
+                id, NULL AS id_ex,
+                CASE WHEN linked_siret IS NOT NULL AND pick(i, 50, 2) = 0 THEN linked_siret END AS siret,
+                NULL AS rup_mi, SUBSTRING(code_postal, 1, 2) || '1P' AS gestion,
+                DATE '1950-01-01' + CAST(h(i, 51) % 27000 AS INTEGER) AS date_creat,
+                DATE '2010-01-01' + CAST(h(i, 52) % 5000 AS INTEGER) AS date_decla,
+                DATE '2010-01-01' + CAST(h(i, 52) % 5000 + 20 AS INTEGER) AS date_publi,
+                DATE '0001-01-01' AS date_disso,
+                'D' AS nature, 'S' AS groupement,
+                titre, SUBSTRING(titre, 1, 38) AS titre_court,
+                'Promouvoir et developper les activites de ' || LOWER(titre) || ' aupres de ses membres' AS objet,
+                LPAD(CAST(pick(i, 53, 30000) AS VARCHAR), 6, '0') AS objet_social1,
+                '000000' AS objet_social2,
+                NULL AS adrs_complement,
+                CAST(numero AS VARCHAR) AS adrs_numvoie, NULL AS adrs_repetition,
+                typevoie AS adrs_typevoie, libelle_voie AS adrs_libvoie, NULL AS adrs_distrib,
+                code_insee AS adrs_codeinsee, code_postal AS adrs_codepostal, commune AS adrs_libcommune,
+                NULL AS adrs_gest_nom, NULL AS adrs_gest_libvoie, NULL AS adrs_gest_codepostal,
+                NULL AS adrs_gest_achemine, 'FRANCE' AS adrs_gest_pays,
+                NULL AS siteweb, 'false' AS publiweb, NULL AS observation,
+                'A' AS position, TIMESTAMP '2024-01-01 00:00:00' AS maj_time
+            FROM rna_rows WHERE dpt = '{dpt}' ORDER BY i
+        """, os.path.join(rna_dir, f"rna_waldec_{RNA_FILE_DATE}_dpt_{dpt}.csv"), ";")
+    return len(departments)
+
+
+def generate(out_dir=OUT_DIR, scale=SCALE, seed=SEED):
+    """Ecrit les CSV synthetiques BAN, SIRENE et RNA dans out_dir et retourne leur description.
+
+    Meme (scale, seed) => memes fichiers : les valeurs pseudo-aleatoires sont
+    des hachages du numero de ligne, sans etat ni dependance a l'ordre de calcul.
+    """
+    n_ban = max(1, int(BAN_ROWS_PER_SCALE * scale))
+    n_sirene = max(1, int(SIRENE_ROWS_PER_SCALE * scale))
+    n_rna = max(1, int(RNA_ROWS_PER_SCALE * scale))
+    start = time.perf_counter()
+
+    with duckdb.connect() as conn:
+        define_macros(conn, seed)
+        codes = pa.Table.from_pylist([
+            dict(zip(("rank", "code_postal", "dept", "code_insee", "city", "lat", "lon"), row))
+            for row in postal_codes(seed)
+        ])
+        conn.execute("CREATE TABLE postal_codes AS SELECT * FROM codes")
+        build_tables(conn, n_ban, n_sirene, n_rna)
+
+        # Les anciens fichiers RNA ne doivent pas rester dans le joker rna_waldec_*.csv
+        rna_dir = os.path.join(out_dir, "rna")
+        if os.path.isdir(rna_dir):
+            for name in os.listdir(rna_dir):
+                if name.startswith("rna_waldec_") and name.endswith(".csv"):
+                    os.remove(os.path.join(rna_dir, name))
+        write_ban(conn, os.path.join(out_dir, "ban", "adresses-france.csv"))
+        write_sirene(conn, os.path.join(out_dir, "sirene", "StockEtablissement_utf8.csv"))
+        n_rna_files = write_rna(conn, rna_dir)
+
+    description = {
+        "scale": scale,
+        "seed": seed,
+        "rows": {"ban": n_ban, "sirene": n_sirene, "rna": n_rna},
+        "rna_files": n_rna_files,
+        "seconds": round(time.perf_counter() - start, 3),
+    }
+    with open(os.path.join(out_dir, MARKER_NAME), "w", encoding="utf-8") as f:
+        json.dump(description, f, indent=2)
+    return description
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        OUT_DIR = sys.argv[1]
+    print(f"--- GENERATION DE DONNEES SYNTHETIQUES (scale={SCALE}, seed={SEED}) -> {OUT_DIR} ---")
+    result = generate(OUT_DIR)
+    rows = result["rows"]
+    print(
+        f"BAN {rows['ban']} adresses, SIRENE {rows['sirene']} etablissements, "
+        f"RNA {rows['rna']} associations ({result['rna_files']} fichiers) en {result['seconds']}s"
+    )
@@ -0,0 +1,108 @@
+import json
+import os
+import random
+import statistics
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+from collections import Counter
+
+# Serveur a tester (lancer 'make api' au prealable)
+BASE_URL = os.environ.get("LOAD_TEST_URL", "http://127.0.0.1:8000")
+PHASE_SECONDS = float(os.environ.get("LOAD_TEST_SECONDS", "10"))
+HEAVY_CLIENTS = int(os.environ.get("LOAD_TEST_HEAVY_CLIENTS", "32"))
+PROBE_INTERVAL = 0.05
+
+# Routes legeres sondees pendant toute la duree du test
+PROBES = ["/api/v1/ping", "/api/v1/stats/75001", "/api/v1/stats"]
+
+SEARCH_TERMS = ["a", "as", "de", "la", "le", "sa", "so", "ma", "pa", "ca"]
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))]
+
+def request(path, body=None):
+    """Retourne (statut HTTP, duree en secondes)."""
+    data = json.dumps(body).encode() if body is not None else None
+    req = urllib.request.Request(BASE_URL + path, data=data, headers={"Content-Type": "application/json"})
+    start = time.perf_counter()
+    try:
+        with urllib.request.urlopen(req, timeout=30) as response:
+            response.read()
+            status = response.status
+    except urllib.error.HTTPError as e:
+        status = e.code
+    except OSError:
+        status = 0
+    return status, time.perf_counter() - start
+
+def heavy_request(rng):
+    """Requete couteuse et non cachee : batch SIRET de taille maximale ou recherche large paginee."""
+    if rng.random() < 0.5:
+        sirets = ["".join(rng.choices("0123456789", k=14)) for _ in range(1000)]
+        return request("/api/v1/siret/batch", sirets)
+    term = rng.choice(SEARCH_TERMS)
+    return request(f"/api/v1/search?q={term}&typeahead=true&limit=100&offset={rng.randint(0, 5000)}")
+
+def probe(stop, timings):
+    while not stop.is_set():
+        for path in PROBES:
+            status, elapsed = request(path)
+            timings.setdefault(path, []).append((status, elapsed))
+        time.sleep(PROBE_INTERVAL)
+
+def heavy_client(stop, seed, statuses, durations):
+    rng = random.Random(seed)
+    while not stop.is_set():
+        status, elapsed = heavy_request(rng)
+        statuses[status] += 1
+        durations.append(elapsed)
+
+def run_phase(label, heavy_clients):
+    stop = threading.Event()
+    probe_timings = {}
+    statuses = Counter()
+    durations = []
+    threads = [threading.Thread(target=probe, args=(stop, probe_timings))]
+    threads += [
+        threading.Thread(target=heavy_client, args=(stop, seed, statuses, durations))
+        for seed in range(heavy_clients)
+    ]
+    for thread in threads:
+        thread.start()
+    time.sleep(PHASE_SECONDS)
+    stop.set()
+    for thread in threads:
+        thread.join()
+
+    print(f"--- {label} ({heavy_clients} clients lourds, {PHASE_SECONDS:.0f} s) ---")
+    for path in PROBES:
+        timings_ms = [elapsed * 1000 for _, elapsed in probe_timings.get(path, [])]
+        errors = sum(1 for status, _ in probe_timings.get(path, []) if status != 200)
+        if timings_ms:
+            print(
+                f"{path:<24} p50={statistics.median(timings_ms):8.2f} ms  "
+                f"p99={percentile(timings_ms, 0.99):8.2f} ms  "
+                f"max={max(timings_ms):8.2f} ms  erreurs={errors}"
+            )
+    if heavy_clients:
+        heavy_ms = [d * 1000 for d in durations]
+        print(
+            f"{'requetes lourdes':<24} n={len(heavy_ms)}  "
+            f"p50={statistics.median(heavy_ms) if heavy_ms else 0:8.2f} ms  "
+            f"statuts={dict(sorted(statuses.items()))}"
+        )
+
+def run_load_test():
+    status, _ = request("/api/v1/ping")
+    if status != 200:
+        print(f"API injoignable sur {BASE_URL} (lancer 'make api')")
+        sys.exit(1)
+    run_phase("Repos", 0)
+    run_phase("Sous charge", HEAVY_CLIENTS)
+
+if __name__ == "__main__":
+    run_load_test()
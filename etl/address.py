@@ -0,0 +1,71 @@
+import os
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Dictionnaire des abreviations de voies (codes INSEE/La Poste et variantes courantes).
+# scope = "first" : forme courte qui est aussi un mot courant des libelles
+# ("RUE DU LOT", "CHEMIN DU PAS"), developpee seulement en tete (type de voie) ;
+# scope = "any" : developpee a toute position.
+ABBREVIATIONS_PATH = os.path.join(BASE_DIR, "address_abbreviations.csv")
+ABBREVIATIONS_TABLE = "address_abbreviations"
+
+def load_abbreviations(conn):
+    """Charge le dictionnaire CSV dans une table DuckDB de la connexion."""
+    path = ABBREVIATIONS_PATH.replace('\\', '/')
+    conn.execute(f"""
+        CREATE OR REPLACE TABLE {ABBREVIATIONS_TABLE} AS
+        SELECT
+            UPPER(TRIM(abbreviation)) AS abbreviation,
+            UPPER(TRIM(expansion)) AS expansion,
+            COALESCE(LOWER(TRIM(scope)), 'any') AS scope
+        FROM read_csv('{path}', header=true, columns={{'abbreviation': 'VARCHAR', 'expansion': 'VARCHAR', 'scope': 'VARCHAR'}})
+    """)
+
+def abbreviations_sql():
+    """Sous-requete d'une ligne exposant le dictionnaire en MAP.
+
+    Colonnes abbreviations (entrees developpees a toute position) et
+    leading_abbreviations (tout le dictionnaire, pour le premier mot).
+    Jointe en CROSS JOIN a la source : les MAP sont construits une fois et
+    les recherches par mot se font dans la meme passe que la lecture.
+    """
+    return f"""(
+        SELECT
+            MAP(
+                LIST(abbreviation) FILTER (WHERE scope = 'any'),
+                LIST(expansion) FILTER (WHERE scope = 'any')
+            ) AS abbreviations,
+            MAP(LIST(abbreviation), LIST(expansion)) AS leading_abbreviations
+        FROM {ABBREVIATIONS_TABLE}
+    )"""
+
+def fold_sql(expression):
+    """Majuscules, accents et ligatures retires (la ponctuation est traitee par words_sql)."""
+    return f"STRIP_ACCENTS(REPLACE(REPLACE(UPPER({expression}), 'Œ', 'OE'), 'Æ', 'AE'))"
+
+def words_sql(expression):
+    """Liste des mots alphanumeriques : ponctuation et espaces multiples servent de separateurs."""
+    return f"LIST_FILTER(REGEXP_SPLIT_TO_ARRAY({fold_sql(expression)}, '[^A-Z0-9]+'), word -> word <> '')"
+
+def street_sql(*expressions):
+    """Cle de voie normalisee (ex. 'bd St-Michel' -> 'BOULEVARD SAINT MICHEL').
+
+    Les expressions (type de voie, libelle...) sont concatenees puis decoupees
+    en mots, et chaque mot est remplace via le dictionnaire ; les entrees
+    ambigues (scope "first") ne le sont qu'en premier mot. Necessite les
+    colonnes de abbreviations_sql() dans le FROM.
+    """
+    joined = "CONCAT_WS(' ', " + ", ".join(expressions) + ")"
+    return f"""
+        NULLIF(ARRAY_TO_STRING(
+            LIST_TRANSFORM(
+                {words_sql(joined)},
+                (word, i) -> COALESCE(CASE WHEN i = 1 THEN leading_abbreviations[word] END, abbreviations[word], word)
+            ),
+            ' '
+        ), '')
+    """
+
+def number_sql(expression):
+    """Numero dans la voie sans espaces ni zeros de tete ('007' -> '7'), NULL si absent."""
+    return f"NULLIF(LTRIM(REPLACE(UPPER({expression}), ' ', ''), '0'), '')"
@@ -0,0 +1,57 @@
+import os
+import threading
+from contextlib import contextmanager
+
+import duckdb
+
+# Part de threads / memoire allouee aux sessions DuckDB du thread courant,
+# fixee par etl/pipeline.py quand plusieurs etapes tournent en parallele
+_local = threading.local()
+
+def total_memory_mb():
+    """Memoire physique de la machine (4 Go par defaut si elle n'est pas lisible)."""
+    try:
+        return os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_PHYS_PAGES") // (1024 * 1024)
+    except (AttributeError, ValueError, OSError):
+        return 4096
+
+def current():
+    """(threads, memoire en Mo) du thread courant, None hors pipeline."""
+    return getattr(_local, "share", None)
+
+def threads():
+    share = current()
+    return share[0] if share else None
+
+def split(parts):
+    """(threads, memoire en Mo) de chacune de `parts` taches paralleles lancees par le thread courant.
+
+    Hors pipeline, la part est prise sur la machine (tous les coeurs, 3/4 de la memoire).
+    """
+    threads, memory_mb = current() or (os.cpu_count() or 1, total_memory_mb() * 3 // 4)
+    return max(1, threads // parts), max(64, memory_mb // parts)
+
+@contextmanager
+def share(threads, memory_mb):
+    """Limite les sessions DuckDB ouvertes par le thread courant via connect()."""
+    previous = current()
+    _local.share = (threads, memory_mb)
+    try:
+        yield
+    finally:
+        _local.share = previous
+
+def connect(database=":memory:", read_only=False, memory_limit=None):
+    """duckdb.connect() avec la part de budget du thread courant.
+
+    Hors pipeline, `memory_limit` (ex. '2GB') s'applique s'il est fourni et
+    DuckDB garde ses reglages par defaut sinon.
+    """
+    conn = duckdb.connect(database, read_only=read_only)
+    share = current()
+    if share:
+        conn.execute(f"SET threads = {share[0]}")
+        conn.execute(f"SET memory_limit = '{share[1]}MB'")
+    elif memory_limit:
+        conn.execute(f"SET memory_limit = '{memory_limit}'")
+    return conn
@@ -0,0 +1,211 @@
+import os
+import shutil
+import time
+
+import budget
+import layout
+from manifest import DEPARTEMENT_SQL, departement_list_sql
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PARQUET_SILVER_DIR = os.path.join(BASE_DIR, "data", "parquet", "silver")
+DB_DIR = os.path.join(BASE_DIR, "duckdb")
+
+# Coordonnees par siret, un fichier par departement (conserves pour le recalcul incremental)
+GEOCODE_PARTS_DIR = os.path.join(PARQUET_SILVER_DIR, "geocode_parts")
+GEOCODE_TMP_DIR = os.path.join(PARQUET_SILVER_DIR, "_geocode_tmp")
+
+# Budget memoire DuckDB du geocodage : au-dela, les jointures et agregats debordent sur disque
+GEOCODE_MEMORY_LIMIT = os.environ.get("GEOCODE_MEMORY_LIMIT", "2GB")
+GEOCODE_SPILL_DIR = os.path.join(DB_DIR, "geocode_spill")
+
+# Niveaux de precision, du plus fin au plus grossier
+LEVEL_ADDRESS = "adresse"
+LEVEL_STREET = "voie"
+LEVEL_POSTAL_CODE = "code_postal"
+
+def geocode_part_path(departement):
+    return os.path.join(GEOCODE_PARTS_DIR, f"departement={departement}.parquet")
+
+def geocode_source_sql(departements=None):
+    """Coordonnees des etablissements des departements donnes (None = tous)."""
+    if departements is None:
+        files = [os.path.join(GEOCODE_PARTS_DIR, name) for name in sorted(os.listdir(GEOCODE_PARTS_DIR))]
+    else:
+        files = [geocode_part_path(d) for d in departements if os.path.exists(geocode_part_path(d))]
+    if not files:
+        return "(SELECT NULL::VARCHAR AS siret, NULL::VARCHAR AS latitude, NULL::VARCHAR AS longitude, NULL::VARCHAR AS geocode_level WHERE false)"
+    file_list = ", ".join("'" + f.replace('\\', '/') + "'" for f in files)
+    return f"read_parquet([{file_list}])"
+
+def address_key_sql():
+    """Cle compacte (numero, voie normalisee) ; NULL si l'un des deux manque."""
+    return "CASE WHEN numero IS NOT NULL AND nom_voie_normalise IS NOT NULL THEN HASH(nom_voie_normalise, numero) END"
+
+def street_key_sql():
+    return "CASE WHEN nom_voie_normalise IS NOT NULL THEN HASH(nom_voie_normalise) END"
+
+def prepare_partitions(conn, sirene_silver, ban_silver, departements):
+    """Une lecture de chaque source : cles compactes ecrites partitionnees par departement."""
+    if os.path.exists(GEOCODE_TMP_DIR):
+        shutil.rmtree(GEOCODE_TMP_DIR)
+    os.makedirs(GEOCODE_TMP_DIR)
+    tmp_dir = GEOCODE_TMP_DIR.replace('\\', '/')
+
+    def scope(silver_path):
+        if departements is None:
+            return "true"
+        return f"{layout.departement_sql(silver_path)} IN ({departement_list_sql(departements)})"
+
+    conn.execute(f"""
+        COPY (
+            SELECT
+                {DEPARTEMENT_SQL} AS departement,
+                code_postal,
+                {address_key_sql()} AS address_key,
+                {street_key_sql()} AS street_key,
+                TRY_CAST(latitude AS DOUBLE) AS latitude,
+                TRY_CAST(longitude AS DOUBLE) AS longitude
+            FROM {layout.read_sql(ban_silver)}
+            WHERE code_postal IS NOT NULL AND {scope(ban_silver)}
+        ) TO '{tmp_dir}/ban' (FORMAT PARQUET, PARTITION_BY (departement));
+    """)
+    conn.execute(f"""
+        COPY (
+            SELECT
+                {DEPARTEMENT_SQL} AS departement,
+                siret,
+                code_postal,
+                {address_key_sql()} AS address_key,
+                {street_key_sql()} AS street_key
+            FROM {layout.read_sql(sirene_silver)}
+            WHERE code_postal IS NOT NULL AND {scope(sirene_silver)}
+        ) TO '{tmp_dir}/sirene' (FORMAT PARQUET, PARTITION_BY (departement));
+    """)
+
+    root = os.path.join(GEOCODE_TMP_DIR, "sirene")
+    if not os.path.exists(root):
+        return []
+    return sorted(d.split("=", 1)[1] for d in os.listdir(root) if d.startswith("departement="))
+
+def geocode_departement(conn, departement):
+    """Jointure par hachage sur les tables de correspondance BAN d'un seul departement."""
+    tmp_dir = GEOCODE_TMP_DIR.replace('\\', '/')
+    result_file = geocode_part_path(departement).replace('\\', '/')
+    ban_dir = os.path.join(GEOCODE_TMP_DIR, "ban", f"departement={departement}")
+    ban_points = (
+        f"read_parquet('{tmp_dir}/ban/departement={departement}/*.parquet')"
+        if os.path.isdir(ban_dir)
+        else "(SELECT NULL::VARCHAR AS code_postal, NULL::UBIGINT AS address_key, NULL::UBIGINT AS street_key, "
+             "NULL::DOUBLE AS latitude, NULL::DOUBLE AS longitude WHERE false)"
+    )
+
+    conn.execute(f"""
+        COPY (
+            WITH points AS (
+                SELECT * FROM {ban_points} WHERE latitude IS NOT NULL AND longitude IS NOT NULL
+            ),
+            -- Tables de correspondance compactes : une ligne par cle, coordonnees moyennes
+            by_address AS (
+                SELECT code_postal, address_key, AVG(latitude) AS latitude, AVG(longitude) AS longitude
+                FROM points WHERE address_key IS NOT NULL GROUP BY ALL
+            ),
+            by_street AS (
+                SELECT code_postal, street_key, AVG(latitude) AS latitude, AVG(longitude) AS longitude
+                FROM points WHERE street_key IS NOT NULL GROUP BY ALL
+            ),
+            by_postal_code AS (
+                SELECT code_postal, AVG(latitude) AS latitude, AVG(longitude) AS longitude
+                FROM points GROUP BY ALL
+            ),
+            located AS (
+                SELECT
+                    s.siret,
+                    COALESCE(a.latitude, v.latitude, c.latitude) AS latitude,
+                    COALESCE(a.longitude, v.longitude, c.longitude) AS longitude,
+                    CASE
+                        WHEN a.latitude IS NOT NULL THEN '{LEVEL_ADDRESS}'
+                        WHEN v.latitude IS NOT NULL THEN '{LEVEL_STREET}'
+                        WHEN c.latitude IS NOT NULL THEN '{LEVEL_POSTAL_CODE}'
+                    END AS geocode_level
+                FROM read_parquet('{tmp_dir}/sirene/departement={departement}/*.parquet') s
+                LEFT JOIN by_address a ON s.code_postal = a.code_postal AND s.address_key = a.address_key
+                LEFT JOIN by_street v ON s.code_postal = v.code_postal AND s.street_key = v.street_key
+                LEFT JOIN by_postal_code c ON s.code_postal = c.code_postal
+            )
+            SELECT
+                siret,
+                -- Meme representation texte que les coordonnees BAN d'origine
+                CAST(ROUND(latitude, 5) AS VARCHAR) AS latitude,
+                CAST(ROUND(longitude, 5) AS VARCHAR) AS longitude,
+                geocode_level
+            FROM located
+            WHERE geocode_level IS NOT NULL
+        ) TO '{result_file}' (FORMAT PARQUET, COMPRESSION 'ZSTD');
+    """)
+    return dict(conn.execute(f"""
+        SELECT geocode_level, COUNT(*) FROM read_parquet('{result_file}') GROUP BY ALL
+    """).fetchall())
+
+def build_geocoding(departements=None):
+    """Geocode les etablissements SIRENE a l'adresse, avec repli voie puis code postal.
+
+    Retourne les compteurs du run (lignes, niveaux de precision, debit), ou
+    None en cas d'erreur.
+    """
+    print("Geocodage BAN a l'adresse...")
+    start_time = time.time()
+
+    sirene_silver = os.path.join(PARQUET_SILVER_DIR, "sirene", "sirene_silver.parquet").replace('\\', '/')
+    ban_silver = os.path.join(PARQUET_SILVER_DIR, "ban", "ban_silver.parquet").replace('\\', '/')
+
+    if departements is None and os.path.exists(GEOCODE_PARTS_DIR):
+        shutil.rmtree(GEOCODE_PARTS_DIR)
+    os.makedirs(GEOCODE_PARTS_DIR, exist_ok=True)
+    os.makedirs(GEOCODE_SPILL_DIR, exist_ok=True)
+    for departement in departements or []:
+        if os.path.exists(geocode_part_path(departement)):
+            os.remove(geocode_part_path(departement))
+
+    spill_dir = GEOCODE_SPILL_DIR.replace('\\', '/')
+    # Part du budget du pipeline, ou GEOCODE_MEMORY_LIMIT en execution isolee
+    conn = budget.connect(memory_limit=GEOCODE_MEMORY_LIMIT)
+    conn.execute(f"SET temp_directory = '{spill_dir}'")
+    conn.execute("SET preserve_insertion_order = false")
+    try:
+        to_geocode = prepare_partitions(conn, sirene_silver, ban_silver, departements)
+        prepared_time = time.time()
+
+        levels = {}
+        for departement in to_geocode:
+            for level, count in geocode_departement(conn, departement).items():
+                levels[level] = levels.get(level, 0) + count
+
+        tmp_dir = GEOCODE_TMP_DIR.replace('\\', '/')
+        sirene_rows = conn.execute(f"SELECT COUNT(*) FROM read_parquet('{tmp_dir}/sirene/*/*.parquet')").fetchone()[0] if to_geocode else 0
+        ban_rows = conn.execute(f"SELECT COUNT(*) FROM read_parquet('{tmp_dir}/ban/*/*.parquet')").fetchone()[0] if os.path.exists(os.path.join(GEOCODE_TMP_DIR, "ban")) else 0
+    except Exception as e:
+        print(f"Erreur geocodage : {e}")
+        return None
+    finally:
+        conn.close()
+        if os.path.exists(GEOCODE_TMP_DIR):
+            shutil.rmtree(GEOCODE_TMP_DIR)
+
+    elapsed = time.time() - start_time
+    stats = {
+        "departements": len(to_geocode),
+        "sirene_rows": sirene_rows,
+        "ban_rows": ban_rows,
+        "levels": levels,
+        "prepare_seconds": round(prepared_time - start_time, 3),
+        "join_seconds": round(elapsed - (prepared_time - start_time), 3),
+        "rows_per_second": round(sirene_rows / elapsed) if elapsed else 0,
+    }
+    located = sum(levels.values())
+    print(f"> {sirene_rows} etablissements / {ban_rows} adresses BAN sur {len(to_geocode)} departement(s)")
+    for level in (LEVEL_ADDRESS, LEVEL_STREET, LEVEL_POSTAL_CODE):
+        share = levels.get(level, 0) / sirene_rows * 100 if sirene_rows else 0
+        print(f"> Precision {level:<12}: {levels.get(level, 0):>10} ({share:5.1f} %)")
+    print(f"> Non geocodes : {sirene_rows - located}")
+    print(f"Succes du geocodage en {elapsed:.2f} secondes ({stats['rows_per_second']} etablissements/s).")
+    return stats
@@ -1,7 +1,12 @@
-import duckdb
+import hashlib
+import json
 import os
 import time
 import glob
+from concurrent.futures import ThreadPoolExecutor
+
+import budget
+from manifest import editing_manifest, file_fingerprint, load_manifest, previous_state, same_content
 
 # Configuration des chemins
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -17,71 +22,233 @@ def ensure_dir(path):
     if not os.path.exists(path):
         os.makedirs(path)
 
-def convert_csv_to_parquet(source_pattern, target_file, table_name):
-    """Utilise DuckDB pour lire un ou plusieurs CSV et l'écrire en Parquet."""
+def csv_header(source_file):
+    """Separateur et colonnes de l'entete (le RNA officiel est en ';', les extraits parfois en ',')."""
+    with open(source_file, encoding="utf-8-sig", newline="") as f:
+        header = f.readline().rstrip("\r\n")
+    delimiter = ";" if header.count(";") >= header.count(",") else ","
+    return delimiter, [name.strip().strip('"') for name in header.split(delimiter)]
+
+def read_csv_sql(source_file, schema):
+    """read_csv sans detection : types declares pour les colonnes gardees, VARCHAR pour les autres.
+
+    Seules les colonnes du schema sont selectionnees ; DuckDB ne materialise
+    pas les autres (projection a la lecture).
+    """
+    delimiter, header = csv_header(source_file)
+    missing = [name for name in schema if name not in header]
+    if missing:
+        raise ValueError(f"Colonnes absentes de {os.path.basename(source_file)} : {', '.join(missing)}")
+    types = {name: schema.get(name, "VARCHAR").replace("'", "''") for name in header}
+    columns = ", ".join(f"'{name}': '{types[name]}'" for name in header)
+    projection = ", ".join(f'"{name}"' for name in schema)
+    path = source_file.replace('\\', '/')
+    return f"""
+        SELECT {projection}
+        FROM read_csv('{path}', header=true, delim='{delimiter}', quote='"', escape='"',
+                      columns={{{columns}}}, auto_detect=false)
+    """
+
+def convert_csv_to_parquet(source_file, target_file, table_name, schema):
+    """Utilise DuckDB pour lire un CSV type et l'écrire en Parquet.
+
+    Retourne la duree de conversion en secondes, None en cas d'erreur.
+    """
     print(f"Conversion en cours : {table_name} (Test Mode: {TEST_MODE})")
     
     # Remplacement des antislashs pour éviter les bugs DuckDB sous Windows
-    source_pattern_safe = source_pattern.replace('\\', '/')
     target_file_safe = target_file.replace('\\', '/')
     
     start_time = time.time()
     
-    # DuckDB lit les jokers (*) nativement pour concaténer les fichiers
-    query = f"""
-        COPY (
-            SELECT * FROM read_csv_auto('{source_pattern_safe}', all_varchar=true, quote='"')
-            {LIMIT_CLAUSE}
-        ) TO '{target_file_safe}' (FORMAT PARQUET, COMPRESSION 'ZSTD');
-    """
-    
     try:
-        duckdb.sql(query)
+        query = f"""
+            COPY (
+                {read_csv_sql(source_file, schema)}
+                {LIMIT_CLAUSE}
+            ) TO '{target_file_safe}' (FORMAT PARQUET, COMPRESSION 'ZSTD');
+        """
+        with budget.connect() as conn:
+            conn.execute(query)
         elapsed = time.time() - start_time
         print(f"Succès pour {table_name} en {elapsed:.2f} secondes.\n")
+        return elapsed
     except Exception as e:
         print(f"Erreur lors de la conversion de {table_name} : {e}\n")
+        return None
 
-def run_ingestion():
-    """Orchestre la conversion des trois sources obligatoires."""
-    ensure_dir(os.path.join(PARQUET_BRONZE_DIR, "ban"))
-    ensure_dir(os.path.join(PARQUET_BRONZE_DIR, "rna"))
-    ensure_dir(os.path.join(PARQUET_BRONZE_DIR, "sirene"))
-
-    # Définition des sources avec les bons noms de fichiers
-    sources = [
-        {
-            "src": os.path.join(RAW_DIR, "ban", "adresses-france.csv"),
-            "dest": os.path.join(PARQUET_BRONZE_DIR, "ban", "ban_bronze.parquet"),
-            "name": "BAN"
+def bronze_target(source_file, dest_dir):
+    """Un Parquet Bronze par fichier source (ex. rna_waldec_20240101.csv -> rna_waldec_20240101.parquet)."""
+    stem = os.path.splitext(os.path.basename(source_file))[0]
+    return os.path.join(dest_dir, f"{stem}.parquet")
+
+# Définition des sources avec les bons noms de fichiers.
+# "schema" : colonnes gardees en Bronze et leur type DuckDB (les autres colonnes
+# du CSV sont ignorees a la lecture). Codes (siret, code postal, numero de voie
+# SIRENE/RNA) en VARCHAR : zeros de tete et valeurs non numeriques possibles.
+SOURCES = {
+    "ban": {
+        "src": os.path.join(RAW_DIR, "ban", "adresses-france.csv"),
+        "dest": os.path.join(PARQUET_BRONZE_DIR, "ban"),
+        "name": "BAN",
+        "schema": {
+            "numero": "INTEGER",
+            "nom_voie": "VARCHAR",
+            "code_postal": "VARCHAR",
+            "nom_commune": "VARCHAR",
+            "lon": "DOUBLE",
+            "lat": "DOUBLE",
+        },
+    },
+    "rna": {
+        # L'utilisation du joker * permet de cibler les ~100 fichiers
+        "src": os.path.join(RAW_DIR, "rna", "rna_waldec_*.csv"),
+        "dest": os.path.join(PARQUET_BRONZE_DIR, "rna"),
+        "name": "RNA",
+        "schema": {
+            "id": "VARCHAR",
+            "titre": "VARCHAR",
+            "adrs_numvoie": "VARCHAR",
+            "adrs_typevoie": "VARCHAR",
+            "adrs_libvoie": "VARCHAR",
+            "adrs_codepostal": "VARCHAR",
+            "adrs_libcommune": "VARCHAR",
         },
-        {
-            # L'utilisation du joker * permet de cibler les ~100 fichiers
-            "src": os.path.join(RAW_DIR, "rna", "rna_waldec_*.csv"),
-            "dest": os.path.join(PARQUET_BRONZE_DIR, "rna", "rna_bronze.parquet"),
-            "name": "RNA"
+    },
+    "sirene": {
+        "src": os.path.join(RAW_DIR, "sirene", "StockEtablissement_utf8.csv"),
+        "dest": os.path.join(PARQUET_BRONZE_DIR, "sirene"),
+        "name": "SIRENE",
+        "schema": {
+            "siren": "VARCHAR",
+            "nic": "VARCHAR",
+            "siret": "VARCHAR",
+            # Nomenclature INSEE : A (actif) / F (ferme) ; une valeur inconnue fait echouer l'ingestion
+            "etatAdministratifEtablissement": "ENUM('A', 'F')",
+            "enseigne1Etablissement": "VARCHAR",
+            "denominationUsuelleEtablissement": "VARCHAR",
+            "numeroVoieEtablissement": "VARCHAR",
+            "typeVoieEtablissement": "VARCHAR",
+            "libelleVoieEtablissement": "VARCHAR",
+            "codePostalEtablissement": "VARCHAR",
+            "libelleCommuneEtablissement": "VARCHAR",
         },
-        {
-            "src": os.path.join(RAW_DIR, "sirene", "StockEtablissement_utf8.csv"),
-            "dest": os.path.join(PARQUET_BRONZE_DIR, "sirene", "sirene_bronze.parquet"),
-            "name": "SIRENE"
-        }
-    ]
-
-    for source in sources:
-        # On vérifie la présence des fichiers. Si c'est un motif avec *, on utilise glob.
-        if '*' in source["src"]:
-            files = glob.glob(source["src"])
-            if files:
-                print(f"{len(files)} fichiers trouvés pour {source['name']}.")
-                convert_csv_to_parquet(source["src"], source["dest"], source["name"])
-            else:
-                print(f"Aucun fichier trouvé pour le motif : {source['src']}")
-        else:
-            if os.path.exists(source["src"]):
-                convert_csv_to_parquet(source["src"], source["dest"], source["name"])
-            else:
-                print(f"Fichier introuvable : {source['src']}")
+    },
+}
+
+# Fichiers convertis en parallele par source (les ~100 fichiers RNA)
+INGEST_WORKERS = int(os.environ.get("INGEST_WORKERS", os.cpu_count() or 1))
+
+def source_files(source_key):
+    # On vérifie la présence des fichiers. Si c'est un motif avec *, on utilise glob.
+    return sorted(glob.glob(SOURCES[source_key]["src"]))
+
+def bronze_targets(source_key):
+    return [bronze_target(f, SOURCES[source_key]["dest"]) for f in source_files(source_key)]
+
+def schema_signature(source_key):
+    """Empreinte du schema Bronze : un changement de schema force la reconversion."""
+    schema = json.dumps(SOURCES[source_key]["schema"], sort_keys=True)
+    return hashlib.sha256(schema.encode()).hexdigest()[:16]
+
+def convert_files(source_key, pending):
+    """Convertit les fichiers (source, cible) en parallele, chacun avec sa part du budget DuckDB.
+
+    Retourne le temps cumule de conversion ; leve une exception au premier echec.
+    """
+    source = SOURCES[source_key]
+    workers = max(1, min(len(pending), budget.threads() or INGEST_WORKERS))
+    file_share = budget.split(workers)
+
+    def convert(source_file, target):
+        with budget.share(*file_share):
+            elapsed = convert_csv_to_parquet(source_file, target, f"{source['name']} ({os.path.basename(source_file)})", source["schema"])
+        if elapsed is None:
+            raise RuntimeError(f"Conversion impossible : {source_file}")
+        return elapsed
+
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix=f"ingest-{source_key}") as executor:
+        futures = [executor.submit(convert, source_file, target) for source_file, target in pending]
+        try:
+            return sum(future.result() for future in futures)
+        except Exception:
+            for future in futures:
+                future.cancel()
+            raise
+
+def ingest_source(source_key):
+    """Convertit les fichiers d'une source dont l'empreinte (taille/mtime/sha256) ou le schema a change.
+
+    Leve une exception si un fichier ne peut pas etre converti.
+    """
+    source = SOURCES[source_key]
+    ensure_dir(source["dest"])
+    previous_raw = previous_state(load_manifest(), "raw")
+    current_raw = {}
+    schema = schema_signature(source_key)
+
+    files = source_files(source_key)
+    if not files:
+        print(f"Aucun fichier trouvé pour : {source['src']}")
+        return
+    print(f"{len(files)} fichier(s) trouvé(s) pour {source['name']}.")
+
+    start_time = time.time()
+    expected_targets = set()
+    pending = []
+    for source_file in files:
+        key = os.path.relpath(source_file, RAW_DIR).replace('\\', '/')
+        target = bronze_target(source_file, source["dest"])
+        expected_targets.add(os.path.abspath(target))
+
+        previous = previous_raw.get(key)
+        fingerprint = file_fingerprint(source_file, previous)
+        fingerprint["schema"] = schema
+        current_raw[key] = fingerprint
+        if same_content(fingerprint, previous) and previous.get("schema") == schema and os.path.exists(target):
+            continue
+        pending.append((source_file, target))
+
+    skipped = len(files) - len(pending)
+    if skipped:
+        print(f"{skipped} fichier(s) {source['name']} inchangé(s), conversion ignorée.")
+    if pending:
+        cpu_seconds = convert_files(source_key, pending)
+        raw_size = sum(os.path.getsize(f) for f, _ in pending)
+        bronze_size = sum(os.path.getsize(t) for _, t in pending)
+        print(
+            f"{source['name']} : {len(pending)} fichier(s), {raw_size / 1e6:.1f} Mo CSV -> {bronze_size / 1e6:.1f} Mo Parquet "
+            f"en {time.time() - start_time:.2f} s ({cpu_seconds:.2f} s cumulees)."
+        )
+
+    # Suppression des Bronze orphelins (source retirée ou ancien Parquet concaténé)
+    for bronze_file in glob.glob(os.path.join(source["dest"], "*.parquet")):
+        if os.path.abspath(bronze_file) not in expected_targets:
+            print(f"Suppression du Bronze obsolète : {bronze_file}")
+            os.remove(bronze_file)
+
+    # Seules les entrees de cette source sont remplacees (les autres sources tournent en parallele)
+    prefix = os.path.relpath(os.path.dirname(source["src"]), RAW_DIR).replace('\\', '/') + "/"
+    with editing_manifest() as manifest:
+        raw = {k: v for k, v in manifest.get("raw", {}).items() if not k.startswith(prefix)}
+        raw.update(current_raw)
+        manifest["raw"] = raw
+
+def run_ingestion():
+    """Orchestre la conversion des trois sources obligatoires, en parallele.
+
+    Chaque fichier source est converti separement, et uniquement si son
+    empreinte (taille/mtime/sha256) ou son schema a change depuis le dernier run.
+    """
+    source_share = budget.split(len(SOURCES))
+
+    def ingest(source_key):
+        with budget.share(*source_share):
+            ingest_source(source_key)
+
+    with ThreadPoolExecutor(max_workers=len(SOURCES), thread_name_prefix="ingest") as executor:
+        for future in [executor.submit(ingest, source_key) for source_key in SOURCES]:
+            future.result()
 
 if __name__ == "__main__":
-    run_ingestion()
\ No newline at end of file
+    run_ingestion()
@@ -0,0 +1,128 @@
+import os
+import shutil
+
+from manifest import DEPARTEMENT_SQL
+
+# Disposition des tables Silver et Gold :
+#   "single"      -> un fichier Parquet par table (comportement historique)
+#   "partitioned" -> un dossier par table, partitionne departement=XX/ (hive)
+PARQUET_LAYOUT = os.environ.get("PARQUET_LAYOUT", "single")
+PARTITIONED = PARQUET_LAYOUT == "partitioned"
+
+# Taille des row groups et ordre de tri a l'interieur de chaque fichier
+PARQUET_ROW_GROUP_SIZE = int(os.environ.get("PARQUET_ROW_GROUP_SIZE", "122880"))
+PARQUET_SORT_ORDER = os.environ.get("PARQUET_SORT_ORDER", "code_postal, siret")
+
+def partition_dir(parquet_file):
+    """golden_record.parquet -> golden_record/ (dossier de la version partitionnee)."""
+    return os.path.splitext(parquet_file)[0]
+
+def is_partitioned(parquet_file):
+    return os.path.isdir(partition_dir(parquet_file))
+
+def exists(parquet_file):
+    """Vrai si la table existe dans la disposition courante (PARQUET_LAYOUT)."""
+    return is_partitioned(parquet_file) if PARTITIONED else os.path.exists(parquet_file)
+
+def data_files(parquet_file):
+    """Fichiers Parquet effectivement presents pour une table (un seul ou un par partition)."""
+    if is_partitioned(parquet_file):
+        return sorted(
+            os.path.join(root, name)
+            for root, _, names in os.walk(partition_dir(parquet_file))
+            for name in names if name.endswith(".parquet")
+        )
+    return [parquet_file] if os.path.exists(parquet_file) else []
+
+def read_sql(parquet_file):
+    """Source DuckDB d'une table, quelle que soit sa disposition sur disque."""
+    if is_partitioned(parquet_file):
+        dataset_glob = (partition_dir(parquet_file) + "/**/*.parquet").replace('\\', '/')
+        # Le type est force : '01', '2A' ou '' ne doivent pas etre convertis en entier
+        return f"read_parquet('{dataset_glob}', hive_partitioning=true, hive_types={{'departement': VARCHAR}})"
+    return f"read_parquet('{parquet_file}')"
+
+def table_sql(parquet_file):
+    """Comme read_sql(), sans la colonne de partition : colonnes identiques dans les deux dispositions."""
+    if is_partitioned(parquet_file):
+        return f"(SELECT * EXCLUDE (departement) FROM {read_sql(parquet_file)})"
+    return read_sql(parquet_file)
+
+def departement_sql(parquet_file):
+    """Colonne departement : cle de partition (elagage des dossiers) ou derivee du code postal."""
+    return "departement" if is_partitioned(parquet_file) else DEPARTEMENT_SQL
+
+def sort_columns(columns):
+    """Colonnes de PARQUET_SORT_ORDER presentes dans la table."""
+    return [c.strip() for c in PARQUET_SORT_ORDER.split(",") if c.strip() in columns]
+
+def copy_sql(select_sql, target, columns, sort_order=None, row_group_size=None):
+    """Instruction COPY vers `target` (fichier ou dossier) selon la disposition choisie."""
+    order = sort_order or ", ".join(sort_columns(columns))
+    row_group_size = row_group_size or PARQUET_ROW_GROUP_SIZE
+    if PARTITIONED:
+        return f"""
+            COPY (
+                SELECT *, {DEPARTEMENT_SQL} AS departement FROM ({select_sql})
+                ORDER BY departement{', ' + order if order else ''}
+            ) TO '{target}' (FORMAT PARQUET, COMPRESSION 'ZSTD', PARTITION_BY (departement),
+                             ROW_GROUP_SIZE {row_group_size}, OVERWRITE_OR_IGNORE);
+        """
+    return f"""
+        COPY (
+            {select_sql}
+            {'ORDER BY ' + order if order else ''}
+        ) TO '{target}' (FORMAT PARQUET, COMPRESSION 'ZSTD', ROW_GROUP_SIZE {row_group_size});
+    """
+
+def staging_path(parquet_file):
+    """Cible temporaire de l'ecriture, publiee ensuite par publish()."""
+    target = partition_dir(parquet_file) if PARTITIONED else parquet_file
+    return (target + ".tmp").replace('\\', '/')
+
+def publish(parquet_file, departements=None):
+    """Remplace la table par sa version temporaire.
+
+    En disposition partitionnee avec une liste de departements, seuls les
+    dossiers departement=XX concernes sont remplaces ; les autres sont conserves.
+    """
+    staged = staging_path(parquet_file)
+    if not PARTITIONED:
+        os.replace(staged, parquet_file)
+        if os.path.isdir(partition_dir(parquet_file)):
+            shutil.rmtree(partition_dir(parquet_file))
+        return
+
+    target_dir = partition_dir(parquet_file)
+    if departements is None or not os.path.isdir(target_dir):
+        old_dir = target_dir + ".old"
+        if os.path.isdir(old_dir):
+            shutil.rmtree(old_dir)
+        if os.path.isdir(target_dir):
+            os.rename(target_dir, old_dir)
+        if os.path.isdir(staged):
+            os.rename(staged, target_dir)
+        else:
+            os.makedirs(target_dir)
+        if os.path.isdir(old_dir):
+            shutil.rmtree(old_dir)
+    else:
+        for departement in departements:
+            partition = os.path.join(target_dir, f"departement={departement}")
+            if os.path.isdir(partition):
+                shutil.rmtree(partition)
+            new_partition = os.path.join(staged, f"departement={departement}")
+            if os.path.isdir(new_partition):
+                os.rename(new_partition, partition)
+        shutil.rmtree(staged, ignore_errors=True)
+
+    # Une seule disposition sur disque : l'ancien fichier unique est retire
+    if os.path.exists(parquet_file):
+        os.remove(parquet_file)
+
+def clear_staging(parquet_file):
+    staged = staging_path(parquet_file)
+    if os.path.isdir(staged):
+        shutil.rmtree(staged)
+    elif os.path.exists(staged):
+        os.remove(staged)
@@ -0,0 +1,94 @@
+import hashlib
+import json
+import os
+import threading
+from contextlib import contextmanager
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MANIFEST_PATH = os.path.join(BASE_DIR, "data", "parquet", "manifest.json")
+
+# ETL_FULL_REBUILD=1 ignore le manifeste et reconstruit toutes les couches
+FULL_REBUILD = os.environ.get("ETL_FULL_REBUILD", "0") == "1"
+
+# Departement d'une ligne (meme regle que match.py), '' si le code postal est absent
+DEPARTEMENT_SQL = "COALESCE(SUBSTRING(code_postal, 1, 2), '')"
+
+def load_manifest():
+    if not os.path.exists(MANIFEST_PATH):
+        return {}
+    try:
+        with open(MANIFEST_PATH, encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def previous_state(manifest, stage):
+    """Etat memorise par une etape lors du dernier run (vide en reconstruction complete)."""
+    if FULL_REBUILD:
+        return {}
+    return manifest.get(stage, {})
+
+def save_manifest(manifest):
+    """Ecriture atomique : un run interrompu laisse l'ancien manifeste intact."""
+    os.makedirs(os.path.dirname(MANIFEST_PATH), exist_ok=True)
+    tmp_path = MANIFEST_PATH + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, MANIFEST_PATH)
+
+# Les etapes du pipeline (etl/pipeline.py) tournent dans des threads concurrents
+_manifest_lock = threading.Lock()
+
+@contextmanager
+def editing_manifest():
+    """Lecture-modification-ecriture du manifeste sans ecraser les mises a jour d'une autre etape."""
+    with _manifest_lock:
+        manifest = load_manifest()
+        yield manifest
+        save_manifest(manifest)
+
+def file_fingerprint(path, previous=None):
+    """Empreinte taille/mtime/sha256. Le hash n'est recalcule que si taille ou mtime ont bouge."""
+    stat = os.stat(path)
+    fingerprint = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+    if previous and previous.get("size") == stat.st_size and previous.get("mtime_ns") == stat.st_mtime_ns:
+        fingerprint["sha256"] = previous.get("sha256")
+        return fingerprint
+
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(8 * 1024 * 1024), b""):
+            digest.update(chunk)
+    fingerprint["sha256"] = digest.hexdigest()
+    return fingerprint
+
+def same_content(fingerprint, previous):
+    return bool(previous) and fingerprint.get("sha256") == previous.get("sha256")
+
+def files_signature(paths):
+    """Signature taille/mtime d'un ensemble de fichiers (sorties d'une etape amont)."""
+    return {os.path.basename(p): [os.path.getsize(p), os.stat(p).st_mtime_ns] for p in sorted(paths)}
+
+def departement_digests(conn, relation):
+    """Empreinte par departement du contenu d'une relation (independante de l'ordre des lignes)."""
+    rows = conn.execute(f"""
+        SELECT
+            {DEPARTEMENT_SQL} AS departement,
+            COUNT(*) AS n,
+            SUM(HASH(t)::HUGEINT) AS h
+        FROM {relation} t
+        GROUP BY 1
+    """).fetchall()
+    return {departement: f"{n}:{h}" for departement, n, h in rows}
+
+def relation_digest(conn, relation):
+    n, h = conn.execute(f"SELECT COUNT(*), SUM(HASH(t)::HUGEINT) FROM {relation} t").fetchone()
+    return f"{n}:{h}"
+
+def departement_list_sql(departements):
+    """Liste SQL litterale pour un filtre IN (...) sur les departements."""
+    return ", ".join("'" + d.replace("'", "''") + "'" for d in departements) or "NULL"
+
+def changed_departements(current, previous):
+    """Departements ajoutes, supprimes ou dont l'empreinte a change."""
+    return sorted(d for d in set(current) | set(previous) if current.get(d) != previous.get(d))
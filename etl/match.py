@@ -1,87 +1,360 @@
 import duckdb
+import multiprocessing
 import os
+import shutil
 import time
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+
+import budget
+import layout
+from manifest import (
+    changed_departements, departement_digests, departement_list_sql,
+    editing_manifest, load_manifest, previous_state, relation_digest,
+)
 
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 PARQUET_SILVER_DIR = os.path.join(BASE_DIR, "data", "parquet", "silver")
 DB_DIR = os.path.join(BASE_DIR, "duckdb")
 
+# Table de liens lue par etl/views.py
+MAPPING_PATH = os.path.join(PARQUET_SILVER_DIR, "mapping_sirene_rna.parquet")
+MATCHING_DB_PATH = os.path.join(DB_DIR, "matching.duckdb")
+MATCH_TMP_DIR = os.path.join(PARQUET_SILVER_DIR, "_match_tmp")
+# Liens par departement, conserves entre deux runs pour le recalcul incremental
+MAPPING_PARTS_DIR = os.path.join(PARQUET_SILVER_DIR, "mapping_parts")
+
+# Seuil Jaro-Winkler assoupli a 0.85
+JW_THRESHOLD = 0.85
+# Nombre de processus pour le matching par departement
+MATCH_WORKERS = int(os.environ.get("MATCH_WORKERS", os.cpu_count() or 1))
+
+# Caracteres suivis dans le masque de presence (1 bit chacun, les autres ne sont pas filtres)
+MASK_ALPHABET = "ABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789 -"
+
+def name_clean_sql(column):
+    """Nettoyage Regex du nom (mots vides et formes juridiques retires)."""
+    return f"TRIM(REGEXP_REPLACE(UPPER(COALESCE({column}, '')), '\\b(ASSOCIATION|AMICALE|CLUB|SYNDICAT|FEDERATION|DE|DU|DES|LA|LE|LES|ET|POUR|EN)\\b', '', 'g'))"
+
+def char_mask_sql(column):
+    """Masque de presence des caracteres du nom, sur un entier 64 bits."""
+    bits = [f"(CASE WHEN CONTAINS({column}, '{char}') THEN {1 << i} ELSE 0 END)" for i, char in enumerate(MASK_ALPHABET)]
+    return f"({' + '.join(bits)})::UBIGINT"
+
+def prefix_hashes_sql(column):
+    """Empreintes des prefixes de 1 a 4 caracteres (0 si la tete du nom n'est pas ASCII)."""
+    # Tete ASCII <=> autant d'octets que de caracteres sur les 4 premiers
+    ascii_head = f"STRLEN(LEFT({column}, 4)) = LENGTH(LEFT({column}, 4))"
+    return ",\n                    ".join(
+        f"CASE WHEN {ascii_head} THEN HASH(LEFT({column}, {k})) ELSE 0 END AS prefix{k}"
+        for k in range(1, 5)
+    )
+
+def jaro_winkler_upper_bound_sql(common, len_a, len_b, prefix):
+    """Borne superieure de jaro_winkler_similarity (calculee par DuckDB sur les octets).
+
+    Jaro <= (c/la + c/lb + 1) / 3 avec c le nombre maximal de caracteres
+    appariables, puis bonus de Winkler d'au plus 0.1 par octet de prefixe commun.
+    """
+    jaro = f"(({common})::DOUBLE / {len_a} + ({common})::DOUBLE / {len_b} + 1.0) / 3.0"
+    return f"({jaro} + 0.1 * {prefix} * (1.0 - {jaro}))"
+
+def mapping_part_path(departement, parts_dir=None):
+    return os.path.join(parts_dir or MAPPING_PARTS_DIR, f"departement={departement}.parquet")
+
+def prepare_partitions(conn, sirene_silver, rna_silver, departements):
+    """Nettoie les noms une seule fois et ecrit les deux sources partitionnees par departement."""
+    if os.path.exists(MATCH_TMP_DIR):
+        shutil.rmtree(MATCH_TMP_DIR)
+    os.makedirs(MATCH_TMP_DIR)
+    tmp_dir = MATCH_TMP_DIR.replace('\\', '/')
+    # Seuls les departements a recalculer sont extraits
+    departement_filter = departement_list_sql(departements)
+
+    conn.execute(f"""
+        COPY (
+            SELECT
+                siret,
+                code_postal,
+                SUBSTRING(code_postal, 1, 2) AS departement,
+                {name_clean_sql('enseigne')} AS name_clean
+            FROM {layout.read_sql(sirene_silver)}
+            WHERE enseigne IS NOT NULL AND code_postal IS NOT NULL
+              AND {layout.departement_sql(sirene_silver)} IN ({departement_filter})
+        ) TO '{tmp_dir}/sirene' (FORMAT PARQUET, PARTITION_BY (departement));
+    """)
+    conn.execute(f"""
+        COPY (
+            SELECT
+                id_rna,
+                code_postal,
+                SUBSTRING(code_postal, 1, 2) AS departement,
+                {name_clean_sql('nom_association')} AS name_clean
+            FROM {layout.read_sql(rna_silver)}
+            WHERE nom_association IS NOT NULL AND code_postal IS NOT NULL
+              AND {layout.departement_sql(rna_silver)} IN ({departement_filter})
+        ) TO '{tmp_dir}/rna' (FORMAT PARQUET, PARTITION_BY (departement));
+    """)
+
+    # Seuls les departements presents des deux cotes peuvent produire des liens
+    def departements(source):
+        root = os.path.join(MATCH_TMP_DIR, source)
+        if not os.path.exists(root):
+            return set()
+        return {d.split("=", 1)[1] for d in os.listdir(root) if d.startswith("departement=")}
+    return sorted(departements("sirene") & departements("rna"))
+
+# Connexion DuckDB d'un processus du pool, ouverte une fois par _init_worker
+_worker_conn = None
+
+def _init_worker(share):
+    """Ouvre la connexion du processus avec sa part de budget (threads, memoire en Mo).
+
+    Un processus lance en spawn ne voit pas la part de budget du thread qui
+    a cree le pool : elle est passee explicitement.
+    """
+    global _worker_conn
+    with budget.share(*share):
+        _worker_conn = budget.connect()
+
+def _match_in_worker(departement, tmp_dir, parts_dir):
+    return match_departement(_worker_conn, departement, tmp_dir, parts_dir)
+
+def match_departement(conn, departement, tmp_dir, parts_dir):
+    """Matching d'un departement sur une connexion reutilisee d'un departement a l'autre.
+
+    Les dossiers sont passes explicitement (un processus du pool ne voit pas
+    les chemins modifies par l'appelant). Retourne les compteurs du blocking.
+    """
+    start_time = time.time()
+    tmp_dir = tmp_dir.replace('\\', '/')
+    result_file = mapping_part_path(departement, parts_dir).replace('\\', '/')
+
+    try:
+        conn.execute(f"""
+            CREATE OR REPLACE TABLE s AS
+            SELECT siret, code_postal, name_clean
+            FROM read_parquet('{tmp_dir}/sirene/departement={departement}/*.parquet')
+        """)
+        conn.execute(f"""
+            CREATE OR REPLACE TABLE r AS
+            SELECT id_rna, code_postal, name_clean
+            FROM read_parquet('{tmp_dir}/rna/departement={departement}/*.parquet')
+        """)
+
+        # Noms distincts par code postal : la similarite ne depend que du couple de noms.
+        # On exige un minimum de 4 caracteres pour eviter que de simples sigles matchent par erreur
+        for table, alias in (("s", "sn"), ("r", "rn")):
+            conn.execute(f"""
+                CREATE OR REPLACE TABLE {alias} AS
+                SELECT
+                    code_postal,
+                    name_clean,
+                    COUNT(*) AS n_rows,
+                    STRLEN(name_clean) AS n_bytes,
+                    {char_mask_sql('name_clean')} AS char_mask,
+                    {prefix_hashes_sql('name_clean')}
+                FROM {table}
+                WHERE LENGTH(name_clean) > 4
+                GROUP BY code_postal, name_clean
+            """)
+
+        pairs_rows, pairs_names = conn.execute("""
+            SELECT COALESCE(SUM(a.rows * b.rows), 0), COALESCE(SUM(a.names * b.names), 0)
+            FROM (SELECT code_postal, SUM(n_rows) AS rows, COUNT(*) AS names FROM sn GROUP BY code_postal) a
+            JOIN (SELECT code_postal, SUM(n_rows) AS rows, COUNT(*) AS names FROM rn GROUP BY code_postal) b
+              ON a.code_postal = b.code_postal
+        """).fetchone()
+
+        # Etape 1 : bande de longueur (c <= plus petite longueur, prefixe maximal de 4)
+        length_bound = jaro_winkler_upper_bound_sql("LEAST(a.n_bytes, b.n_bytes)", "a.n_bytes", "b.n_bytes", "4")
+        pairs_length = conn.execute(f"""
+            SELECT COALESCE(SUM(a.names * b.names), 0)
+            FROM (SELECT code_postal, n_bytes, COUNT(*) AS names FROM sn GROUP BY ALL) a
+            JOIN (SELECT code_postal, n_bytes, COUNT(*) AS names FROM rn GROUP BY ALL) b
+              ON a.code_postal = b.code_postal
+            WHERE {length_bound} >= {JW_THRESHOLD} - 1e-9
+        """).fetchone()[0]
+
+        # Etape 2 : chaque caractere absent de l'autre nom retire au moins un appariement
+        # possible, et le bonus de Winkler est borne par le prefixe commun reel
+        conn.execute(f"""
+            CREATE OR REPLACE TABLE candidates AS
+            SELECT code_postal, s_name, r_name
+            FROM (
+                SELECT
+                    a.code_postal,
+                    a.name_clean AS s_name,
+                    b.name_clean AS r_name,
+                    a.n_bytes AS len_a,
+                    b.n_bytes AS len_b,
+                    LEAST(
+                        a.n_bytes - BIT_COUNT(a.char_mask & ~b.char_mask),
+                        b.n_bytes - BIT_COUNT(b.char_mask & ~a.char_mask)
+                    ) AS common,
+                    CASE
+                        WHEN a.prefix4 = 0 OR b.prefix4 = 0 THEN 4
+                        ELSE (a.prefix1 = b.prefix1)::INTEGER + (a.prefix2 = b.prefix2)::INTEGER
+                           + (a.prefix3 = b.prefix3)::INTEGER + (a.prefix4 = b.prefix4)::INTEGER
+                    END AS prefix
+                FROM sn a
+                INNER JOIN rn b
+                    ON a.code_postal = b.code_postal
+                WHERE a.name_clean != b.name_clean
+            )
+            WHERE {jaro_winkler_upper_bound_sql("common", "len_a", "len_b", "prefix")} >= {JW_THRESHOLD} - 1e-9
+        """)
+        pairs_compared = conn.execute("SELECT COUNT(*) FROM candidates").fetchone()[0]
+
+        conn.execute(f"""
+            COPY (
+                -- STRATEGIE 1 : Correspondance exacte sur le nom nettoye (tolere les CEDEX et variations locales)
+                SELECT DISTINCT s.siret, r.id_rna
+                FROM s
+                INNER JOIN r ON s.name_clean = r.name_clean
+                WHERE LENGTH(s.name_clean) > 3
+
+                UNION
+
+                -- STRATEGIE 2 : Correspondance floue (0.85) sur le meme code postal, candidats elagues
+                SELECT DISTINCT s.siret, r.id_rna
+                FROM (
+                    SELECT code_postal, s_name, r_name
+                    FROM candidates
+                    WHERE jaro_winkler_similarity(s_name, r_name) >= {JW_THRESHOLD}
+                ) c
+                INNER JOIN s ON s.code_postal = c.code_postal AND s.name_clean = c.s_name
+                INNER JOIN r ON r.code_postal = c.code_postal AND r.name_clean = c.r_name
+            ) TO '{result_file}' (FORMAT PARQUET);
+        """)
+        matches = conn.execute(f"SELECT COUNT(*) FROM read_parquet('{result_file}')").fetchone()[0]
+    finally:
+        # Tables liberees avant le departement suivant
+        for table in ("candidates", "sn", "rn", "s", "r"):
+            conn.execute(f"DROP TABLE IF EXISTS {table}")
+
+    return {
+        "departement": departement,
+        "pairs_rows": pairs_rows,
+        "pairs_names": pairs_names,
+        "pairs_after_length": pairs_length,
+        "pairs_compared": pairs_compared,
+        "pairs_pruned": pairs_names - pairs_compared,
+        "matches": matches,
+        "seconds": round(time.time() - start_time, 3),
+    }
+
+def silver_digests(conn, manifest, source, silver_path):
+    """Empreintes par departement ecrites par normalize.py (recalculees si absentes)."""
+    digests = manifest.get("silver", {}).get(source)
+    if digests is None:
+        digests = departement_digests(conn, layout.read_sql(silver_path))
+    return digests
+
 def run_matching():
     print("--- DEMARRAGE DU MATCHING EQUILIBRE ---")
     start_time = time.time()
-    
+
     sirene_silver = os.path.join(PARQUET_SILVER_DIR, "sirene", "sirene_silver.parquet").replace('\\', '/')
     rna_silver = os.path.join(PARQUET_SILVER_DIR, "rna", "rna_silver.parquet").replace('\\', '/')
-    
+
     if not os.path.exists(DB_DIR):
         os.makedirs(DB_DIR)
-        
-    db_path = os.path.join(DB_DIR, "catalog.db").replace('\\', '/')
-    conn = duckdb.connect(db_path)
-    
-    # Requete SQL avec seuil Jaro-Winkler assoupli a 0.85 mais avec nettoyage Regex maintenu
-    query = f"""
-    CREATE OR REPLACE TABLE rna_sirene_mapping AS
-    
-    WITH sirene_clean AS (
-        SELECT 
-            siret, 
-            code_postal,
-            SUBSTRING(code_postal, 1, 2) AS departement,
-            enseigne,
-            TRIM(REGEXP_REPLACE(UPPER(COALESCE(enseigne, '')), '\\b(ASSOCIATION|AMICALE|CLUB|SYNDICAT|FEDERATION|DE|DU|DES|LA|LE|LES|ET|POUR|EN)\\b', '', 'g')) as name_clean
-        FROM read_parquet('{sirene_silver}')
-        WHERE enseigne IS NOT NULL AND code_postal IS NOT NULL
-    ),
-
-    rna_clean AS (
-        SELECT 
-            id_rna, 
-            code_postal,
-            SUBSTRING(code_postal, 1, 2) AS departement,
-            nom_association,
-            TRIM(REGEXP_REPLACE(UPPER(COALESCE(nom_association, '')), '\\b(ASSOCIATION|AMICALE|CLUB|SYNDICAT|FEDERATION|DE|DU|DES|LA|LE|LES|ET|POUR|EN)\\b', '', 'g')) as name_clean
-        FROM read_parquet('{rna_silver}')
-        WHERE nom_association IS NOT NULL AND code_postal IS NOT NULL
-    )
+    if not os.path.exists(MAPPING_PARTS_DIR):
+        os.makedirs(MAPPING_PARTS_DIR)
+
+    conn = budget.connect(MATCHING_DB_PATH.replace('\\', '/'))
+    departement_stats = []
 
-    -- STRATEGIE 1 : Correspondance exacte sur le nom nettoye (tolere les CEDEX et variations locales)
-    SELECT DISTINCT
-        s.siret,
-        r.id_rna
-    FROM sirene_clean s
-    INNER JOIN rna_clean r 
-        ON s.departement = r.departement 
-        AND s.name_clean = r.name_clean
-    WHERE LENGTH(s.name_clean) > 3
-
-    UNION
-
-    -- STRATEGIE 2 : Correspondance floue assouplie (0.85) sur le meme code postal
-    SELECT DISTINCT
-        s.siret,
-        r.id_rna
-    FROM sirene_clean s
-    INNER JOIN rna_clean r 
-        ON s.code_postal = r.code_postal
-    WHERE 
-        s.name_clean != r.name_clean 
-        -- On exige un minimum de 4 caracteres pour eviter que de simples sigles matchent par erreur
-        AND LENGTH(s.name_clean) > 4 
-        AND LENGTH(r.name_clean) > 4
-        AND jaro_winkler_similarity(s.name_clean, r.name_clean) >= 0.85;
-    """
-    
-    print("> Lecture des Parquets Silver et creation du mapping...")
     try:
-        conn.execute(query)
+        manifest = load_manifest()
+        current = {
+            "sirene": silver_digests(conn, manifest, "sirene", sirene_silver),
+            "rna": silver_digests(conn, manifest, "rna", rna_silver),
+        }
+        previous = previous_state(manifest, "match")
+        mapping_digests = manifest.get("silver", {}).get("mapping", {})
+        if not previous or not os.path.exists(MAPPING_PATH):
+            # Premier run ou reconstruction complete : on repart de zero
+            previous = {}
+            mapping_digests = {}
+            shutil.rmtree(MAPPING_PARTS_DIR)
+            os.makedirs(MAPPING_PARTS_DIR)
+
+        # Un departement est recalcule si l'une des deux sources a change pour lui
+        departements = sorted(
+            set(changed_departements(current["sirene"], previous.get("sirene", {})))
+            | set(changed_departements(current["rna"], previous.get("rna", {})))
+        )
+        if not departements:
+            print("> Aucun departement modifie depuis le dernier matching, etape ignoree.")
+            return departement_stats
+
+        print(f"> Lecture des Parquets Silver et partitionnement de {len(departements)} departement(s)...")
+        for departement in departements:
+            if os.path.exists(mapping_part_path(departement)):
+                os.remove(mapping_part_path(departement))
+        matchable = prepare_partitions(conn, sirene_silver, rna_silver, departements)
+
+        # Dans le pipeline, autant de processus que de threads alloues a l'etape,
+        # chacun avec sa part de la memoire de l'etape (un thread DuckDB par processus)
+        workers = max(1, min(budget.threads() or MATCH_WORKERS, len(matchable)))
+        share = budget.split(workers)
+        args = (matchable, repeat(MATCH_TMP_DIR), repeat(MAPPING_PARTS_DIR))
+        if workers == 1:
+            # Un seul processus : pas de pool (demarrage en spawn et reimport evites)
+            print(f"> Matching de {len(matchable)} departements dans le processus courant...")
+            with budget.share(*share):
+                match_conn = budget.connect()
+            try:
+                departement_stats = list(map(match_departement, repeat(match_conn), *args))
+            finally:
+                match_conn.close()
+        else:
+            print(f"> Matching de {len(matchable)} departements sur {workers} processus...")
+            # spawn : pas de fork d'un processus dont d'autres threads executent DuckDB
+            with ProcessPoolExecutor(
+                max_workers=workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_worker,
+                initargs=(share,),
+            ) as executor:
+                departement_stats = list(executor.map(_match_in_worker, *args))
+
+        # Fusion : liens recalcules + liens conserves des departements inchanges
+        parts_glob = os.path.join(MAPPING_PARTS_DIR, "*.parquet").replace('\\', '/')
+        conn.execute("CREATE OR REPLACE TABLE rna_sirene_mapping (siret VARCHAR, id_rna VARCHAR)")
+        if any(name.endswith(".parquet") for name in os.listdir(MAPPING_PARTS_DIR)):
+            conn.execute(f"INSERT INTO rna_sirene_mapping SELECT siret, id_rna FROM read_parquet('{parts_glob}')")
+        mapping_file = MAPPING_PATH.replace('\\', '/')
+        conn.execute(f"COPY rna_sirene_mapping TO '{mapping_file}' (FORMAT PARQUET, COMPRESSION 'ZSTD')")
         count = conn.execute("SELECT COUNT(*) FROM rna_sirene_mapping").fetchone()[0]
+
+        # Empreintes des liens par departement, consommees par views.py
+        for departement in departements:
+            part = mapping_part_path(departement).replace('\\', '/')
+            if os.path.exists(part):
+                mapping_digests[departement] = relation_digest(conn, f"read_parquet('{part}')")
+            else:
+                mapping_digests.pop(departement, None)
+        with editing_manifest() as manifest:
+            manifest.setdefault("silver", {})["mapping"] = mapping_digests
+            manifest["match"] = current
+
+        compared = sum(stats["pairs_compared"] for stats in departement_stats)
+        pruned = sum(stats["pairs_pruned"] for stats in departement_stats)
+        print(f"> Paires Jaro-Winkler calculees : {compared} (elaguees : {pruned})")
         print(f"> Matchings trouves (Equilibre Parfait) : {count}")
     except Exception as e:
         print(f"Erreur lors de l'execution de la requete : {e}")
+        raise
     finally:
         print(f"Temps d'execution total : {time.time() - start_time:.2f} secondes")
         conn.close()
+        if os.path.exists(MATCH_TMP_DIR):
+            shutil.rmtree(MATCH_TMP_DIR)
+
+    return departement_stats
 
 if __name__ == "__main__":
-    run_matching()
\ No newline at end of file
+    run_matching()
@@ -1,7 +1,12 @@
-import duckdb
+import glob
 import os
 import time
 
+import address
+import budget
+import layout
+from manifest import departement_digests, editing_manifest, files_signature, load_manifest, previous_state
+
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 PARQUET_BRONZE_DIR = os.path.join(BASE_DIR, "data", "parquet", "bronze")
 PARQUET_SILVER_DIR = os.path.join(BASE_DIR, "data", "parquet", "silver")
@@ -10,96 +15,144 @@ def ensure_dir(path):
     if not os.path.exists(path):
         os.makedirs(path)
 
+def bronze_files(source):
+    return sorted(glob.glob(os.path.join(PARQUET_BRONZE_DIR, source, "*.parquet")))
+
+def bronze_glob(source):
+    return os.path.join(PARQUET_BRONZE_DIR, source, "*.parquet").replace('\\', '/')
+
+def normalize_inputs(source):
+    """Fichiers dont depend la table Silver : Bronze de la source + dictionnaire d'abreviations."""
+    return bronze_files(source) + [address.ABBREVIATIONS_PATH]
+
+def is_up_to_date(source, silver_path):
+    """Vrai si les Bronze de la source n'ont pas bouge depuis la derniere normalisation."""
+    manifest = load_manifest()
+    previous = previous_state(manifest, "normalize").get(source)
+    return layout.exists(silver_path) and previous == files_signature(normalize_inputs(source))
+
+def write_silver(query):
+    """Execute le COPY d'une table Silver avec le dictionnaire d'abreviations charge."""
+    with budget.connect() as conn:
+        address.load_abbreviations(conn)
+        conn.execute(query)
+
+def record_silver(source, silver_path):
+    """Memorise les Bronze consommes et l'empreinte par departement de la table Silver."""
+    with budget.connect() as conn:
+        digests = departement_digests(conn, layout.read_sql(silver_path))
+    with editing_manifest() as manifest:
+        manifest.setdefault("normalize", {})[source] = files_signature(normalize_inputs(source))
+        manifest.setdefault("silver", {})[source] = digests
+
 def normalize_ban():
     print("Demarrage de la normalisation BAN...")
     start_time = time.time()
     
-    ban_bronze = os.path.join(PARQUET_BRONZE_DIR, "ban", "ban_bronze.parquet").replace('\\', '/')
+    ban_bronze = bronze_glob("ban")
     ban_silver = os.path.join(PARQUET_SILVER_DIR, "ban", "ban_silver.parquet").replace('\\', '/')
     ensure_dir(os.path.join(PARQUET_SILVER_DIR, "ban"))
     
-    query = f"""
-        COPY (
-            SELECT 
-                numero,
-                REPLACE(
-                    REPLACE(
-                        REPLACE(UPPER(nom_voie), 'AV ', 'AVENUE '), 
-                        'ST ', 'SAINT '
-                    ),
-                    'BD ', 'BOULEVARD '
-                ) AS nom_voie_normalise,
-                code_postal,
-                UPPER(nom_commune) AS commune,
-                lon AS longitude,
-                lat AS latitude
-            FROM read_parquet('{ban_bronze}')
-            WHERE code_postal IS NOT NULL 
-              AND nom_commune IS NOT NULL
-        ) TO '{ban_silver}' (FORMAT PARQUET, COMPRESSION 'ZSTD');
+    if is_up_to_date("ban", ban_silver):
+        print("BAN Silver deja a jour (Bronze inchange), normalisation ignoree.")
+        return
+    
+    # Cle d'adresse (numero, nom_voie_normalise) identique pour BAN, SIRENE et RNA
+    # (numero est type INTEGER en Bronze BAN, VARCHAR pour SIRENE et RNA)
+    select_sql = f"""
+        SELECT 
+            {address.number_sql("CAST(numero AS VARCHAR)")} AS numero,
+            {address.street_sql("nom_voie")} AS nom_voie_normalise,
+            code_postal,
+            UPPER(nom_commune) AS commune,
+            lon AS longitude,
+            lat AS latitude
+        FROM read_parquet('{ban_bronze}', union_by_name=true), {address.abbreviations_sql()}
+        WHERE code_postal IS NOT NULL 
+          AND nom_commune IS NOT NULL
     """
+    query = layout.copy_sql(select_sql, layout.staging_path(ban_silver), ["numero", "nom_voie_normalise", "code_postal", "commune", "longitude", "latitude"])
     
     try:
-        duckdb.sql(query)
+        write_silver(query)
+        layout.publish(ban_silver)
+        record_silver("ban", ban_silver)
         print(f"Succes pour BAN Silver en {time.time() - start_time:.2f} secondes.")
     except Exception as e:
         print(f"Erreur BAN : {e}")
+        raise
 
 def normalize_sirene():
     print("Demarrage de la normalisation SIRENE...")
     start_time = time.time()
     
-    sirene_bronze = os.path.join(PARQUET_BRONZE_DIR, "sirene", "sirene_bronze.parquet").replace('\\', '/')
+    sirene_bronze = bronze_glob("sirene")
     sirene_silver = os.path.join(PARQUET_SILVER_DIR, "sirene", "sirene_silver.parquet").replace('\\', '/')
     ensure_dir(os.path.join(PARQUET_SILVER_DIR, "sirene"))
     
-    query = f"""
-        COPY (
-            SELECT 
-                siret,
-                siren,
-                etatAdministratifEtablissement AS status,
-                COALESCE(enseigne1Etablissement, denominationUsuelleEtablissement) AS enseigne,
-                codePostalEtablissement AS code_postal,
-                UPPER(libelleCommuneEtablissement) AS commune
-            FROM read_parquet('{sirene_bronze}')
-            WHERE siret IS NOT NULL
-        ) TO '{sirene_silver}' (FORMAT PARQUET, COMPRESSION 'ZSTD');
+    if is_up_to_date("sirene", sirene_silver):
+        print("SIRENE Silver deja a jour (Bronze inchange), normalisation ignoree.")
+        return
+    
+    select_sql = f"""
+        SELECT 
+            siret,
+            siren,
+            etatAdministratifEtablissement AS status,
+            COALESCE(enseigne1Etablissement, denominationUsuelleEtablissement) AS enseigne,
+            {address.number_sql("numeroVoieEtablissement")} AS numero,
+            {address.street_sql("typeVoieEtablissement", "libelleVoieEtablissement")} AS nom_voie_normalise,
+            codePostalEtablissement AS code_postal,
+            UPPER(libelleCommuneEtablissement) AS commune
+        FROM read_parquet('{sirene_bronze}', union_by_name=true), {address.abbreviations_sql()}
+        WHERE siret IS NOT NULL
     """
+    query = layout.copy_sql(select_sql, layout.staging_path(sirene_silver), ["siret", "siren", "status", "enseigne", "numero", "nom_voie_normalise", "code_postal", "commune"])
     
     try:
-        duckdb.sql(query)
+        write_silver(query)
+        layout.publish(sirene_silver)
+        record_silver("sirene", sirene_silver)
         print(f"Succes pour SIRENE Silver en {time.time() - start_time:.2f} secondes.")
     except Exception as e:
         print(f"Erreur SIRENE : {e}")
+        raise
 
 def normalize_rna():
     print("Demarrage de la normalisation RNA...")
     start_time = time.time()
     
-    rna_bronze = os.path.join(PARQUET_BRONZE_DIR, "rna", "rna_bronze.parquet").replace('\\', '/')
+    rna_bronze = bronze_glob("rna")
     rna_silver = os.path.join(PARQUET_SILVER_DIR, "rna", "rna_silver.parquet").replace('\\', '/')
     ensure_dir(os.path.join(PARQUET_SILVER_DIR, "rna"))
     
+    if is_up_to_date("rna", rna_silver):
+        print("RNA Silver deja a jour (Bronze inchange), normalisation ignoree.")
+        return
+    
     # Correction : On selectionne 'id' et on le renomme en 'id_rna' pour la suite
-    query = f"""
-        COPY (
-            SELECT 
-                id AS id_rna,
-                UPPER(titre) AS nom_association,
-                adrs_codepostal AS code_postal,
-                UPPER(adrs_libcommune) AS commune
-            FROM read_parquet('{rna_bronze}')
-            WHERE id IS NOT NULL 
-              AND adrs_codepostal IS NOT NULL
-        ) TO '{rna_silver}' (FORMAT PARQUET, COMPRESSION 'ZSTD');
+    select_sql = f"""
+        SELECT 
+            id AS id_rna,
+            UPPER(titre) AS nom_association,
+            {address.number_sql("adrs_numvoie")} AS numero,
+            {address.street_sql("adrs_typevoie", "adrs_libvoie")} AS nom_voie_normalise,
+            adrs_codepostal AS code_postal,
+            UPPER(adrs_libcommune) AS commune
+        FROM read_parquet('{rna_bronze}', union_by_name=true), {address.abbreviations_sql()}
+        WHERE id IS NOT NULL 
+          AND adrs_codepostal IS NOT NULL
     """
+    query = layout.copy_sql(select_sql, layout.staging_path(rna_silver), ["id_rna", "nom_association", "numero", "nom_voie_normalise", "code_postal", "commune"])
     
     try:
-        duckdb.sql(query)
+        write_silver(query)
+        layout.publish(rna_silver)
+        record_silver("rna", rna_silver)
         print(f"Succes pour RNA Silver en {time.time() - start_time:.2f} secondes.")
     except Exception as e:
-        print(f"Erreur RNA : {{e}}")
+        print(f"Erreur RNA : {e}")
+        raise
 def run_normalization():
     normalize_ban()
     normalize_sirene()
@@ -0,0 +1,301 @@
+import json
+import os
+import sys
+import threading
+import time
+import traceback
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import duckdb
+
+import budget
+import geocode
+import ingest
+import layout
+import match
+import normalize
+import views
+from manifest import FULL_REBUILD
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PIPELINE_REPORT_PATH = os.path.join(BASE_DIR, "data", "parquet", "pipeline_report.json")
+# Un fichier de metriques par run (pipeline_<horodatage>.json), les plus anciens sont supprimes
+PIPELINE_METRICS_DIR = os.path.join(BASE_DIR, "data", "parquet", "metrics")
+PIPELINE_METRICS_KEEP = int(os.environ.get("PIPELINE_METRICS_KEEP", "50"))
+
+# Budget partage entre les etapes qui tournent en meme temps : chacune recoit
+# 1/PIPELINE_WORKERS des threads et de la memoire pour ses sessions DuckDB
+PIPELINE_WORKERS = int(os.environ.get("PIPELINE_WORKERS", "3"))
+PIPELINE_THREADS = int(os.environ.get("PIPELINE_THREADS", os.cpu_count() or 1))
+PIPELINE_MEMORY_MB = int(os.environ.get("PIPELINE_MEMORY_MB", str(budget.total_memory_mb() * 3 // 4)))
+
+MEMORY_SAMPLE_SECONDS = 0.2
+
+SILVER = {
+    "ban": os.path.join(normalize.PARQUET_SILVER_DIR, "ban", "ban_silver.parquet"),
+    "sirene": os.path.join(normalize.PARQUET_SILVER_DIR, "sirene", "sirene_silver.parquet"),
+    "rna": os.path.join(normalize.PARQUET_SILVER_DIR, "rna", "rna_silver.parquet"),
+}
+GOLDEN_PATH = os.path.join(views.PARQUET_GOLD_DIR, "golden_record.parquet")
+STATS_PATH = os.path.join(views.PARQUET_GOLD_DIR, "stats_view.parquet")
+
+
+class Stage:
+    """Noeud du graphe : fonction a executer, dependances, entrees et sorties sur disque.
+
+    `inputs` et `outputs` sont des fonctions (les fichiers sont listes au moment
+    de l'execution) ; elles servent au test de fraicheur et au comptage des lignes.
+    """
+
+    def __init__(self, name, run, deps=(), inputs=None, outputs=None):
+        self.name = name
+        self.run = run
+        self.deps = tuple(deps)
+        self.inputs = inputs or (lambda: [])
+        self.outputs = outputs or (lambda: [])
+
+
+def silver_files(source):
+    return layout.data_files(SILVER[source])
+
+def pipeline_stages():
+    stages = []
+    for source in ingest.SOURCES:
+        stages.append(Stage(
+            f"ingest_{source}",
+            lambda source=source: ingest.ingest_source(source),
+            inputs=lambda source=source: ingest.source_files(source),
+            outputs=lambda source=source: ingest.bronze_targets(source),
+        ))
+    for source, run in (("ban", normalize.normalize_ban), ("sirene", normalize.normalize_sirene), ("rna", normalize.normalize_rna)):
+        stages.append(Stage(
+            f"normalize_{source}",
+            run,
+            deps=[f"ingest_{source}"],
+            inputs=lambda source=source: normalize.normalize_inputs(source),
+            outputs=lambda source=source: silver_files(source),
+        ))
+    stages.append(Stage(
+        "match",
+        match.run_matching,
+        deps=["normalize_sirene", "normalize_rna"],
+        inputs=lambda: silver_files("sirene") + silver_files("rna"),
+        outputs=lambda: [match.MAPPING_PATH],
+    ))
+    stages.append(Stage(
+        "views",
+        views.run_views,
+        deps=["match", "normalize_ban", "normalize_sirene"],
+        inputs=lambda: silver_files("sirene") + silver_files("ban") + [match.MAPPING_PATH],
+        outputs=lambda: (
+            layout.data_files(GOLDEN_PATH) + layout.data_files(STATS_PATH)
+            + [views.NEARBY_INDEX_PATH, views.SIRET_INDEX_PATH, views.RNA_INDEX_PATH]
+            + [views.GOLD_DB_PATH, views.CATALOG_DB_PATH, geocode.GEOCODE_PARTS_DIR]
+        ),
+    ))
+    return stages
+
+def is_fresh(stage):
+    """Vrai si toutes les sorties existent et sont plus recentes que toutes les entrees."""
+    inputs, outputs = stage.inputs(), stage.outputs()
+    if FULL_REBUILD or not inputs or not outputs:
+        return False
+    if not all(os.path.exists(path) for path in inputs + outputs):
+        return False
+    return min(os.stat(p).st_mtime_ns for p in outputs) >= max(os.stat(p).st_mtime_ns for p in inputs)
+
+def parquet_rows(paths):
+    """Lignes des fichiers Parquet de la liste (metadonnees seulement), None s'il n'y en a pas."""
+    files = [p.replace('\\', '/') for p in paths if p.endswith(".parquet") and os.path.isfile(p)]
+    if not files:
+        return None
+    file_list = ", ".join(f"'{f}'" for f in files)
+    # Connexion privee : les etapes tournent en parallele et la connexion par defaut du module n'est pas thread-safe
+    with duckdb.connect() as conn:
+        return conn.execute(f"SELECT SUM(num_rows)::BIGINT FROM parquet_file_metadata([{file_list}])").fetchone()[0]
+
+def total_bytes(paths):
+    """Taille cumulee des fichiers (les dossiers sont parcourus), None si la liste est vide."""
+    total = 0
+    for path in paths:
+        if os.path.isdir(path):
+            total += sum(
+                os.path.getsize(os.path.join(root, name))
+                for root, _, names in os.walk(path) for name in names
+            )
+        elif os.path.isfile(path):
+            total += os.path.getsize(path)
+    return total if paths else None
+
+def rss_mb():
+    """Memoire residente du processus (Linux), None si indisponible."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") // (1024 * 1024)
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+class MemorySampler:
+    """Echantillonne la memoire du processus et retient le pic pour chaque etape en cours.
+
+    Les etapes partagent le processus : le pic d'une etape inclut celles qui
+    tournent en parallele. Les processus de matching ne sont pas comptes.
+    """
+
+    def __init__(self):
+        self.peaks = {}
+        self._running = set()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+
+    def _sample(self):
+        while not self._stop.wait(MEMORY_SAMPLE_SECONDS):
+            self.record()
+
+    def record(self):
+        value = rss_mb()
+        if value is None:
+            return
+        with self._lock:
+            for name in self._running:
+                self.peaks[name] = max(self.peaks.get(name, 0), value)
+
+    def start_stage(self, name):
+        with self._lock:
+            self._running.add(name)
+        self.record()
+
+    def end_stage(self, name):
+        self.record()
+        with self._lock:
+            self._running.discard(name)
+        return self.peaks.get(name)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+
+def run_stage(stage, sampler, threads, memory_mb):
+    result = {"name": stage.name, "deps": list(stage.deps)}
+    if is_fresh(stage):
+        result.update(status="skipped", reason="sorties plus recentes que les entrees")
+        return result
+
+    sampler.start_stage(stage.name)
+    start_time = time.time()
+    try:
+        # Mesures dans le bloc protege : une erreur de comptage fait echouer l'etape, pas le run
+        inputs = stage.inputs()
+        result["rows_in"] = parquet_rows(inputs)
+        result["bytes_read"] = total_bytes(inputs)
+        with budget.share(threads, memory_mb):
+            stage.run()
+        outputs = stage.outputs()
+        result["rows_out"] = parquet_rows(outputs)
+        result["bytes_written"] = total_bytes(outputs)
+        result["status"] = "ok"
+    except Exception as e:
+        result["status"] = "failed"
+        result["error"] = f"{type(e).__name__}: {e}"
+        traceback.print_exc()
+    finally:
+        result["seconds"] = round(time.time() - start_time, 3)
+        result["peak_rss_mb"] = sampler.end_stage(stage.name)
+    return result
+
+def write_report(report, start_time):
+    """Dernier run (PIPELINE_REPORT_PATH) + historique d'un fichier par run dans PIPELINE_METRICS_DIR."""
+    os.makedirs(PIPELINE_METRICS_DIR, exist_ok=True)
+    run_path = os.path.join(PIPELINE_METRICS_DIR, time.strftime("pipeline_%Y%m%dT%H%M%S.json", time.localtime(start_time)))
+    for path in (PIPELINE_REPORT_PATH, run_path):
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        os.replace(tmp_path, path)
+    runs = sorted(name for name in os.listdir(PIPELINE_METRICS_DIR) if name.startswith("pipeline_") and name.endswith(".json"))
+    for name in runs[:-PIPELINE_METRICS_KEEP] if PIPELINE_METRICS_KEEP > 0 else []:
+        os.remove(os.path.join(PIPELINE_METRICS_DIR, name))
+
+def run_pipeline(stages=None):
+    """Execute le graphe : etapes independantes en parallele, arret a la premiere erreur.
+
+    Retourne le rapport du run (aussi ecrit dans PIPELINE_REPORT_PATH).
+    """
+    stages = stages or pipeline_stages()
+    by_name = {stage.name: stage for stage in stages}
+    for stage in stages:
+        for dep in stage.deps:
+            if dep not in by_name:
+                raise ValueError(f"Etape {stage.name} : dependance inconnue {dep}")
+
+    workers = max(1, PIPELINE_WORKERS)
+    threads = max(1, PIPELINE_THREADS // workers)
+    memory_mb = max(128, PIPELINE_MEMORY_MB // workers)
+    print(f"=== PIPELINE ETL : {len(stages)} etapes, {workers} en parallele, "
+          f"{threads} thread(s) et {memory_mb} Mo par etape ===")
+
+    start_time = time.time()
+    results = {}
+    running = {}
+    failed = False
+    sampler = MemorySampler()
+    sampler.start()
+    try:
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="stage") as executor:
+            while True:
+                if not failed:
+                    for stage in stages:
+                        ready = all(results.get(dep, {}).get("status") in ("ok", "skipped") for dep in stage.deps)
+                        if stage.name not in results and stage.name not in running.values() and ready:
+                            print(f"--> {stage.name}")
+                            future = executor.submit(run_stage, stage, sampler, threads, memory_mb)
+                            running[future] = stage.name
+                if not running:
+                    break
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    name = running.pop(future)
+                    results[name] = future.result()
+                    status = results[name]["status"]
+                    print(f"<-- {name} : {status} ({results[name].get('seconds', 0):.2f} s)")
+                    if status == "failed":
+                        # Echec rapide : plus aucune etape lancee, celles en cours se terminent
+                        failed = True
+    finally:
+        sampler.stop()
+
+    for stage in stages:
+        if stage.name not in results:
+            results[stage.name] = {"name": stage.name, "deps": list(stage.deps), "status": "cancelled"}
+
+    report = {
+        "status": "failed" if failed else "ok",
+        "started_at": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(start_time)),
+        "seconds": round(time.time() - start_time, 3),
+        "full_rebuild": FULL_REBUILD,
+        "budget": {"workers": workers, "threads_per_stage": threads, "memory_mb_per_stage": memory_mb},
+        "stages": [results[stage.name] for stage in stages],
+    }
+    write_report(report, start_time)
+
+    print(f"{'etape':<18} {'statut':<10} {'duree':>8} {'lignes in':>11} {'lignes out':>11} {'Mo lus':>8} {'Mo ecrits':>9} {'pic RSS':>9}")
+    for result in report["stages"]:
+        print(
+            f"{result['name']:<18} {result['status']:<10} {result.get('seconds', 0):>7.2f}s "
+            f"{result.get('rows_in') if result.get('rows_in') is not None else '-':>11} "
+            f"{result.get('rows_out') if result.get('rows_out') is not None else '-':>11} "
+            f"{format(result['bytes_read'] / 1e6, '.1f') if result.get('bytes_read') is not None else '-':>8} "
+            f"{format(result['bytes_written'] / 1e6, '.1f') if result.get('bytes_written') is not None else '-':>9} "
+            f"{str(result['peak_rss_mb']) + ' Mo' if result.get('peak_rss_mb') is not None else '-':>9}"
+        )
+    print(f"Rapport : {PIPELINE_REPORT_PATH} ({report['status']}, {report['seconds']:.2f} s), historique dans {PIPELINE_METRICS_DIR}")
+    return report
+
+if __name__ == "__main__":
+    sys.exit(0 if run_pipeline()["status"] == "ok" else 1)
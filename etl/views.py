@@ -1,33 +1,126 @@
-import duckdb
 import sqlite3
+import hashlib
+import json
 import os
+import shutil
 import time
 
+import pyarrow as pa
+import pyarrow.ipc as pa_ipc
+
+import budget
+import layout
+from geocode import GEOCODE_PARTS_DIR, LEVEL_ADDRESS, build_geocoding, geocode_source_sql
+from manifest import (
+    changed_departements, departement_list_sql,
+    editing_manifest, load_manifest, previous_state,
+)
+
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 PARQUET_SILVER_DIR = os.path.join(BASE_DIR, "data", "parquet", "silver")
 PARQUET_GOLD_DIR = os.path.join(BASE_DIR, "data", "parquet", "gold")
 DB_DIR = os.path.join(BASE_DIR, "duckdb")
+GOLD_DB_PATH = os.path.join(DB_DIR, "gold.duckdb")
+CATALOG_DB_PATH = os.path.join(DB_DIR, "catalog.db")
+BUILD_VERSION_PATH = os.path.join(PARQUET_GOLD_DIR, "build_version.json")
+NEARBY_INDEX_PATH = os.path.join(PARQUET_GOLD_DIR, "nearby_index.parquet")
+# Index partages par les workers de l'API (mmap, api/mmap_index.py) : fichiers
+# Arrow IPC non compresses, tries sur une colonne cle suivie des colonnes du
+# Golden Record dans le meme ordre. Lus sans copie : la position d'une cle est
+# la ligne de son enregistrement.
+# - SIRET : siret_key (SIRET en int64)
+# - RNA : id_rna, une ligne par etablissement lie (mapping SIRENE-RNA)
+SIRET_INDEX_PATH = os.path.join(PARQUET_GOLD_DIR, "siret_index.arrow")
+RNA_INDEX_PATH = os.path.join(PARQUET_GOLD_DIR, "rna_index.arrow")
+MMAP_INDEX_BATCH_ROWS = 1_000_000
+
+# Debordement sur disque de la table `enriched` si elle depasse la memoire de la session
+GOLD_SPILL_DIR = os.path.join(DB_DIR, "gold_spill")
+
+# Row groups courts sur le Golden Record trie par siret : les zone maps
+# (min/max par row group) permettent de ne lire qu'un seul bloc par lookup
+GOLDEN_ROW_GROUP_SIZE = 16384
+
+# Grille de l'index spatial (/api/v1/nearby) : cellules de 0.01 degre (~1.1 km
+# en latitude), numerotees ligne * NEARBY_GRID_COLUMNS + colonne. Meme grille
+# que api/nearby.py ; l'index est trie par cellule pour que les zone maps
+# ecartent les row groups hors du rectangle de recherche.
+NEARBY_CELL_DEGREES = 0.01
+NEARBY_GRID_COLUMNS = 36000
+NEARBY_ROW_GROUP_SIZE = 16384
+
+# Index prefixe 2 a 4 caracteres : saisie semi-automatique (typeahead) et filtre
+# departement (postal_code:"75"*) resolus sans parcourir tout le vocabulaire
+SEARCH_VIEW_SQL = """CREATE VIRTUAL TABLE search_view USING fts5(
+    siret UNINDEXED,
+    name,
+    postal_code,
+    city UNINDEXED,
+    is_association UNINDEXED,
+    prefix = '2 3 4'
+)"""
+
+# Index FTS5 : lignes par lot Arrow (= par transaction SQLite) et cache SQLite en Kio
+FTS_BATCH_ROWS = int(os.environ.get("FTS_BATCH_ROWS", "50000"))
+FTS_CACHE_KIB = int(os.environ.get("FTS_CACHE_KIB", "262144"))
 
 def ensure_dir(path):
     if not os.path.exists(path):
         os.makedirs(path)
 
-def build_parquet_views():
-    print("Creation des vues Parquet (Golden Record & Stats)...")
+def departement_scope(parquet_path, departements):
+    """Source SQL restreinte aux departements a recalculer (None = tout).
+
+    En disposition partitionnee, le filtre porte sur la cle de partition :
+    DuckDB ne lit que les dossiers departement=XX concernes.
+    """
+    if departements is None:
+        return layout.read_sql(parquet_path)
+    return f"(SELECT * FROM {layout.read_sql(parquet_path)} WHERE {layout.departement_sql(parquet_path)} IN ({departement_list_sql(departements)}))"
+
+def merge_sql(existing_file, departements, new_rows):
+    """Lignes conservees des departements inchanges + lignes recalculees.
+
+    Inutile en disposition partitionnee : publish() ne remplace que les
+    dossiers des departements recalcules.
+    """
+    if departements is None or layout.PARTITIONED:
+        return new_rows
+    return f"""
+        SELECT * FROM {layout.read_sql(existing_file)}
+        WHERE {layout.departement_sql(existing_file)} NOT IN ({departement_list_sql(departements)})
+        UNION ALL BY NAME
+        {new_rows}
+    """
+
+def gold_session():
+    """Session DuckDB du build Gold, partagee par le Golden Record, les stats et l'index FTS5."""
+    ensure_dir(GOLD_SPILL_DIR)
+    spill_dir = GOLD_SPILL_DIR.replace('\\', '/')
+    conn = budget.connect()
+    conn.execute(f"SET temp_directory = '{spill_dir}'")
+    return conn
+
+def build_enriched(conn, departements=None):
+    """Materialise une seule fois les etablissements enrichis dans la table temporaire `enriched`.
+
+    SIRENE (departements a recalculer), id RNA du mapping deduplique et
+    coordonnees du geocodage : une lecture de chaque source et une seule
+    deduplication, puis Golden Record, stats et index FTS5 en derivent.
+    """
+    # 0. Geocodage a l'adresse des seuls departements a recalculer
+    if build_geocoding(departements) is None:
+        return False
+
+    print("Enrichissement des etablissements (RNA, geocodage)...")
     start_time = time.time()
-    
-    ensure_dir(PARQUET_GOLD_DIR)
-    
+
     sirene_silver = os.path.join(PARQUET_SILVER_DIR, "sirene", "sirene_silver.parquet").replace('\\', '/')
-    ban_silver = os.path.join(PARQUET_SILVER_DIR, "ban", "ban_silver.parquet").replace('\\', '/')
     mapping = os.path.join(PARQUET_SILVER_DIR, "mapping_sirene_rna.parquet").replace('\\', '/')
-    
-    golden_file = os.path.join(PARQUET_GOLD_DIR, "golden_record.parquet").replace('\\', '/')
-    stats_file = os.path.join(PARQUET_GOLD_DIR, "stats_view.parquet").replace('\\', '/')
 
-    # 1. Creation du Golden Record (SIRENE + RNA + BAN) avec deduplication du mapping
-    query_golden = f"""
-        COPY (
+    try:
+        conn.execute(f"""
+            CREATE OR REPLACE TEMP TABLE enriched AS
             SELECT 
                 s.siret,
                 s.status,
@@ -35,104 +128,404 @@ def build_parquet_views():
                 s.code_postal,
                 s.commune AS city,
                 m.id_rna AS rna,
-                b.latitude,
-                b.longitude,
-                CASE WHEN b.latitude IS NOT NULL THEN true ELSE false END AS is_ban_validated
-            FROM read_parquet('{sirene_silver}') s
+                g.latitude,
+                g.longitude,
+                COALESCE(g.geocode_level = '{LEVEL_ADDRESS}', false) AS is_ban_validated,
+                g.geocode_level
+            FROM {departement_scope(sirene_silver, departements)} s
             LEFT JOIN (
                 SELECT siret, ANY_VALUE(id_rna) AS id_rna 
-                FROM read_parquet('{mapping}') 
+                FROM {layout.read_sql(mapping)} 
                 GROUP BY siret
             ) m ON s.siret = m.siret
-            LEFT JOIN (
-                SELECT code_postal, ANY_VALUE(latitude) as latitude, ANY_VALUE(longitude) as longitude
-                FROM read_parquet('{ban_silver}')
-                GROUP BY code_postal
-            ) b ON s.code_postal = b.code_postal
-        ) TO '{golden_file}' (FORMAT PARQUET, COMPRESSION 'ZSTD');
-    """
+            LEFT JOIN {geocode_source_sql(departements)} g ON s.siret = g.siret
+        """)
+        rows = conn.execute("SELECT COUNT(*) FROM enriched").fetchone()[0]
+        print(f"Succes de l'enrichissement ({rows} etablissements) en {time.time() - start_time:.2f} secondes.")
+        return True
+    except Exception as e:
+        print(f"Erreur enrichissement : {e}")
+        return False
+
+def build_parquet_views(conn, departements=None):
+    print("Creation des vues Parquet (Golden Record & Stats)...")
+    start_time = time.time()
     
-    # 2. Creation de la vue Statistiques avec deduplication
-    query_stats = f"""
-        COPY (
+    ensure_dir(PARQUET_GOLD_DIR)
+    
+    golden_file = os.path.join(PARQUET_GOLD_DIR, "golden_record.parquet").replace('\\', '/')
+    stats_file = os.path.join(PARQUET_GOLD_DIR, "stats_view.parquet").replace('\\', '/')
+
+    # 1. Golden Record : les lignes enrichies telles quelles
+    # Tri par siret dans chaque fichier (un par departement en disposition partitionnee)
+    query_golden = layout.copy_sql(
+        merge_sql(golden_file, departements, "SELECT * FROM enriched"),
+        layout.staging_path(golden_file),
+        columns=["siret"],
+        sort_order="siret",
+        row_group_size=GOLDEN_ROW_GROUP_SIZE,
+    )
+    
+    # 2. Statistiques par code postal, agregees depuis les memes lignes
+    stats_rows = """
             SELECT 
-                s.code_postal,
-                COUNT(s.siret) AS total_entites,
-                COUNT(m.id_rna) AS associations,
-                COUNT(s.siret) - COUNT(m.id_rna) AS entreprises_pures
-            FROM read_parquet('{sirene_silver}') s
-            LEFT JOIN (
-                SELECT siret, ANY_VALUE(id_rna) AS id_rna 
-                FROM read_parquet('{mapping}') 
-                GROUP BY siret
-            ) m ON s.siret = m.siret
-            GROUP BY s.code_postal
-        ) TO '{stats_file}' (FORMAT PARQUET, COMPRESSION 'ZSTD');
+                code_postal,
+                COUNT(siret) AS total_entites,
+                COUNT(rna) AS associations,
+                COUNT(siret) - COUNT(rna) AS entreprises_pures
+            FROM enriched
+            GROUP BY code_postal
     """
+    query_stats = layout.copy_sql(
+        merge_sql(stats_file, departements, stats_rows),
+        layout.staging_path(stats_file),
+        columns=["code_postal"],
+    )
+    
+    # En disposition partitionnee, seuls les dossiers des departements recalcules sont remplaces
+    published = None if departements is None or not layout.exists(golden_file) else departements
     
     try:
-        duckdb.sql(query_golden)
-        duckdb.sql(query_stats)
+        # Ecriture dans des cibles temporaires : la fusion relit les vues existantes
+        for target in (golden_file, stats_file):
+            layout.clear_staging(target)
+        conn.execute(query_golden)
+        conn.execute(query_stats)
+        layout.publish(golden_file, published)
+        layout.publish(stats_file, published)
         print(f"Succes des vues Parquet en {time.time() - start_time:.2f} secondes.")
+        return True
     except Exception as e:
         print(f"Erreur vues Parquet : {e}")
+        return False
+
+def nearby_cell_sql(latitude, longitude):
+    row = f"FLOOR(({latitude} + 90) / {NEARBY_CELL_DEGREES})::BIGINT"
+    column = f"FLOOR(({longitude} + 180) / {NEARBY_CELL_DEGREES})::BIGINT"
+    return f"({row} * {NEARBY_GRID_COLUMNS} + {column})"
+
+def build_nearby_index():
+    """Index spatial des etablissements geocodes, reconstruit depuis le Golden Record.
 
-def build_sqlite_search():
+    Un seul fichier pour toute la France (une recherche par rayon traverse les
+    departements), trie par cellule de grille puis siret.
+    """
+    print("Creation de l'index spatial (grille)...")
+    start_time = time.time()
+
+    golden_file = os.path.join(PARQUET_GOLD_DIR, "golden_record.parquet").replace('\\', '/')
+    tmp_path = NEARBY_INDEX_PATH + ".tmp"
+    tmp_path_safe = tmp_path.replace('\\', '/')
+    query = f"""
+        COPY (
+            SELECT
+                {nearby_cell_sql("latitude", "longitude")} AS cell,
+                siret, status, name, code_postal, city, rna,
+                latitude, longitude, geocode_level
+            FROM (
+                SELECT * REPLACE (
+                    TRY_CAST(latitude AS DOUBLE) AS latitude,
+                    TRY_CAST(longitude AS DOUBLE) AS longitude
+                )
+                FROM {layout.table_sql(golden_file)}
+            )
+            WHERE latitude IS NOT NULL AND longitude IS NOT NULL
+            ORDER BY cell, siret
+        ) TO '{tmp_path_safe}' (FORMAT PARQUET, COMPRESSION 'ZSTD', ROW_GROUP_SIZE {NEARBY_ROW_GROUP_SIZE});
+    """
+    try:
+        with budget.connect() as conn:
+            conn.execute(query)
+        os.replace(tmp_path, NEARBY_INDEX_PATH)
+        print(f"Succes de l'index spatial en {time.time() - start_time:.2f} secondes.")
+        return True
+    except Exception as e:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        print(f"Erreur index spatial : {e}")
+        return False
+
+def write_mmap_index(query, path):
+    """Ecrit le resultat (trie) de query en Arrow IPC non compresse puis le publie par renommage atomique.
+
+    Retourne le nombre de lignes ecrites.
+    """
+    tmp_path = path + ".tmp"
+    rows = 0
+    try:
+        with budget.connect() as conn:
+            reader = conn.execute(query).to_arrow_reader(MMAP_INDEX_BATCH_ROWS)
+            with pa.OSFile(tmp_path, "wb") as sink, pa_ipc.new_file(sink, reader.schema) as writer:
+                for batch in reader:
+                    if batch.num_rows:
+                        writer.write_batch(batch)
+                        rows += batch.num_rows
+        os.replace(tmp_path, path)
+        return rows
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+def build_siret_index():
+    """Index SIRET binaire (cles int64 triees + enregistrements), reconstruit depuis le Golden Record.
+
+    Seuls les SIRET de 14 chiffres sont indexes (les seuls acceptes par l'API).
+    """
+    print("Creation de l'index SIRET (mmap)...")
+    start_time = time.time()
+
+    golden_file = os.path.join(PARQUET_GOLD_DIR, "golden_record.parquet").replace('\\', '/')
+    query = f"""
+        SELECT CAST(siret AS BIGINT) AS siret_key, *
+        FROM {layout.table_sql(golden_file)}
+        WHERE LENGTH(siret) = 14 AND regexp_full_match(siret, '[0-9]+')
+        ORDER BY siret_key
+    """
+    try:
+        rows = write_mmap_index(query, SIRET_INDEX_PATH)
+        print(f"Succes de l'index SIRET ({rows} lignes) en {time.time() - start_time:.2f} secondes.")
+        return True
+    except Exception as e:
+        print(f"Erreur index SIRET : {e}")
+        return False
+
+def build_rna_index():
+    """Index inverse RNA -> etablissements : liens du mapping joints au Golden Record, tries par id_rna."""
+    print("Creation de l'index RNA (mmap)...")
+    start_time = time.time()
+
+    mapping = os.path.join(PARQUET_SILVER_DIR, "mapping_sirene_rna.parquet").replace('\\', '/')
+    golden_file = os.path.join(PARQUET_GOLD_DIR, "golden_record.parquet").replace('\\', '/')
+    query = f"""
+        SELECT m.id_rna, g.*
+        FROM (
+            SELECT DISTINCT id_rna, siret
+            FROM {layout.read_sql(mapping)}
+            WHERE id_rna IS NOT NULL
+        ) m
+        JOIN {layout.table_sql(golden_file)} g ON g.siret = m.siret
+        ORDER BY m.id_rna, g.siret
+    """
+    try:
+        rows = write_mmap_index(query, RNA_INDEX_PATH)
+        print(f"Succes de l'index RNA ({rows} liens) en {time.time() - start_time:.2f} secondes.")
+        return True
+    except Exception as e:
+        print(f"Erreur index RNA : {e}")
+        return False
+
+def build_gold_database():
+    print("Creation de la base Gold DuckDB (index siret)...")
+    start_time = time.time()
+    
+    ensure_dir(DB_DIR)
+    golden_file = os.path.join(PARQUET_GOLD_DIR, "golden_record.parquet").replace('\\', '/')
+    nearby_file = NEARBY_INDEX_PATH.replace('\\', '/')
+    
+    # Construction dans un fichier temporaire puis renommage atomique :
+    # les workers de l'API ne voient jamais une base a moitie ecrite
+    tmp_db_path = GOLD_DB_PATH + ".tmp"
+    if os.path.exists(tmp_db_path):
+        os.remove(tmp_db_path)
+    
+    conn = budget.connect(tmp_db_path)
+    try:
+        conn.execute(f"""
+            CREATE TABLE golden_record AS
+            SELECT * FROM {layout.table_sql(golden_file)}
+            ORDER BY siret
+        """)
+        conn.execute("CREATE INDEX idx_golden_siret ON golden_record (siret)")
+        # Deja trie par cellule : les zone maps DuckDB suffisent, pas d'index ART
+        conn.execute(f"CREATE TABLE nearby_index AS SELECT * FROM read_parquet('{nearby_file}')")
+        conn.execute("CHECKPOINT")
+        conn.close()
+        os.replace(tmp_db_path, GOLD_DB_PATH)
+        print(f"Succes de la base Gold en {time.time() - start_time:.2f} secondes.")
+        return True
+    except Exception as e:
+        conn.close()
+        print(f"Erreur base Gold : {e}")
+        return False
+
+def search_view_schema():
+    """Instruction CREATE de l'index FTS5 existant (None s'il n'existe pas)."""
+    if not os.path.exists(CATALOG_DB_PATH):
+        return None
+    conn = sqlite3.connect(CATALOG_DB_PATH)
+    try:
+        row = conn.execute("SELECT sql FROM sqlite_master WHERE name = 'search_view'").fetchone()
+        return row[0] if row else None
+    finally:
+        conn.close()
+
+def build_sqlite_search(duck, departements=None):
     print("Creation de l'index de recherche SQLite FTS5...")
     start_time = time.time()
     
     ensure_dir(DB_DIR)
-    sqlite_db_path = os.path.join(DB_DIR, "catalog.db")
     
-    if os.path.exists(sqlite_db_path):
-        os.remove(sqlite_db_path)
-        
-    sirene_silver = os.path.join(PARQUET_SILVER_DIR, "sirene", "sirene_silver.parquet").replace('\\', '/')
-    mapping = os.path.join(PARQUET_SILVER_DIR, "mapping_sirene_rna.parquet").replace('\\', '/')
+    # Construction dans un fichier temporaire puis renommage atomique : l'API
+    # garde l'ancienne base jusqu'au bout. En incremental, on part d'une copie
+    # de l'index courant dont seuls les departements modifies sont recalcules.
+    tmp_db_path = CATALOG_DB_PATH + ".tmp"
+    if os.path.exists(tmp_db_path):
+        os.remove(tmp_db_path)
+    if departements is not None and search_view_schema() != SEARCH_VIEW_SQL:
+        print("> Schema de l'index modifie, reconstruction complete.")
+        departements = None
+    if departements is not None and os.path.exists(CATALOG_DB_PATH):
+        shutil.copyfile(CATALOG_DB_PATH, tmp_db_path)
 
-    conn = sqlite3.connect(sqlite_db_path)
+    conn = sqlite3.connect(tmp_db_path, isolation_level=None)
     cursor = conn.cursor()
     
-    cursor.execute("""
-        CREATE VIRTUAL TABLE search_view USING fts5(
-            siret UNINDEXED, 
-            name, 
-            postal_code, 
-            city UNINDEXED,
-            is_association UNINDEXED
-        );
-    """)
-    
-    # Requete avec deduplication
-    query_data = f"""
+    # Chargement en masse : pas de journal (le fichier est jetable tant qu'il n'est pas publie)
+    cursor.execute("PRAGMA journal_mode = OFF")
+    cursor.execute("PRAGMA synchronous = OFF")
+    cursor.execute("PRAGMA locking_mode = EXCLUSIVE")
+    cursor.execute(f"PRAGMA cache_size = -{FTS_CACHE_KIB}")
+    
+    if departements is None:
+        cursor.execute(SEARCH_VIEW_SQL)
+    
+    # Etablissements nommes de la table `enriched` (deja restreinte aux departements a recalculer)
+    query_data = """
         SELECT 
-            s.siret, 
-            COALESCE(s.enseigne, '') AS name, 
-            s.code_postal AS postal_code,
-            s.commune AS city,
-            CASE WHEN m.id_rna IS NOT NULL THEN 'true' ELSE 'false' END AS is_association
-        FROM read_parquet('{sirene_silver}') s
-        LEFT JOIN (
-            SELECT siret, ANY_VALUE(id_rna) AS id_rna 
-            FROM read_parquet('{mapping}') 
-            GROUP BY siret
-        ) m ON s.siret = m.siret
-        WHERE s.enseigne IS NOT NULL
+            siret, 
+            name, 
+            code_postal AS postal_code,
+            city,
+            CASE WHEN rna IS NOT NULL THEN 'true' ELSE 'false' END AS is_association
+        FROM enriched
+        WHERE name IS NOT NULL
     """
     
     try:
-        results = duckdb.sql(query_data).fetchall()
-        cursor.executemany(
-            "INSERT INTO search_view (siret, name, postal_code, city, is_association) VALUES (?, ?, ?, ?, ?)", 
-            results
-        )
-        conn.commit()
-        print(f"Succes de l'index SQLite en {time.time() - start_time:.2f} secondes.")
+        # Fusion des segments FTS5 differee : un seul 'optimize' en fin de chargement
+        cursor.execute("INSERT INTO search_view (search_view, rank) VALUES ('automerge', 0)")
+        
+        cursor.execute("BEGIN")
+        for departement in departements or []:
+            if departement:
+                # Prefixe FTS5 sur la colonne postal_code : pas de parcours complet de la table
+                cursor.execute(
+                    "DELETE FROM search_view WHERE rowid IN (SELECT rowid FROM search_view WHERE search_view MATCH ?)",
+                    ['postal_code:"' + departement.replace('"', '""') + '"*']
+                )
+            else:
+                cursor.execute("DELETE FROM search_view WHERE postal_code IS NULL OR postal_code = ''")
+        cursor.execute("COMMIT")
+
+        # Lecture en flux par lots Arrow : la memoire reste bornee par FTS_BATCH_ROWS
+        rows_loaded = 0
+        reader = duck.execute(query_data).to_arrow_reader(FTS_BATCH_ROWS)
+        for batch in reader:
+            columns = [column.to_pylist() for column in batch.columns]
+            cursor.execute("BEGIN")
+            cursor.executemany(
+                "INSERT INTO search_view (siret, name, postal_code, city, is_association) VALUES (?, ?, ?, ?, ?)", 
+                zip(*columns)
+            )
+            cursor.execute("COMMIT")
+            rows_loaded += batch.num_rows
+        
+        cursor.execute("INSERT INTO search_view (search_view, rank) VALUES ('automerge', 4)")
+        cursor.execute("INSERT INTO search_view (search_view) VALUES ('optimize')")
+        conn.close()
+        os.replace(tmp_db_path, CATALOG_DB_PATH)
+        print(f"Succes de l'index SQLite ({rows_loaded} lignes) en {time.time() - start_time:.2f} secondes.")
+        return True
     except Exception as e:
-        print(f"Erreur SQLite : {e}")
-    finally:
         conn.close()
+        if os.path.exists(tmp_db_path):
+            os.remove(tmp_db_path)
+        print(f"Erreur SQLite : {e}")
+        return False
+
+def write_build_version():
+    """Tampon de version lu par l'API : invalidation de ses caches apres un rebuild, ETag et Last-Modified."""
+    artifacts = (
+        layout.data_files(os.path.join(PARQUET_GOLD_DIR, "golden_record.parquet"))
+        + layout.data_files(os.path.join(PARQUET_GOLD_DIR, "stats_view.parquet"))
+        + [NEARBY_INDEX_PATH, SIRET_INDEX_PATH, RNA_INDEX_PATH, GOLD_DB_PATH, CATALOG_DB_PATH]
+    )
+    fingerprint = hashlib.sha256()
+    for path in artifacts:
+        if os.path.exists(path):
+            stat = os.stat(path)
+            name = os.path.relpath(path, BASE_DIR).replace('\\', '/')
+            fingerprint.update(f"{name}:{stat.st_size}:{stat.st_mtime_ns}".encode())
+    
+    stamp = {
+        "version": fingerprint.hexdigest()[:16],
+        # UTC : sert de Last-Modified aux reponses de l'API
+        "built_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+    }
+    
+    # Ecriture atomique du tampon
+    tmp_path = BUILD_VERSION_PATH + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(stamp, f)
+    os.replace(tmp_path, BUILD_VERSION_PATH)
+    print(f"Version de build : {stamp['version']}")
+
+def changed_views_departements():
+    """Departements dont SIRENE, BAN ou les liens ont change depuis le dernier build.
+
+    Retourne None si une reconstruction complete est necessaire.
+    """
+    manifest = load_manifest()
+    silver = manifest.get("silver", {})
+    current = {source: silver.get(source) for source in ("sirene", "ban", "mapping")}
+    previous = previous_state(manifest, "views")
+
+    outputs_exist = (
+        layout.exists(os.path.join(PARQUET_GOLD_DIR, "golden_record.parquet"))
+        and layout.exists(os.path.join(PARQUET_GOLD_DIR, "stats_view.parquet"))
+        and os.path.exists(NEARBY_INDEX_PATH)
+        and os.path.exists(SIRET_INDEX_PATH)
+        and os.path.exists(RNA_INDEX_PATH)
+        and os.path.exists(CATALOG_DB_PATH)
+        and os.path.isdir(GEOCODE_PARTS_DIR)
+    )
+    # Un changement de schema de l'index FTS5 impose aussi une reconstruction complete
+    if not previous or None in current.values() or not outputs_exist or search_view_schema() != SEARCH_VIEW_SQL:
+        return current, None
+
+    departements = set()
+    for source, digests in current.items():
+        departements.update(changed_departements(digests, previous.get(source, {})))
+    return current, sorted(departements)
+
+def run_views():
+    current, departements = changed_views_departements()
+    if departements == []:
+        print("Aucun departement modifie depuis le dernier build, vues Gold conservees.")
+        return
+
+    if departements is not None:
+        print(f"Mise a jour incrementale de {len(departements)} departement(s) : {', '.join(departements)}")
+    # Une session pour les sorties derivees de `enriched`, fermee avant les
+    # etapes qui relisent le Golden Record publie (index spatial, base Gold)
+    with gold_session() as conn:
+        enriched = build_enriched(conn, departements)
+        succeeded = enriched and build_parquet_views(conn, departements)
+        succeeded = enriched and build_sqlite_search(conn, departements) and succeeded
+    succeeded = succeeded and build_nearby_index()
+    succeeded = succeeded and build_siret_index()
+    succeeded = succeeded and build_rna_index()
+    succeeded = succeeded and build_gold_database()
+
+    # Tampon de version et manifeste n'avancent que si toutes les vues ont ete
+    # produites : l'API ne recharge pas (et ne change pas d'ETag) sur un build partiel
+    if not succeeded:
+        raise RuntimeError("Vues Gold incompletes, version de build et manifeste inchanges")
+    write_build_version()
+    if None not in current.values():
+        with editing_manifest() as manifest:
+            manifest["views"] = current
 
 if __name__ == "__main__":
-    build_parquet_views()
-    build_sqlite_search()
\ No newline at end of file
+    run_views()
\ No newline at end of file